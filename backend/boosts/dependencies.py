@@ -2,6 +2,8 @@ from bson import ObjectId
 from fastapi import HTTPException
 from database_connection import extra_boosts_collection, user_collection
 from boosts.schemas import AutoBotTap, ExtraBoosters
+from leaderboard.dependencies import record_coins
+from user_reg_and_prof_mngmnt.profile_cache import invalidate_profile
 
 
 
@@ -164,6 +166,8 @@ def upgrade_extra_boost(extra_boost_id: str, telegram_user_id: str):
 
         if update.modified_count:
             print(update.modified_count)
+            invalidate_profile(telegram_user_id)
+            record_coins(telegram_user_id, -ebooster["upgrade_cost"], periods=False)
             return {
                 "status": True,
                 "message": "Extra boost upgraded successfully."
@@ -186,6 +190,8 @@ def upgrade_extra_boost(extra_boost_id: str, telegram_user_id: str):
         )
 
         if update.modified_count == 1:
+            invalidate_profile(telegram_user_id)
+            record_coins(telegram_user_id, -ebooster["upgrade_cost"], periods=False)
             return {
                 "status": True,
                 "message": "Extra boost upgraded successfully."
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends
+from database_connection import cached
 from user_reg_and_prof_mngmnt.user_authentication import get_current_user
 from boosts.dependencies import (
     my_extra_boosters as my_extra_boosters_func,
@@ -17,6 +18,7 @@ userExtraBoostApp = APIRouter(
 
 # ----------------------------- GET MY EXTRA BOOSTS ------------------------------ #
 @userExtraBoostApp.get("/extra_boosters")
+@cached(tags=["extra_boosts"], vary_on_user=True)
 async def my_extra_boosters(telegram_user_id: str = Depends(get_current_user)):
 
     return my_extra_boosters_func(telegram_user_id)
@@ -1,30 +1,34 @@
 from challenge.schemas import MyChallenges
-from database_connection import user_collection
-from superuser.challenge.dependencies import get_challenges
+from database_connection import user_collection, challenges_collection
+from superuser.challenge.dependencies import CHALLENGE_COMPLETED, CHALLENGE_END_DATE, calculate_remaining_time
+from targeting import AUDIENCE_PROJECTION, targeting_query
+from pymongo import IndexModel
+from indexes import register_indexes
+
+
+register_indexes("challenges", IndexModel([("participants", 1), ("remaining_time", 1)]))
 
 
 def get_my_challenges(telegram_user_id: str, status: str):
-    my_data = user_collection.find_one({"telegram_user_id": telegram_user_id})
-
-    if my_data:
-        my_level: str = my_data["level_name"].lower()
-        my_clan = my_data["clan"]
-
-        for challenge in get_challenges(status):
-            if status == "ongoing":
-                if my_level in challenge.participants or \
-                    my_clan in challenge.participants or \
-                    "all_users" in challenge.participants or \
-                    telegram_user_id in challenge.participants:
-
-                    yield MyChallenges(
-                        challenge_id=challenge.id,
-                        name=challenge.name,
-                        description=challenge.description,
-                        reward=challenge.reward,
-                        remaining_time=challenge.remaining_time,
-                        image_id=str(challenge.image_id)
-                    )
+    my_data = user_collection.find_one({"telegram_user_id": telegram_user_id}, AUDIENCE_PROJECTION)
+
+    if my_data and status == "ongoing":
+        # challenges targeting the user that have not ended yet
+        query = targeting_query(
+            my_data, "participants",
+            remaining_time={"$ne": CHALLENGE_COMPLETED},
+            **{"$expr": {"$gt": [CHALLENGE_END_DATE, "$$NOW"]}}
+        )
+
+        for challenge in challenges_collection.find(query):
+            yield MyChallenges(
+                challenge_id=str(challenge["_id"]),
+                name=challenge["name"],
+                description=challenge["description"],
+                reward=challenge["reward"],
+                remaining_time=calculate_remaining_time(challenge["duration"], challenge["launch_date"]),
+                image_id=str(challenge["image_id"])
+            )
 
 
 def get_challenge_image(image_id: str):
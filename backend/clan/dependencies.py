@@ -1,11 +1,29 @@
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from bson import ObjectId
 from fastapi import HTTPException
-from database_connection import user_collection, fs, clans_collection, coin_stats,  invites_ref
+from database_connection import user_collection, clans_collection, clan_settlements, coin_stats_daily,  invites_ref, invalidate_cache_tags
+from media.dependencies import delete_image, store_image
+from coin_engine import USER_COIN_PROJECTION, credit_pipeline, daily_stats_filter, notify_credit, stats_day, stats_today
 from clan.schemas import ClanTopEarners, CreateClan, ClanSearchResponse, MyClan, MyEligibleMembers
-from dependencies import update_coin_stats, update_coins_in_db
+from dependencies import update_coins_in_db
+from user_reg_and_prof_mngmnt.profile_cache import invalidate_profile
 from user_reg_and_prof_mngmnt.models import Clan as UserProfileClan
 from superuser.clan.models import Clan
+from leaderboard.dependencies import mark_leaderboards_stale, record_coins_batch
+from pymongo import IndexModel, UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from indexes import register_indexes
+from config import get_settings
+from scheduler import register_job
+
+
+register_indexes("users", IndexModel([("clan.id", 1), ("total_coins", -1)]))
+register_indexes(
+    "clans",
+    IndexModel([("name", 1)], unique=True),
+    IndexModel([("status", 1), ("total_coins", -1)]),
+    IndexModel([("total_coins", -1)])
+)
 
 
 CLAN_LEADER_INVITEE_REQUIREMENTS = 1
@@ -118,7 +136,7 @@ def create_clan(creator: str, clan: CreateClan):
     if not verify_image(image_format):
         raise HTTPException(status_code=415, detail="Invalid image file. Please upload a valid image file.")
 
-    image_id = fs.put(image, filename="clan_" + image_name)
+    image_id = store_image(image, "clan_" + image_name)
 
     new_clan = Clan(
         name=clan.name,
@@ -148,6 +166,7 @@ def create_clan(creator: str, clan: CreateClan):
                 }
             }
         )
+        invalidate_profile(*members)
 
         # update clan members count
         # update_clan_member_count = clans_collection.update_one(
@@ -241,6 +260,7 @@ def join_clan(telegram_user_id: str, clan_id: str):
                 }
             }
         )
+        invalidate_profile(telegram_user_id)
 
         # increment clan member count
         update_clan_member_count = clans_collection.update_one(
@@ -307,6 +327,7 @@ def invite_to_clan(telegram_user_id: str, clan_id: str):
                     }
                 }
             )
+            invalidate_profile(telegram_user_id)
 
             if update_user.modified_count > 0:
                 # increment clan member count
@@ -318,6 +339,7 @@ def invite_to_clan(telegram_user_id: str, clan_id: str):
                         }
                     }
                 )
+                invalidate_cache_tags("clans")
 
                 if update_clan_member_count.modified_count > 0:
                     return {
@@ -412,6 +434,7 @@ def exit_clan(telegram_user_id: str, creator_exit_action: str | None = None):
                 }
             }
         )
+        invalidate_profile(telegram_user_id)
 
         # decrement clan member count
         update_clan_member_count = clans_collection.update_one(
@@ -470,6 +493,7 @@ def exit_clan(telegram_user_id: str, creator_exit_action: str | None = None):
                         }
                     }
                 )
+                invalidate_profile(clan["creator"])
 
                 # update clan member count
                 update_clan_member_count = clans_collection.update_one(
@@ -492,6 +516,7 @@ def exit_clan(telegram_user_id: str, creator_exit_action: str | None = None):
         # close clan completely
         if creator_exit_action.lower() == "close":
             # set fields in clan object of members to none
+            member_ids = user_collection.distinct("telegram_user_id", {"clan.id": clan_id})
             remove_all_members = user_collection.update_many(
                 {"clan.id": clan_id},
                 {
@@ -503,10 +528,11 @@ def exit_clan(telegram_user_id: str, creator_exit_action: str | None = None):
                     }
                 }
             )
+            invalidate_profile(*member_ids)
 
             # delete clan image
             image_id = clan["image_id"]
-            fs.delete(ObjectId(image_id))
+            delete_image(image_id)
 
             # delete clan
             delete_clan = clans_collection.delete_one({"_id": ObjectId(clan_id)})
@@ -543,92 +569,184 @@ def clan_top_earners(clan_id: str, limit: int = 10, skip: int = 0):
 
 
 
-# --------------------------------- CLAN EARNINGS STRATEGY ---------------------------------- #
-def run_clan_earnings():
+# --------------------------------- CLAN EARNINGS SETTLEMENT ---------------------------------- #
+# Once a day every active clan earns 0.1% of the coins its members earned the previous day, and
+# each member is credited the clan's earnings too. The settlement of a day is planned with one
+# aggregation, stored as a checkpoint in clan_settlements, applied with bulk writes that are each
+# guarded by the settled day (clans' last_earn_date, members' and coin stats' clan_earn_date),
+# and finished by recomputing every clan's rank in the database. A settlement interrupted by a
+# crash is resumed from its checkpoint by the next run, without crediting anything twice.
+
+CLAN_EARNINGS_RATE = 0.001
+
+
+def clan_earnings_pipeline(clan_ids: list[str], previous_day: date) -> list[dict]:
     """
-    Updates clan earnings and user coins daily.
+    Build the aggregation over users that sums the earnings of clans from their members' coins.
 
-    This function only runs once a day, preferably at midnight UTC time.
-    It calculates 0.1% of the coins a user earned the previous day and distributes it to the user's clan and the user themselves.
-    It also updates the clan's last earn date and the clan rankings.
+    Args:
+        clan_ids (list[str]): The clans to compute the earnings of.
+        previous_day (date): The day the members earned the coins.
 
-    Returns a dictionary with the clan earnings and the member earnings for each user in the clan.
+    Returns:
+        list[dict]: The pipeline, yielding {_id: clan id, earnings} for clans whose members earned coins.
     """
-    # operations before clan earnings update
-    clans = clans_collection.find({"status": "active"})
-    today_date = datetime.now(timezone.utc).date()
-    previous_day = today_date - timedelta(days=1)
+    return [
+        {"$match": {"clan.id": {"$in": clan_ids}}},
+        {"$lookup": {
+            "from": coin_stats_daily.name,
+            "localField": "telegram_user_id",
+            "foreignField": "telegram_user_id",
+            "pipeline": [{"$match": {"day": stats_day(previous_day)}}, {"$project": {"_id": 0, "coins": 1}}],
+            "as": "stats"
+        }},
+        {"$unwind": "$stats"},
+        {"$group": {
+            "_id": "$clan.id",
+            "earnings": {"$sum": {"$trunc": {"$multiply": ["$stats.coins", CLAN_EARNINGS_RATE]}}}
+        }}
+    ]
+
+
+def _plan_clan_earnings(previous_day: date, day: str) -> dict[str, int]:
+    """
+    Compute the earnings of every active clan not yet settled for a day.
 
-    response = {}
-    for clan in clans:
-        clan_id = clan["_id"]
-        members = user_collection.find({"clan.id": str(clan_id)})
-
-        clans_last_earn_date = clans_collection.find_one({"_id": ObjectId(clan_id)})["last_earn_date"]
-
-        if clans_last_earn_date == previous_day.strftime("%Y-%m-%d"):
-            print("Clan earnings already distributed for today.")
-        else:
-            if members:
-                members_telegram_ids = [member["telegram_user_id"] for member in members]
-
-                # get 0.1% of coins a user earned the previous day
-                user_coin_stats = coin_stats.find_one({"telegram_user_id": {"$in": members_telegram_ids}})
-                clan_earnings = 0
-
-                if user_coin_stats:
-                    for date, coins in user_coin_stats["date"].items():
-                        if date == previous_day.strftime("%Y-%m-%d"):
-                            clan_earnings += int(coins * 0.001)
-
-                # add earnings to clan earnings and update clan's last earn date
-                clan_update_operation = {
-                    "$inc": {
-                        "total_coins": clan_earnings
+    Returns:
+        dict[str, int]: The earnings keyed by clan id.
+    """
+    clan_ids = [
+        str(clan["_id"]) for clan in
+        clans_collection.find({"status": "active", "last_earn_date": {"$ne": day}}, {"_id": 1})
+    ]
+
+    earnings = {clan_id: 0 for clan_id in clan_ids}
+    if not clan_ids:
+        return earnings
+
+    for clan in user_collection.aggregate(clan_earnings_pipeline(clan_ids, previous_day)):
+        earnings[clan["_id"]] = int(clan["earnings"])
+
+    return earnings
+
+
+def _credit_clan_earnings(day: str, earnings: dict[str, int], replay: bool):
+    """
+    Credit planned clan earnings to the clans and their members, once per day.
+    """
+    earning_clans = [clan_id for clan_id, clan_earnings in earnings.items() if clan_earnings > 0]
+
+    # members, with their level promoted, and their coin stats for today
+    if earning_clans:
+        user_collection.bulk_write([
+            UpdateMany(
+                {"clan.id": clan_id, "clan_earn_date": {"$ne": day}},
+                credit_pipeline(earnings[clan_id], extra_set={"clan_earn_date": day})
+            ) for clan_id in earning_clans
+        ], ordered=False)
+
+    members = list(user_collection.find({"clan.id": {"$in": earning_clans}}, {**USER_COIN_PROJECTION, "clan.id": 1}))
+
+    if members:
+        coin_stats_daily.bulk_write([
+            UpdateOne(
+                daily_stats_filter(member["telegram_user_id"]),
+                [{"$set": {
+                    "coins": {
+                        "$cond": [
+                            {"$eq": ["$clan_earn_date", day]},
+                            "$coins",
+                            {"$add": [{"$ifNull": ["$coins", 0]}, earnings[member["clan"]["id"]]]}
+                        ]
                     },
-                    "$set": {
-                        "last_earn_date": previous_day.strftime("%Y-%m-%d")
-                    }
-                }
+                    "clan_earn_date": day
+                }}],
+                upsert=True
+            ) for member in members
+        ], ordered=False)
+
+    # clans, including those that earned nothing
+    if earnings:
+        clans_collection.bulk_write([
+            UpdateOne(
+                {"_id": ObjectId(clan_id), "last_earn_date": {"$ne": day}},
+                {"$inc": {"total_coins": clan_earnings}, "$set": {"last_earn_date": day}}
+            ) for clan_id, clan_earnings in earnings.items()
+        ], ordered=False)
+
+    # a replayed settlement may already be on the leaderboards
+    if replay:
+        mark_leaderboards_stale()
+    else:
+        today = stats_today()
+        record_coins_batch([(member["telegram_user_id"], earnings[member["clan"]["id"]], today) for member in members])
+
+    invalidate_profile(*[member["telegram_user_id"] for member in members])
+    # the bulk credit bypasses credit_coins, its listeners (the tap buffer) are told here
+    for member in members:
+        notify_credit(member["telegram_user_id"], earnings[member["clan"]["id"]], member)
+
+
+def clan_rank_pipeline() -> list[dict]:
+    """
+    Build the aggregation over clans that stores every clan's rank by total coins, highest first.
+    """
+    return [
+        {"$setWindowFields": {"sortBy": {"total_coins": -1}, "output": {"rank": {"$documentNumber": {}}}}},
+        {"$project": {"rank": 1}},
+        {"$merge": {"into": clans_collection.name, "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ]
 
-                clan_update = clans_collection.update_one({"_id": ObjectId(clan_id)}, clan_update_operation)
-                if clan_update.modified_count > 0:
-                    response["clan_earnings"] = f"+{clan_earnings}"
 
-                # add earnings to user coins
-                members_update_operation = {
-                    "$inc": {
-                        "total_coins": clan_earnings
-                    }
-                }
+def _rank_clans():
+    """
+    Rank every clan by its total coins, highest first.
+    """
+    clans_collection.aggregate(clan_rank_pipeline())
+
 
-                members_update = user_collection.update_many({"telegram_user_id": {"$in": members_telegram_ids}}, members_update_operation)
-                if members_update.modified_count > 0:
-                    response["member_earnings (each)"] = f"+{clan_earnings}"
-                
-                # update each user's coin stats
-                for member_id in members_telegram_ids:
-                    update_coin_stats(member_id, clan_earnings)
+def settle_clan_earnings():
+    """
+    Settle the previous day's clan earnings, unless they already were.
 
-                print(response)
+    Runs periodically, the first run after midnight UTC settles the day. Resumes an interrupted
+    settlement from its checkpoint.
+    """
+    previous_day = stats_today() - timedelta(days=1)
+    day = previous_day.strftime("%Y-%m-%d")
+
+    settlement = clan_settlements.find_one({"_id": day})
+    if settlement and settlement["stage"] == "done":
+        return
+
+    replay = settlement is not None
+    if not settlement:
+        settlement = {
+            "_id": day,
+            "stage": "planned",
+            "earnings": _plan_clan_earnings(previous_day, day),
+            "started_at": datetime.now(timezone.utc)
+        }
+        try:
+            clan_settlements.insert_one(settlement)
+        except DuplicateKeyError:
+            # another worker planned the day first
+            return
+    else:
+        print(f"Clan earnings: resuming the settlement of {day} from {settlement['stage']}")
 
+    if settlement["stage"] == "planned":
+        _credit_clan_earnings(day, settlement["earnings"], replay)
+        clan_settlements.update_one({"_id": day}, {"$set": {"stage": "credited"}})
 
+    _rank_clans()
+    clan_settlements.update_one({"_id": day}, {"$set": {"stage": "done", "finished_at": datetime.now(timezone.utc)}})
+    # sync jobs run in a worker thread, so the sync invalidation doesn't block the event loop
+    invalidate_cache_tags("clans")
 
-    # operations after clan earnings update
-    # update clan rankings in from highest to lowest of total coins
-    updated_clans = clans_collection.find().sort("total_coins", -1)
+    earned = sum(1 for clan_earnings in settlement["earnings"].values() if clan_earnings > 0)
+    print(f"Clan earnings: settled {day} for {len(settlement['earnings'])} clans, {earned} with earnings")
 
-    if updated_clans:
-        rank = 1
-        for clan in updated_clans:
-            clan_id = clan["_id"]
-            update_clan_rank = clans_collection.update_one(
-                {"_id": ObjectId(clan_id)}, 
-                {
-                    "$set": {"rank": rank}
-                }
-            )
-            rank += 1
 
-    return response
+register_job("settle_clan_earnings", get_settings().clan_settlement_interval, settle_clan_earnings)
 
@@ -1,3 +1,4 @@
+import asyncio
 import re
 from typing import Annotated, Optional
 from fastapi import APIRouter, Depends, Query
@@ -10,13 +11,12 @@ from clan.dependencies import (
     join_clan as join_clan_func,
     all_clans as all_clans_func,
     next_potential_clan_leader,
-    run_clan_earnings,
     top_clans as top_clans_func,
     my_clan as my_clan_func,
     clan_top_earners as clan_top_earners_func,
     exit_clan as exit_clan_func
 )
-from database_connection import clans_collection, user_collection
+from database_connection import cached, clans_collection, invalidate_cache_tags_async, user_collection
 
 
 
@@ -24,7 +24,7 @@ user_clan_router = APIRouter(
     prefix="/user/clan",
     tags=["Clan"],
     # responses={404: {"description": "Not found"}},
-    dependencies=[Depends(get_current_user), Depends(run_clan_earnings)]
+    dependencies=[Depends(get_current_user)]
 )
 
 
@@ -41,13 +41,15 @@ async def create_clan(
     clan: Annotated[CreateClan, Depends(CreateClan)],
     telegram_user_id: Annotated[str, Depends(get_current_user)]
 ):
-    response = create_clan_func(telegram_user_id, clan)
+    response = await asyncio.to_thread(create_clan_func, telegram_user_id, clan)
+    await invalidate_cache_tags_async("clans")
 
     return response
 
 
 # ----------------------------- ALL CLANS ------------------------------ #
 @user_clan_router.get("/all_clans")
+@cached(ttl=60, tags=["clans"])
 async def all_clans(
     page_size: int = Query(10, description="Page size/maximum number of results"),
     page_number: int = Query(1, description="Page number"),
@@ -60,6 +62,7 @@ async def all_clans(
 
 # ----------------------------- TOP CLANS ------------------------------ #
 @user_clan_router.get("/top_clans")
+@cached(ttl=60, tags=["clans"])
 async def top_clans(
     page_size: int = Query(10, description="Page size/maximum number of results"),
     page_number: int = Query(1, description="Page number"),
@@ -120,6 +123,7 @@ async def join_clan(
     telegram_user_id: Annotated[str, Depends(get_current_user)]
 ):
     response = join_clan_func(telegram_user_id, clan_id)
+    await invalidate_cache_tags_async("clans")
 
     return response
 
@@ -149,6 +153,7 @@ async def clan_leadership_transfer_candidate(clan_id: str):
 @user_clan_router.post("/exit_clan")
 async def exit_clan(telegram_user_id: Annotated[str, Depends(get_current_user)], creator_exit_action: CreatorExitAction | None = None):
     leave_clan = exit_clan_func(telegram_user_id, creator_exit_action)
+    await invalidate_cache_tags_async("clans")
 
     return leave_clan
 
@@ -0,0 +1,280 @@
+from datetime import date, datetime, timezone
+from typing import Callable
+from pymongo import IndexModel, ReturnDocument, UpdateOne
+from database_connection import user_collection, async_user_collection, coin_stats_daily, async_coin_stats_daily
+from indexes import register_indexes
+from user_reg_and_prof_mngmnt.profile_cache import invalidate_profile, invalidate_profile_async
+
+
+# users are looked up by telegram id everywhere, coin stats are read by day range,
+# for every user on a day or for one user over a period
+register_indexes("users", IndexModel([("telegram_user_id", 1)], unique=True))
+register_indexes(
+    "coin_stats_daily",
+    IndexModel([("day", 1), ("coins", -1)]),
+    IndexModel([("telegram_user_id", 1), ("day", 1)], unique=True)
+)
+register_indexes("coin_stats", IndexModel([("telegram_user_id", 1)]))
+
+
+user_levels: dict[int, list] = {
+    # level: [coins, level name]
+    1: [0, "Novice"],
+    2: [5000, "Explorer"],
+    3: [25000, "Apprentice"],
+    4: [100000, "Warrior"],
+    5: [500000, "Master"],
+    6: [1000000, "Champion"],
+    7: [20000000, "Tactician"],
+    8: [100000000, "Specialist"],
+    9: [500000000, "Conqueror"],
+    10:[1000000000, "Legend"]
+}
+
+USER_COIN_PROJECTION = {"_id": 0, "telegram_user_id": 1, "total_coins": 1, "level": 1, "level_name": 1}
+
+
+# ------------------------------ CREDIT LISTENERS ------------------------------ #
+# Subsystems that keep their own copy of users' coins (the tap buffer) register a listener,
+# called with (telegram_user_id, coins, user) after every credit, so that a credit that bypasses
+# them never leaves them serving a stale total. `user` is the document returned by the credit.
+
+_credit_listeners: list[Callable] = []
+_async_credit_listeners: list[Callable] = []
+
+
+def register_credit_listener(listener: Callable, async_listener: Callable):
+    """
+    Declare a listener of credits.
+
+    Args:
+        listener (Callable): Called after each credit made by `credit_coins`.
+        async_listener (Callable): Awaited after each credit made by `credit_coins_async`.
+    """
+    _credit_listeners.append(listener)
+    _async_credit_listeners.append(async_listener)
+
+
+def notify_credit(telegram_user_id: str, coins: int, user: dict):
+    """
+    Call the credit listeners for a credit written outside of `credit_coins`, e.g. in a bulk write.
+
+    Args:
+        telegram_user_id (str): The telegram user ID of the credited user.
+        coins (int): The number of coins added.
+        user (dict): The user document after the credit, with its coins and level.
+    """
+    for listener in _credit_listeners:
+        listener(telegram_user_id, coins, user)
+
+
+# ------------------------------ COIN MUTATION ENGINE ------------------------------ #
+def level_stages() -> list[dict]:
+    """
+    Build the update pipeline stages that promote a user's level from their total coins.
+
+    The level is computed server-side from the `user_levels` thresholds and never drops
+    below the level the user already has.
+
+    Returns:
+        list[dict]: The pipeline stages to append after any stage that changes `total_coins`.
+    """
+    coin_level = {
+        "$switch": {
+            "branches": [
+                {"case": {"$gte": ["$total_coins", threshold]}, "then": level}
+                for level, (threshold, _) in sorted(user_levels.items(), reverse=True)
+            ],
+            "default": 1
+        }
+    }
+    level_name = {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": ["$level", level]}, "then": name}
+                for level, (_, name) in user_levels.items()
+            ],
+            "default": {"$ifNull": ["$level_name", user_levels[1][1]]}
+        }
+    }
+
+    return [
+        {"$set": {"level": {"$max": [{"$ifNull": ["$level", 1]}, coin_level]}}},
+        {"$set": {"level_name": level_name}}
+    ]
+
+
+def credit_pipeline(
+        coins: int,
+        extra_set: dict | None = None,
+        extra_push: dict | None = None,
+        extra_stages: list[dict] | None = None
+    ) -> list[dict]:
+    """
+    Build an update pipeline that adds coins to a user and promotes their level.
+
+    Args:
+        coins (int): The number of coins to add (negative to debit).
+        extra_set (dict | None): Additional fields to set in the same write.
+        extra_push (dict | None): Array fields to append a value to in the same write.
+        extra_stages (list[dict] | None): Pipeline stages run before the credit, for fields
+            computed from the user document itself.
+
+    Returns:
+        list[dict]: The update pipeline.
+    """
+    credit = {"total_coins": {"$add": [{"$ifNull": ["$total_coins", 0]}, coins]}}
+    for field, value in (extra_set or {}).items():
+        credit[field] = {"$literal": value}
+    for field, value in (extra_push or {}).items():
+        credit[field] = {"$concatArrays": [{"$ifNull": [f"${field}", []]}, [{"$literal": value}]]}
+
+    return [*(extra_stages or []), {"$set": credit}, *level_stages()]
+
+
+def credit_coins(
+        telegram_user_id: str,
+        coins: int,
+        extra_set: dict | None = None,
+        extra_filter: dict | None = None,
+        extra_push: dict | None = None,
+        extra_stages: list[dict] | None = None,
+        projection: dict | None = None
+    ) -> dict | None:
+    """
+    Atomically add coins to a user and promote their level in a single round trip.
+
+    Args:
+        telegram_user_id (str): The telegram user ID of the user to credit.
+        coins (int): The number of coins to add (negative to debit).
+        extra_set (dict | None): Additional fields to set in the same write.
+        extra_filter (dict | None): Additional conditions the user document must match.
+        extra_push (dict | None): Array fields to append a value to in the same write.
+        extra_stages (list[dict] | None): Pipeline stages run before the credit in the same write.
+        projection (dict | None): The fields to return, defaults to coins and level.
+
+    Returns:
+        dict | None: The user document after the update, or None if no user matched.
+    """
+    query = {"telegram_user_id": telegram_user_id, **(extra_filter or {})}
+
+    user = user_collection.find_one_and_update(
+        query,
+        credit_pipeline(coins, extra_set, extra_push, extra_stages),
+        projection=projection or USER_COIN_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if user:
+        invalidate_profile(telegram_user_id)
+        notify_credit(telegram_user_id, coins, user)
+
+    return user
+
+
+async def credit_coins_async(
+        telegram_user_id: str,
+        coins: int,
+        extra_set: dict | None = None,
+        extra_filter: dict | None = None,
+        extra_push: dict | None = None,
+        extra_stages: list[dict] | None = None,
+        projection: dict | None = None
+    ) -> dict | None:
+    """
+    Async variant of `credit_coins` for async routes.
+    """
+    query = {"telegram_user_id": telegram_user_id, **(extra_filter or {})}
+
+    user = await async_user_collection.find_one_and_update(
+        query,
+        credit_pipeline(coins, extra_set, extra_push, extra_stages),
+        projection=projection or USER_COIN_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if user:
+        await invalidate_profile_async(telegram_user_id)
+        for listener in _async_credit_listeners:
+            await listener(telegram_user_id, coins, user)
+
+    return user
+
+
+# ------------------------------ DAILY COIN STATS ------------------------------ #
+# Coin stats are bucketed one document per user per day: {telegram_user_id, day, coins},
+# where day is midnight UTC of the day the coins were earned. Days are UTC days everywhere
+# (buckets, leaderboard periods, the dashboard), whatever the server's timezone.
+def stats_today() -> date:
+    """
+    Return the current UTC day, the day coins earned now are bucketed under.
+    """
+    return datetime.now(timezone.utc).date()
+
+
+def stats_day(day: date | str | None = None) -> datetime:
+    """
+    Return the bucket key of a day, defaults to today (UTC).
+
+    Args:
+        day (date | str | None): The day, or its "YYYY-MM-DD" string.
+
+    Returns:
+        datetime: Midnight UTC of the day.
+    """
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    day = day or stats_today()
+
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def daily_stats_filter(telegram_user_id: str, day: date | str | None = None) -> dict:
+    return {"telegram_user_id": telegram_user_id, "day": stats_day(day)}
+
+
+def daily_stats_operation(telegram_user_id: str, coins: int, day: date | str | None = None) -> UpdateOne:
+    """
+    Build the bulk write operation that adds coins to a user's bucket for a day.
+    """
+    return UpdateOne(daily_stats_filter(telegram_user_id, day), {"$inc": {"coins": coins}}, upsert=True)
+
+
+def add_daily_coins(telegram_user_id: str, coins: int, day: date | str | None = None):
+    """
+    Add coins to a user's coin stats for a day, creating the bucket if needed.
+
+    Args:
+        telegram_user_id (str): The telegram user ID of the user.
+        coins (int): The coins earned.
+        day (date | str | None): The day the coins were earned, defaults to today.
+
+    Returns:
+        UpdateResult: The result of the upsert.
+    """
+    return coin_stats_daily.update_one(daily_stats_filter(telegram_user_id, day), {"$inc": {"coins": coins}}, upsert=True)
+
+
+async def add_daily_coins_async(telegram_user_id: str, coins: int, day: date | str | None = None):
+    """
+    Async variant of `add_daily_coins` for async routes.
+    """
+    return await async_coin_stats_daily.update_one(daily_stats_filter(telegram_user_id, day), {"$inc": {"coins": coins}}, upsert=True)
+
+
+def daily_coins_pipeline(start: date, end: date, match: dict | None = None) -> list[dict]:
+    """
+    Build the aggregation that sums each user's coins over a range of days.
+
+    Args:
+        start (date): The first day of the range.
+        end (date): The last day of the range, inclusive.
+        match (dict | None): Additional conditions on the buckets, e.g. a set of users.
+
+    Returns:
+        list[dict]: The pipeline, yielding {telegram_user_id, coins} for users who earned coins.
+    """
+    return [
+        {"$match": {"day": {"$gte": stats_day(start), "$lte": stats_day(end)}, **(match or {})}},
+        {"$group": {"_id": "$telegram_user_id", "coins": {"$sum": "$coins"}}},
+        {"$match": {"coins": {"$gt": 0}}},
+        {"$project": {"_id": 0, "telegram_user_id": "$_id", "coins": 1}}
+    ]
@@ -12,6 +12,61 @@ class Settings(BaseSettings):
     redis_host: str = ""
     redis_port: int = ""
     redis_password: str = ""
+    redis_max_connections: int = 50
+    redis_socket_timeout: float = 0.5           # seconds
+    redis_socket_connect_timeout: float = 0.5   # seconds
+    redis_health_check_interval: float = 5.0    # seconds between background pings
+    redis_failure_threshold: int = 3           # consecutive failures that open the circuit
+
+    # write-behind tap buffer
+    tap_buffer_enabled: bool = False
+    tap_buffer_flush_interval: float = 2.0      # seconds between flushes
+    tap_buffer_max_size: int = 5000             # pending entries that force an early flush
+    tap_buffer_journal_dir: str = "tap_buffer_journal"
+    tap_buffer_replay_interval: float = 60.0    # seconds between scans for journals of dead workers
+
+    # per-request database query metrics
+    query_metrics_enabled: bool = True
+    query_budget: int = 25                      # queries per request before a warning is logged
+
+    # in-process cache of hydrated user stubs
+    user_hydration_cache_size: int = 10000
+    user_hydration_cache_ttl: float = 30.0      # seconds
+
+    # user profile cache
+    profile_cache_ttl: int = 60                 # seconds a profile is kept in redis
+    profile_cache_l1_size: int = 5000           # profiles kept in process
+
+    # verified jwt claims kept in process until the token expires
+    token_cache_size: int = 10000
+
+    # cached route responses
+    response_cache_l1_size: int = 1000          # responses kept in process
+    response_cache_lock_timeout: float = 5.0    # seconds a worker waits for another to build a response
+
+    # in-process cache of small, frequently served images
+    image_cache_max_bytes: int = 64 * 1024 * 1024
+    image_cache_max_file_bytes: int = 1024 * 1024   # larger images are always streamed from gridfs
+    image_cache_ttl: int = 3600                     # seconds, bounds serving an image deleted by another worker
+
+    # processes resizing uploaded images, and threads storing their renditions
+    image_processing_workers: int = 2
+    image_storing_workers: int = 2
+
+    # background jobs
+    scheduler_enabled: bool = True
+    expiry_sweep_interval: int = 60             # seconds between reward, task and challenge expiry sweeps
+    reward_counters_flush_interval: int = 10    # seconds between writes of reward impressions and claims
+    clan_settlement_interval: int = 300         # seconds between checks for an unsettled day of clan earnings
+
+    # outcomes of requests retried with the same Idempotency-Key
+    idempotency_key_ttl: int = 86400            # seconds
+
+    # admin password verification
+    bcrypt_max_workers: int = 2                 # threads hashing passwords
+    bcrypt_max_pending: int = 16                # verifications queued before sign-ins are refused
+    admin_failed_login_ttl: int = 30            # seconds a failed admin sign-in is remembered
+    admin_failed_login_cache_size: int = 10000
 
     model_config = SettingsConfigDict(env_file=".env")
 
@@ -1,15 +1,23 @@
+import asyncio
+import hashlib
 import json
+import time
+from collections import OrderedDict
 from config import get_settings
 from gridfs import GridFS
-from pymongo import MongoClient, errors
+from pymongo import AsyncMongoClient, MongoClient, errors
 import redis
+import redis.asyncio as aioredis
 from functools import wraps
 from datetime import timedelta
 from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from query_metrics import query_metrics_listener
 
 
 connection_string: str = get_settings().mongodb_connection_string
-client: MongoClient = MongoClient(connection_string)
+client: MongoClient = MongoClient(connection_string, event_listeners=[query_metrics_listener])
 
 
 
@@ -19,22 +27,374 @@ REDIS_PORT = get_settings().redis_port
 REDIS_PASSWORD = get_settings().redis_password
 REDIS_EXPIRE = timedelta(minutes=5)  # Cache expiration time
 
+# shared connection pools, created once at app startup by init_redis()
+redis_pool: redis.ConnectionPool | None = None
+async_redis_pool: aioredis.ConnectionPool | None = None
+
+# circuit breaker: redis is only handed out while the circuit is closed
+redis_state = {"available": False, "failures": 0}
+_redis_health_task: asyncio.Task | None = None
+
+
+def _redis_connection_kwargs() -> dict:
+    settings = get_settings()
+    return {
+        "host": REDIS_HOST,
+        "port": REDIS_PORT,
+        "username": "default",
+        "password": REDIS_PASSWORD,
+        "decode_responses": True,
+        "max_connections": settings.redis_max_connections,
+        "socket_timeout": settings.redis_socket_timeout,
+        "socket_connect_timeout": settings.redis_socket_connect_timeout,
+    }
+
+
+def redis_available() -> bool:
+    return redis_state["available"]
+
+
+def report_redis_failure(error: Exception):
+    """
+    Record a failed redis call, opening the circuit after too many consecutive failures.
+
+    Once open, callers get no redis client until the background health check succeeds.
+
+    Args:
+        error (Exception): The error raised by redis.
+    """
+    redis_state["failures"] += 1
+
+    if redis_state["available"] and redis_state["failures"] >= get_settings().redis_failure_threshold:
+        redis_state["available"] = False
+        print(f"Redis circuit opened, caching disabled: {error}")
+
+
+def _report_redis_success():
+    if not redis_state["available"]:
+        print("Connected to Redis")
+    redis_state["available"] = True
+    redis_state["failures"] = 0
+
+
+async def _check_redis_health():
+    try:
+        await aioredis.Redis(connection_pool=async_redis_pool).ping()
+        _report_redis_success()
+    except (redis.exceptions.RedisError, OSError) as e:
+        if redis_state["available"]:
+            print(f"Error connecting to Redis: {e}")
+        redis_state["available"] = False
+
+
+async def _redis_health_check_loop():
+    interval = get_settings().redis_health_check_interval
+
+    while True:
+        await asyncio.sleep(interval)
+        await _check_redis_health()
+
+
+async def init_redis():
+    """
+    Create the shared redis connection pools and start the background health check.
+    """
+    global redis_pool, async_redis_pool, _redis_health_task
+
+    if not REDIS_HOST:
+        print("Redis not configured, caching disabled")
+        return
+
+    redis_pool = redis.ConnectionPool(**_redis_connection_kwargs())
+    async_redis_pool = aioredis.ConnectionPool(**_redis_connection_kwargs())
+
+    await _check_redis_health()
+    _redis_health_task = asyncio.create_task(_redis_health_check_loop())
+
+
+async def close_redis():
+    """
+    Stop the health check and close every pooled redis connection.
+    """
+    global redis_pool, async_redis_pool, _redis_health_task
+
+    if _redis_health_task:
+        _redis_health_task.cancel()
+        _redis_health_task = None
+
+    redis_state["available"] = False
+
+    if async_redis_pool:
+        await async_redis_pool.aclose()
+        async_redis_pool = None
+
+    if redis_pool:
+        redis_pool.disconnect()
+        redis_pool = None
+
+
+def get_sync_redis_client() -> redis.Redis | None:
+    """
+    Return a redis client from the shared pool, or None while redis is unavailable.
+    """
+    if redis_pool and redis_available():
+        return redis.Redis(connection_pool=redis_pool)
+    return None  # Disable caching if Redis is not available
+
+
 # Initialize Redis client
 def get_redis_client():
+    """
+    Dependency that yields a redis client from the shared pool, or None while redis is unavailable.
+    """
+    yield get_sync_redis_client()
+
+
+def get_async_redis_client() -> aioredis.Redis | None:
+    """
+    Return an asyncio redis client from the shared pool, or None while redis is unavailable.
+
+    Can be called directly or used as a dependency in async routes.
+    """
+    if async_redis_pool and redis_available():
+        return aioredis.Redis(connection_pool=async_redis_pool)
+    return None
+
+
+# --------------------------------------------- response cache ---------------------------------------------
+# `cached` keeps the json body of a route's response in redis as "<tag versions>|<body>" and in a
+# small in-process L1. Every tag has a version counter in redis, bumped by `invalidate_cache_tags`
+# after a write, and a body is only served while the versions it was built under are still the
+# current ones, so an invalidation reaches every worker at once. Concurrent misses on the same key
+# share one build within a process, and wait on a short redis lock held by the building worker
+# across processes. While redis is unavailable routes are served uncached.
+
+CACHE_KEY_PREFIX = "cache:"
+CACHE_TAG_KEY_PREFIX = "cache:tag:"
+CACHE_LOCK_KEY_PREFIX = "cache:lock:"
+CACHE_TAG_TTL = 86400               # seconds, outlives any cached response
+CACHE_LOCK_POLL_INTERVAL = 0.05     # seconds between checks while another worker builds
+
+_cache_l1: OrderedDict[str, tuple[tuple[str, ...], tuple[str, ...], float, str]] = OrderedDict()
+_cache_inflight: dict[str, asyncio.Future] = {}
+
+
+def user_cache_tag(telegram_user_id: str) -> str:
+    """
+    Return the tag of everything cached for one user, bumped with the user's profile version.
+    """
+    return f"user:{telegram_user_id}"
+
+
+def _cache_tag_key(tag: str) -> str:
+    return f"{CACHE_TAG_KEY_PREFIX}{tag}"
+
+
+def _cache_key(func, kwargs: dict, vary_on_user: bool) -> str:
+    key_args = {name: value for name, value in kwargs.items() if vary_on_user or name != "telegram_user_id"}
+    digest = hashlib.sha1(json.dumps(jsonable_encoder(key_args), sort_keys=True).encode()).hexdigest()
+
+    return f"{CACHE_KEY_PREFIX}{func.__module__}.{func.__qualname__}:{digest}"
+
+
+def _cache_l1_get(key: str, versions: tuple[str, ...]) -> str | None:
+    entry = _cache_l1.get(key)
+    if entry and entry[1] == versions and entry[2] > time.monotonic():
+        _cache_l1.move_to_end(key)
+        return entry[3]
+    return None
+
+
+def _cache_l1_set(key: str, tags: tuple[str, ...], versions: tuple[str, ...], ttl: int, body: str):
+    _cache_l1[key] = (tags, versions, time.monotonic() + ttl, body)
+    _cache_l1.move_to_end(key)
+    while len(_cache_l1) > get_settings().response_cache_l1_size:
+        _cache_l1.popitem(last=False)
+
+
+def _cache_l1_drop(tags: tuple[str, ...]):
+    for key in [key for key, entry in _cache_l1.items() if set(entry[0]) & set(tags)]:
+        del _cache_l1[key]
+
+
+def _cached_body(cached_value: str | None, versions: tuple[str, ...]) -> str | None:
+    if not cached_value:
+        return None
+
+    cached_versions, _, body = cached_value.partition("|")
+    return body if tuple(cached_versions.split(",")) == versions else None
+
+
+def _json_response(body: str, cache_status: str) -> Response:
+    return Response(content=body, media_type="application/json", headers={"X-Cache": cache_status})
+
+
+def cached(ttl: int | timedelta = REDIS_EXPIRE, tags: list[str] | None = None, vary_on_user: bool = False):
+    """
+    Cache the json response of an async route.
+
+    The cache key is built from the route's arguments. Routes that depend on the current user
+    take it as `telegram_user_id` and set `vary_on_user`, their responses are then cached per
+    user and invalidated by any write to the user.
+
+    Args:
+        ttl (int | timedelta): How long a response is cached, in seconds.
+        tags (list[str]): Tags invalidated by `invalidate_cache_tags` when the data changes.
+        vary_on_user (bool): Whether the response depends on the current user.
+    """
+    ttl = int(ttl.total_seconds()) if isinstance(ttl, timedelta) else ttl
+    tags = tuple(tags or [])
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            redis_client = get_async_redis_client()
+            if not redis_client:
+                return await func(*args, **kwargs)
+
+            key = _cache_key(func, kwargs, vary_on_user)
+            key_tags = tags + ((user_cache_tag(kwargs["telegram_user_id"]),) if vary_on_user else ())
+
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.mget([_cache_tag_key(tag) for tag in key_tags])
+                pipe.get(key)
+                tag_versions, cached_value = await pipe.execute()
+            except redis.exceptions.RedisError as e:
+                print(f"Error reading cached response: {e}")
+                report_redis_failure(e)
+                return await func(*args, **kwargs)
+
+            versions = tuple(version or "0" for version in tag_versions)
+
+            body = _cache_l1_get(key, versions)
+            if body is not None:
+                return _json_response(body, "HIT")
+
+            body = _cached_body(cached_value, versions)
+            if body is not None:
+                _cache_l1_set(key, key_tags, versions, ttl, body)
+                return _json_response(body, "HIT")
+
+            # single flight: later misses in this process wait for the first one
+            if key in _cache_inflight:
+                body = await asyncio.shield(_cache_inflight[key])
+                if body is None:
+                    return await func(*args, **kwargs)
+                return _json_response(body, "MISS")
+
+            future = asyncio.get_running_loop().create_future()
+            _cache_inflight[key] = future
+            try:
+                result = await _build_response(redis_client, key, key_tags, versions, ttl, func, args, kwargs)
+                if not isinstance(result, Response):
+                    future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()      # marked as retrieved, waiters re-raise it themselves
+                raise
+            finally:
+                _cache_inflight.pop(key, None)
+                if not future.done():
+                    # uncacheable or cancelled, waiters run the route themselves
+                    future.set_result(None)
+
+            if isinstance(result, Response):
+                return result
+            return _json_response(result, "MISS")
+
+        return wrapper
+
+    return decorator
+
+
+async def _build_response(redis_client: aioredis.Redis, key, key_tags, versions, ttl, func, args, kwargs) -> str | Response:
+    lock_key = f"{CACHE_LOCK_KEY_PREFIX}{key}"
+    lock_timeout = get_settings().response_cache_lock_timeout
+
     try:
-        # production cache
-        redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True, username="default", password=REDIS_PASSWORD)
+        locked = await redis_client.set(lock_key, "1", nx=True, px=int(lock_timeout * 1000))
 
-        # local cache
-        # redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        # another worker is building the same response, wait for it up to the lock timeout
+        if not locked:
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(CACHE_LOCK_POLL_INTERVAL)
+                body = _cached_body(await redis_client.get(key), versions)
+                if body is not None:
+                    _cache_l1_set(key, key_tags, versions, ttl, body)
+                    return body
+    except redis.exceptions.RedisError as e:
+        report_redis_failure(e)
+        locked = False
 
-        redis_client.ping()  # Check connection
-        print("Connected to Redis")
-    except redis.exceptions.ConnectionError as e:
-        print(f"Error connecting to Redis: {e}")
-        redis_client = None  # Disable caching if Redis is not available
-    
-    yield redis_client
+    try:
+        result = await func(*args, **kwargs)
+
+        # responses built by the route itself, e.g. streams, are not cached
+        if isinstance(result, Response):
+            return result
+
+        body = JSONResponse(jsonable_encoder(result)).body.decode()
+
+        try:
+            await redis_client.set(key, f"{','.join(versions)}|{body}", ex=ttl)
+            _cache_l1_set(key, key_tags, versions, ttl, body)
+        except redis.exceptions.RedisError as e:
+            print(f"Error caching response: {e}")
+            report_redis_failure(e)
+
+        return body
+    finally:
+        if locked:
+            try:
+                await redis_client.delete(lock_key)
+            except redis.exceptions.RedisError as e:
+                report_redis_failure(e)
+
+
+def _queue_tag_invalidation(pipe, tags: tuple[str, ...]):
+    for tag in tags:
+        pipe.incr(_cache_tag_key(tag))
+        pipe.expire(_cache_tag_key(tag), CACHE_TAG_TTL)
+
+
+def invalidate_cache_tags(*tags: str):
+    """
+    Invalidate every cached response carrying one of the tags, to be called after the write.
+    """
+    _cache_l1_drop(tags)
+
+    redis_client = get_sync_redis_client()
+    if not redis_client or not tags:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_tag_invalidation(pipe, tags)
+        pipe.execute()
+    except redis.exceptions.RedisError as e:
+        print(f"Error invalidating cached responses: {e}")
+        report_redis_failure(e)
+
+
+async def invalidate_cache_tags_async(*tags: str):
+    """
+    Async variant of `invalidate_cache_tags` for async routes.
+    """
+    _cache_l1_drop(tags)
+
+    redis_client = get_async_redis_client()
+    if not redis_client or not tags:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_tag_invalidation(pipe, tags)
+        await pipe.execute()
+    except redis.exceptions.RedisError as e:
+        print(f"Error invalidating cached responses: {e}")
+        report_redis_failure(e)
 
 
 
@@ -95,9 +455,11 @@ collection_names = [
     'users',
     'invites_ref',
     'coin_stats',
+    'coin_stats_daily',
     'tasks',
     'rewards',
     'clans',
+    'clan_settlements',
     'challenges',
     'extra_boosts',
     'levels'
@@ -112,11 +474,36 @@ for collection_name in collection_names:
 admin_collection = db['admins']
 user_collection = db['users']
 invites_ref = db['invites_ref']
-coin_stats = db['coin_stats']
+coin_stats = db['coin_stats']            # legacy per-user documents, see migrate_coin_stats.py
+coin_stats_daily = db['coin_stats_daily']
 task_collection = db['tasks']
 rewards_collection = db['rewards']
 challenges_collection = db['challenges']
 extra_boosts_collection = db['extra_boosts']
 levels_collection = db['levels']
 clans_collection = db['clans']
+clan_settlements = db['clan_settlements']    # progress of the daily clan earnings settlement
+
+
+# --------------------------------------------- async mongo connection ---------------------------------------------
+# non-blocking access to the same database for async routes, the client connects lazily on first use
+async_client: AsyncMongoClient = AsyncMongoClient(connection_string, event_listeners=[query_metrics_listener])
+async_db = async_client['bored-tap']
+
+async_admin_collection = async_db['admins']
+async_user_collection = async_db['users']
+async_invites_ref = async_db['invites_ref']
+async_coin_stats_daily = async_db['coin_stats_daily']
+async_task_collection = async_db['tasks']
+async_rewards_collection = async_db['rewards']
+async_challenges_collection = async_db['challenges']
+async_extra_boosts_collection = async_db['extra_boosts']
+async_levels_collection = async_db['levels']
+async_clans_collection = async_db['clans']
 
+
+async def close_async_mongo():
+    """
+    Close every pooled connection of the async mongo client.
+    """
+    await async_client.close()
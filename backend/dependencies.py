@@ -1,67 +1,56 @@
-from database_connection import fs
-from datetime import date, datetime
-from io import BytesIO
-from bson import ObjectId
-from fastapi.responses import StreamingResponse
-from models import CoinStats
-from database_connection import user_collection, invites_ref, coin_stats
+from fastapi import Request
+from media.dependencies import stream_image
+from datetime import datetime
+from coin_engine import add_daily_coins, add_daily_coins_async, credit_coins, credit_coins_async, user_levels
+from database_connection import user_collection, async_user_collection, async_invites_ref
 from tasks.dependencies import get_user
+from invite.dependencies import invitees_page_pipeline
+from user_hydration import INVITEE_PROJECTION, hydrate_users_async
+from user_reg_and_prof_mngmnt.profile_cache import get_cached_profile, invalidate_profile, invalidate_profile_async
+from leaderboard.dependencies import record_coins, record_coins_async
 from user_reg_and_prof_mngmnt.schemas import InviteeData, Update, UserProfile
 
 
-user_levels: dict[int, list] = {
-    # level: [coins, level name]
-    1: [0, "Novice"],
-    2: [5000, "Explorer"],
-    3: [25000, "Apprentice"],
-    4: [100000, "Warrior"],
-    5: [500000, "Master"],
-    6: [1000000, "Champion"],
-    7: [20000000, "Tactician"],
-    8: [100000000, "Specialist"],
-    9: [500000000, "Conqueror"],
-    10:[1000000000, "Legend"]
-}
 referral_url_prefix = "https://t.me/Bored_Tap_Bot?start="
 
 
 # update user coins in db
 def update_coins_in_db(telegram_user_id: str, coins: int):
-    # update coins
-    query = {'telegram_user_id': telegram_user_id}
-    coin_update_operation = {'$inc':
-        {'total_coins': coins}
-    }
-    my_result = user_collection.update_one(query, coin_update_operation)
+    # update coins and level in one write
+    user = credit_coins(telegram_user_id, coins)
+    my_result = user is not None
 
-    if my_result.modified_count == 1:
-        my_result = True
-    else:
-        my_result = False
+    # update coin stats in db
+    if my_result:
+        coin_stats_result = update_coin_stats(telegram_user_id, coins)
+        print(coin_stats_result)
 
-    # update level
-    new_level = update_level_logic(telegram_user_id)
-    level_update_operation = {
-        '$set': {
-            'level': new_level['level'],
-            'level_name': new_level['level_name']
-        }
+    return {
+        'my_result': my_result,
+        'level_update_result': my_result,
+        'total_coins': user.get('total_coins') if user else None,
+        'level': user.get('level') if user else None,
+        'level_name': user.get('level_name') if user else None
     }
 
-    level_update_result = user_collection.update_one(query, level_update_operation)
 
-    if level_update_result.modified_count:
-        level_update_result = True
-    else:
-        level_update_result = False
-    
-    # update coin stats in db
-    coin_stats_result = update_coin_stats(telegram_user_id, coins)
-    print(coin_stats_result)
+async def update_coins_in_db_async(telegram_user_id: str, coins: int):
+    """
+    Async variant of `update_coins_in_db` for async routes.
+    """
+    user = await credit_coins_async(telegram_user_id, coins)
+    my_result = user is not None
+
+    if my_result:
+        coin_stats_result = await update_coin_stats_async(telegram_user_id, coins)
+        print(coin_stats_result)
 
     return {
         'my_result': my_result,
-        'level_update_result': level_update_result
+        'level_update_result': my_result,
+        'total_coins': user.get('total_coins') if user else None,
+        'level': user.get('level') if user else None,
+        'level_name': user.get('level_name') if user else None
     }
 
 
@@ -71,6 +60,7 @@ def update_auto_bot_active_status(telegram_user_id: str, auto_bot_active: bool):
     update_operation = {'$set': {'auto_bot_active': auto_bot_active}}
 
     my_result = user_collection.update_one(query, update_operation)
+    invalidate_profile(telegram_user_id)
 
     if my_result.modified_count == 1:
         my_result = True
@@ -95,6 +85,7 @@ def update_power_limit_last_active_time_autobot(
         }
     }
     my_result = user_collection.update_one(query, power_limit_update_operation)
+    invalidate_profile(telegram_user_id)
 
     if my_result.modified_count == 1:
         my_result = True
@@ -104,6 +95,50 @@ def update_power_limit_last_active_time_autobot(
     return my_result
 
 
+async def update_power_limit_last_active_time_autobot_async(
+        telegram_user_id: str,
+        power_limit: int,
+        last_active_time: datetime,
+        auto_bot_active: bool = False):
+    """
+    Async variant of `update_power_limit_last_active_time_autobot` for async routes.
+    """
+    query = {'telegram_user_id': telegram_user_id}
+    power_limit_update_operation = {'$set':
+        {
+            'power_limit': power_limit,
+            'last_active_time': last_active_time,
+            'auto_bot_active': auto_bot_active
+        }
+    }
+    my_result = await async_user_collection.update_one(query, power_limit_update_operation)
+    await invalidate_profile_async(telegram_user_id)
+
+    return my_result.modified_count == 1
+
+
+def all_updates_result(user: dict | None) -> dict:
+    """
+    Build the response of an update of coins, power limit, last active time and auto bot status at once.
+
+    Args:
+        user (dict | None): The user's coins and level after the update, or None if no user matched.
+
+    Returns:
+        dict: The status of each update and the user's level.
+    """
+    updated = user is not None
+
+    return {
+        'coin update': updated,
+        'power limit update': updated,
+        'last active time update': updated,
+        'auto bot active update': updated,
+        'level': user.get('level') if user else None,
+        'level_name': user.get('level_name') if user else None
+    }
+
+
 # update coins, power limit, last active time and autobot active status at once
 def update_coins_power_limit_last_active_time_autobot(
         telegram_user_id: str,
@@ -112,91 +147,80 @@ def update_coins_power_limit_last_active_time_autobot(
         last_active_time: datetime,
         auto_bot_active: bool = False
     ):
-    query = {'telegram_user_id': telegram_user_id}
-    update_operation = {
-        '$set': {
-                'power_limit': power_limit,
-                'last_active_time': last_active_time,
-                'auto_bot_active': auto_bot_active
-            },
-        '$inc': {
-            'total_coins': coins
+    user = credit_coins(
+        telegram_user_id,
+        coins,
+        extra_set={
+            'power_limit': power_limit,
+            'last_active_time': last_active_time,
+            'auto_bot_active': auto_bot_active
         }
-    }
-    my_result = user_collection.update_one(query, update_operation)
+    )
+    my_result = user is not None
 
-    if my_result.modified_count == 1:
-        my_result = True
-    else:
-        my_result = False
+    # update coin stats in db
+    if my_result:
+        coin_stats_result = update_coin_stats(telegram_user_id, coins)
+        print(coin_stats_result)
 
-    # update level
-    new_level = update_level_logic(telegram_user_id)
-    level_update_operation = {
-        '$set': {
-            'level': new_level['level'],
-            'level_name': new_level['level_name']
+    return all_updates_result(user)
+
+
+async def update_coins_power_limit_last_active_time_autobot_async(
+        telegram_user_id: str,
+        coins: int,
+        power_limit: int,
+        last_active_time: datetime,
+        auto_bot_active: bool = False
+    ):
+    """
+    Async variant of `update_coins_power_limit_last_active_time_autobot` for async routes.
+    """
+    user = await credit_coins_async(
+        telegram_user_id,
+        coins,
+        extra_set={
+            'power_limit': power_limit,
+            'last_active_time': last_active_time,
+            'auto_bot_active': auto_bot_active
         }
-    }
-    level_update_result = user_collection.update_one(query, level_update_operation)
+    )
+    my_result = user is not None
 
-    if level_update_result.modified_count:
-        level_update_result = True
-    else:
-        level_update_result = False
-    
-    # update coin stats in db
-    coin_stats_result = update_coin_stats(telegram_user_id, coins)
-    print(coin_stats_result)
+    if my_result:
+        coin_stats_result = await update_coin_stats_async(telegram_user_id, coins)
+        print(coin_stats_result)
 
-    return {
-        'coin update': my_result,
-        'power limit update': my_result,
-        'last active time update': my_result,
-        'auto bot active update': my_result,
-        'level': new_level['level'],
-        'level_name': new_level['level_name']
-    }
+    return all_updates_result(user)
 
 
 def update_coin_stats(telegram_user_id: str, coins_tapped:int):
-    # today's date
-    today = date.today()
-
-    # get current user coin stat
-    user_query = {'telegram_user_id': telegram_user_id}
-    user_stats = coin_stats.find_one(user_query)
-    # print(user_stats)
-
-    if user_stats:
-        # user_stats['date'][str(today)]
-        # update coins
-        coin_update_operation = {'$inc':
-            {'date.' + str(today): coins_tapped},
-        }
+    # increment today's coins, creating the user's bucket for the day if needed
+    my_result = add_daily_coins(telegram_user_id, coins_tapped)
 
-        my_result = coin_stats.update_one(user_query, coin_update_operation, upsert=True)
-        if my_result.modified_count == 1:
-            my_result = {'status': True, 'message': 'Coin statistics updated successfully'}
-        else:
-            my_result = {'status': False, 'message': 'Failed to update coin statistics'}
-        return my_result
-
-    # create new user coin stat
-    new_user_stats = CoinStats(
-        telegram_user_id=telegram_user_id,
-        date={str(today): coins_tapped}
-    )
-    my_result = coin_stats.insert_one(new_user_stats.model_dump())
+    # keep the leaderboards in step with every credit
+    record_coins(telegram_user_id, coins_tapped)
 
-    if my_result.inserted_id:
+    if my_result.modified_count == 1 or my_result.upserted_id:
         my_result = {'status': True, 'message': 'Coin statistics updated successfully'}
     else:
-        my_result = {'status': False, 'message': 'Failed to update coin'}
+        my_result = {'status': False, 'message': 'Failed to update coin statistics'}
 
     return my_result
 
 
+async def update_coin_stats_async(telegram_user_id: str, coins_tapped: int):
+    """
+    Async variant of `update_coin_stats` for async routes.
+    """
+    my_result = await add_daily_coins_async(telegram_user_id, coins_tapped)
+    await record_coins_async(telegram_user_id, coins_tapped)
+
+    if my_result.modified_count == 1 or my_result.upserted_id:
+        return {'status': True, 'message': 'Coin statistics updated successfully'}
+    return {'status': False, 'message': 'Failed to update coin statistics'}
+
+
 def get_user_by_id(telegram_user_id: str) -> Update:
     """
     Retrieve a user by their telegram user ID.
@@ -270,35 +294,13 @@ def update_level_logic(telegram_user_id: str):
     }
 
 
-def get_user_profile(telegram_user_id: str) -> UserProfile:
+async def _load_profile(telegram_user_id: str) -> UserProfile | None:
     """
-    Retrieve a user by their telegram user ID.
-
-    Args:   
-        telegram_user_id (str): The telegram user ID of the user to retrieve.
-
-    Returns:
-        UserProfile: The user data if found, otherwise None.
+    Build a user's profile from the database, without their invitees.
     """
-    user: dict = user_collection.find_one({"telegram_user_id": telegram_user_id})
-    user_invitees_ref = invites_ref.find_one({'inviter_telegram_id': telegram_user_id})
-    
-    if user:
-        # get invitees data
-        invitees: list[InviteeData] = []
-        if user_invitees_ref:
-            invitees_ref: list[str] = user_invitees_ref["invitees"]
-
-            for id in invitees_ref:
-                invitee = user_collection.find_one({"telegram_user_id": id})
-                if invitee:
-                    invitee_data = InviteeData(
-                        username=invitee.get("username"),
-                        level=invitee.get("level"),
-                        total_coins=invitee.get("total_coins")
-                    )
-                    invitees.append(invitee_data)
+    user: dict = await async_user_collection.find_one({"telegram_user_id": telegram_user_id})
 
+    if user:
         user_data = UserProfile(
             id=str(user.get('_id')),
             telegram_user_id=user.get('telegram_user_id'),
@@ -314,19 +316,65 @@ def get_user_profile(telegram_user_id: str) -> UserProfile:
             referral_url=referral_url_prefix + telegram_user_id,
             is_active=user.get('is_active'),
             streak=user.get('streak'),
-            invite=invitees,
+            invite=[],
+            invite_count=0,
             clan=user.get('clan'),
         )
         return user_data
     return None
 
 
+async def get_user_profile(
+        telegram_user_id: str,
+        invitee_skip: int = 0,
+        invitee_limit: int | None = None
+    ) -> UserProfile:
+    """
+    Retrieve a user by their telegram user ID.
+
+    The user's own fields come from the profile cache. Invitees' coins and levels change
+    without a write to the user, so they are read on every call instead of being cached.
+
+    Args:   
+        telegram_user_id (str): The telegram user ID of the user to retrieve.
+        invitee_skip (int): The number of invitees to skip, when paginating.
+        invitee_limit (int | None): The maximum number of invitees to include, None for all of them.
+
+    Returns:
+        UserProfile: The user data if found, otherwise None.
+    """
+    user_data = await get_cached_profile(telegram_user_id, lambda: _load_profile(telegram_user_id))
+    if not user_data:
+        return None
+
+    user_invitees_ref = await (await async_invites_ref.aggregate(
+        invitees_page_pipeline(telegram_user_id, invitee_skip, invitee_limit)
+    )).to_list()
+
+    # get the invitees data in one query
+    invitees: list[InviteeData] = []
+    invite_count = 0
+    if user_invitees_ref:
+        invite_count = user_invitees_ref[0]["invite_count"]
+
+        for invitee in await hydrate_users_async(user_invitees_ref[0]["invitees"], INVITEE_PROJECTION):
+            invitee_data = InviteeData(
+                username=invitee.get("username"),
+                level=invitee.get("level"),
+                total_coins=invitee.get("total_coins")
+            )
+            invitees.append(invitee_data)
+
+    return user_data.model_copy(update={"invite": invitees, "invite_count": invite_count})
+
+
 # update user photo_url
 def update_photo_url(telegram_user_id: str, photo_url: str):
     user_query = {"telegram_user_id": telegram_user_id}
     update_operation = {"$set": {"image_url": photo_url}}
 
     my_result = user_collection.update_one(user_query, update_operation)
+    invalidate_profile(telegram_user_id)
 
     if my_result.modified_count > 0:
         return {"status": True, "message": "Photo URL updated successfully"}
@@ -334,12 +382,8 @@ def update_photo_url(telegram_user_id: str, photo_url: str):
         return {"status": False, "message": "Failed to update photo URL"}
 
 
-def get_image(image_id: str):
-    image = fs.get(ObjectId(image_id))
-    image_buffer = BytesIO(image.read())
-    image_buffer.seek(0)
-
-    return StreamingResponse(image_buffer, media_type="image/jpeg")
+def get_image(image_id: str, request: Request | None = None):
+    return stream_image(image_id, request)
 
 
 # Function to convert datetime objects in a dictionary or list to ISO format strings
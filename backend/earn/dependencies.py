@@ -1,12 +1,13 @@
 from datetime import datetime, timedelta
-from dependencies import update_coin_stats
-from earn.schemas import StreakData, Update
-from database_connection import user_collection
+from coin_engine import USER_COIN_PROJECTION, credit_coins_async
+from dependencies import update_coin_stats_async
+from earn.schemas import StreakData
+from database_connection import async_user_collection
 from user_reg_and_prof_mngmnt.schemas import UserProfile
 
 
 # get current streak from db
-def get_current_streak(telegram_user_id: str) -> StreakData:
+async def get_current_streak(telegram_user_id: str) -> StreakData:
     """
     Retrieves the current streak of a user from the database.
 
@@ -16,7 +17,7 @@ def get_current_streak(telegram_user_id: str) -> StreakData:
     Returns:
         int: The current streak of the user.
     """
-    user: UserProfile = user_collection.find_one({'telegram_user_id': telegram_user_id})
+    user: UserProfile = await async_user_collection.find_one({'telegram_user_id': telegram_user_id})
 
     if user:
         streak = StreakData(
@@ -27,21 +28,6 @@ def get_current_streak(telegram_user_id: str) -> StreakData:
         return streak
     return None
 
-# initialize user streak
-def init_streak(telegram_user_id: str, init_streak: StreakData, daily_reward_amount: int):
-    """
-    Resets the streak of a user to its initial state.
-    """
-    query = {'telegram_user_id': telegram_user_id}
-    update_operation = {
-        '$set': {'streak': init_streak.model_dump()},
-        '$inc': {'total_coins': daily_reward_amount}
-        }
-    user_collection.update_one(query, update_operation)
-    update_coin_stats(telegram_user_id, daily_reward_amount)
-    return
-
-
 def calculate_time_difference(current_date: datetime, last_action_date: datetime):
     """
     Calculate the time difference between two datetime objects in hours.
@@ -56,25 +42,68 @@ def calculate_time_difference(current_date: datetime, last_action_date: datetime
     return past_hours
 
 
-# update user streak and coin in db
-def increment_streak_and_coin(telegram_user_id: str, daily_reward_amount: int,
-                        new_streak: StreakData):
-    query_filter = {'telegram_user_id': telegram_user_id}
-    update_operation = {
-        '$set': {'streak': new_streak.model_dump()},
-        '$inc': {'total_coins': daily_reward_amount},
-    }
-    user_collection.update_one(query_filter, update_operation)
-    update_coin_stats(telegram_user_id, daily_reward_amount)
-    return
-
-def broken_streak_reset(telegram_user_id: str, reset_streak: StreakData, daily_reward_amount: int):
-    query_filter = {'telegram_user_id': telegram_user_id}
-    update_operation = {
-        '$set': {'streak': reset_streak.model_dump()},
-        '$inc': {'total_coins': daily_reward_amount},
+# ------------------------------ STREAK UPDATE ------------------------------ #
+# A check-in is one conditional credit of the user: it only matches when the user has no streak
+# yet or their last check-in is at least a day old, and its pipeline continues the streak
+# (checked in again within two days) or restarts it, credits the daily reward and returns the
+# new streak. Concurrent check-ins of a user credit the reward once.
+
+STREAK_INTERVAL = timedelta(hours=24)     # wait between check-ins
+STREAK_GRACE = timedelta(hours=48)        # a later check-in restarts the streak
+
+
+def streak_pipeline(current_date: datetime) -> list[dict]:
+    """
+    Build the update pipeline stages that record a check-in, run before the daily reward's credit.
+
+    Args:
+        current_date (datetime): The time of the check-in.
+
+    Returns:
+        list[dict]: The update pipeline stages.
+    """
+    last_action_date = {"$ifNull": ["$streak.last_action_date", None]}
+    continues = {
+        "$and": [
+            {"$ne": [last_action_date, None]},
+            {"$lte": [{"$subtract": [current_date, last_action_date]}, STREAK_GRACE.total_seconds() * 1000]}
+        ]
     }
-    user_collection.update_one(query_filter, update_operation)
-    update_coin_stats(telegram_user_id, daily_reward_amount)
-    return
 
+    return [
+        {"$set": {
+            "streak.current_streak": {"$cond": [continues, {"$add": [{"$ifNull": ["$streak.current_streak", 0]}, 1]}, 1]},
+            "streak.last_action_date": current_date
+        }},
+        {"$set": {"streak.longest_streak": {"$max": [{"$ifNull": ["$streak.longest_streak", 0]}, "$streak.current_streak"]}}}
+    ]
+
+
+async def update_streak(telegram_user_id: str, current_date: datetime, daily_reward_amount: int) -> StreakData | None:
+    """
+    Record a daily check-in of a user, crediting the daily reward.
+
+    Args:
+        telegram_user_id (str): The Telegram user ID of the user.
+        current_date (datetime): The time of the check-in.
+        daily_reward_amount (int): The coins credited for the check-in.
+
+    Returns:
+        StreakData | None: The new streak, or None if the user checked in less than a day ago.
+    """
+    user = await credit_coins_async(
+        telegram_user_id,
+        daily_reward_amount,
+        extra_filter={"$or": [
+            {"streak.last_action_date": None},
+            {"streak.last_action_date": {"$lte": current_date - STREAK_INTERVAL}}
+        ]},
+        extra_stages=streak_pipeline(current_date),
+        projection={**USER_COIN_PROJECTION, "streak": 1}
+    )
+    if not user:
+        return None
+
+    await update_coin_stats_async(telegram_user_id, daily_reward_amount)
+
+    return StreakData(**user["streak"])
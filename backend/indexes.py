@@ -0,0 +1,167 @@
+import argparse
+import importlib
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+from database_connection import client, db
+
+
+# ------------------------------ INDEX REGISTRY ------------------------------ #
+# Every subsystem declares the indexes its queries rely on with `register_indexes`, next to
+# the queries themselves. The registry is applied at startup, creating whatever is missing;
+# existing indexes with the same keys are left untouched, so applying it is idempotent.
+
+# modules that contribute to the registry, imported before it is applied or reported
+INDEX_MODULES = [
+    "coin_engine",
+    "leaderboard.dependencies",
+    "user_reg_and_prof_mngmnt.dependencies",
+    "invite.dependencies",
+    "clan.dependencies",
+    "tasks.dependencies",
+    "superuser.task.dependencies",
+    "reward.dependencies",
+    "superuser.reward.dependencies",
+    "challenge.dependencies",
+    "superuser.challenge.dependencies",
+    "superuser.level.dependencies",
+    "superuser.boost.dependencies",
+    "superuser.dashboard.admin_auth",
+    "media.dependencies",
+]
+
+_registry: dict[str, list[IndexModel]] = {}
+_databases: dict[str, str] = {}     # collections outside of the main database
+
+
+def register_indexes(collection_name: str, *indexes: IndexModel, database: str | None = None):
+    """
+    Declare indexes required on a collection.
+
+    Args:
+        collection_name (str): The name of the collection.
+        *indexes (IndexModel): The indexes, declared as pymongo index models.
+        database (str | None): The database of the collection, when it is not the main one.
+    """
+    if database:
+        _databases[collection_name] = database
+
+    declared = _registry.setdefault(collection_name, [])
+    known_keys = {_index_keys(index.document) for index in declared}
+
+    for index in indexes:
+        if _index_keys(index.document) not in known_keys:
+            declared.append(index)
+            known_keys.add(_index_keys(index.document))
+
+
+def _index_keys(index: dict) -> tuple:
+    return tuple((field, direction) for field, direction in index["key"].items())
+
+
+def _collection(collection_name: str):
+    return client[_databases.get(collection_name, db.name)][collection_name]
+
+
+def load_index_registry() -> dict[str, list[IndexModel]]:
+    """
+    Import every contributing module and return the collected registry.
+    """
+    for module in INDEX_MODULES:
+        importlib.import_module(module)
+
+    return _registry
+
+
+def apply_indexes() -> dict[str, list[str]]:
+    """
+    Create every registered index that does not exist yet.
+
+    An index that cannot be built, e.g. a unique index over existing duplicates, is
+    reported and skipped so the app still starts.
+
+    Returns:
+        dict[str, list[str]]: The names of the indexes created, per collection.
+    """
+    created = {}
+
+    for collection_name, indexes in load_index_registry().items():
+        collection = _collection(collection_name)
+        existing = {_index_keys(index) for index in collection.list_indexes()}
+
+        for index in indexes:
+            if _index_keys(index.document) in existing:
+                continue
+
+            try:
+                name = collection.create_indexes([index])[0]
+                created.setdefault(collection_name, []).append(name)
+            except OperationFailure as e:
+                print(f"Error creating index {index.document['name']} on {collection_name}: {e}")
+
+    if created:
+        print(f"Indexes created: {created}")
+    return created
+
+
+# ------------------------------ INDEX REPORT ------------------------------ #
+def index_report() -> dict[str, dict]:
+    """
+    Compare the registry against the database.
+
+    Returns:
+        dict[str, dict]: Per collection, the registered indexes that are `missing`, the indexes
+        that exist but are not registered (`undeclared`) and the indexes never used since the
+        server started (`unused`, from $indexStats).
+    """
+    report = {}
+
+    for collection_name in sorted(set(load_index_registry()) | set(db.list_collection_names())):
+        collection = _collection(collection_name)
+        declared = {_index_keys(index.document): index.document["name"] for index in _registry.get(collection_name, [])}
+        existing = {_index_keys(index): index["name"] for index in collection.list_indexes()}
+
+        usage = {}
+        try:
+            for stats in collection.aggregate([{"$indexStats": {}}]):
+                usage[stats["name"]] = stats["accesses"]["ops"]
+        except OperationFailure as e:
+            print(f"Error reading index stats of {collection_name}: {e}")
+
+        report[collection_name] = {
+            "missing": [name for keys, name in declared.items() if keys not in existing],
+            "undeclared": [name for keys, name in existing.items() if keys not in declared and name != "_id_"],
+            "unused": [name for name, ops in usage.items() if ops == 0 and name != "_id_"],
+        }
+
+    return report
+
+
+def print_index_report():
+    for collection_name, result in index_report().items():
+        if not any(result.values()):
+            continue
+
+        print(collection_name)
+        for status, names in result.items():
+            for name in names:
+                print(f"    {status:<10} {name}")
+
+
+def main(argv: list[str] | None = None):
+    """
+    Command line entry point: `python indexes.py report` or `python indexes.py apply`.
+    """
+    parser = argparse.ArgumentParser(description="Manage the indexes declared by the app.")
+    parser.add_argument("command", choices=["report", "apply"], help="report missing and unused indexes, or create missing ones")
+    args = parser.parse_args(argv)
+
+    if args.command == "apply":
+        apply_indexes()
+    else:
+        print_index_report()
+
+
+if __name__ == "__main__":
+    # run as a script this file is `__main__`, not the `indexes` module the subsystems register
+    # their indexes with, so go through the imported module and its registry
+    importlib.import_module("indexes").main()
@@ -3,6 +3,12 @@ import segno
 from user_reg_and_prof_mngmnt.schemas import BasicProfile
 from .schemas import Invitee
 from database_connection import user_collection, invites_ref
+from pymongo import IndexModel
+from indexes import register_indexes
+from user_hydration import INVITEE_PROJECTION, hydrate_users
+
+
+register_indexes("invites_ref", IndexModel([("inviter_telegram_id", 1)], unique=True))
 
 
 def generate_qr_code(data: str):
@@ -54,32 +60,46 @@ def get_user_by_id(telegram_user_id: str) -> BasicProfile:
     return None
 
 
-def get_user_invitees(telegram_user_id: str) -> list[Invitee] | list:
+def invitees_page_pipeline(telegram_user_id: str, skip: int = 0, limit: int | None = None) -> list[dict]:
     """
-    Retrieve a user by their telegram user ID.
+    Build the aggregation that returns a user's invitee ids, or one page of them, and their invite count.
+    """
+    invitees = {"$ifNull": ["$invitees", []]}
+
+    return [
+        {"$match": {"inviter_telegram_id": telegram_user_id}},
+        {"$project": {
+            "_id": 0,
+            "invitees": {"$slice": [invitees, skip, limit]} if limit else invitees,
+            "invite_count": {"$size": invitees}
+        }}
+    ]
+
+
+def get_user_invitees(telegram_user_id: str, skip: int = 0, limit: int | None = None) -> list[Invitee] | list:
+    """
+    Retrieve the users invited by a user, or a page of them.
 
     Args:
-        telegram_user_id (str): The telegram user ID of the user to retrieve.
+        telegram_user_id (str): The telegram user ID of the inviter.
+        skip (int): The number of invitees to skip, when paginating.
+        limit (int | None): The maximum number of invitees to return, None for all of them.
 
     Returns:
-        BasicProfile: The user data if found, otherwise None.
+        list[Invitee]: The invitees, in the order they were invited.
     """
-    user_invitees_ref = invites_ref.find_one({'inviter_telegram_id': telegram_user_id})
+    user_invitees_ref = next(invites_ref.aggregate(invitees_page_pipeline(telegram_user_id, skip, limit)), None)
     invitees: list[Invitee] = []
     
     if user_invitees_ref:
-        invitees_ref: list[str] = user_invitees_ref["invitees"]
-
-        for id in invitees_ref:
-            invitee: dict = user_collection.find_one({"telegram_user_id": id})
-            if invitee:
-                invitee_data = Invitee(
-                    telegram_user_id=id,
-                    username=invitee.get("username"),
-                    level=invitee.get("level"),
-                    image_url=invitee.get("image_url", None),
-                    total_coins=invitee.get("total_coins"),
-                    invites=len(invitee["invite"]),
-                )
-                invitees.append(invitee_data)
+        for invitee in hydrate_users(user_invitees_ref["invitees"], INVITEE_PROJECTION):
+            invitee_data = Invitee(
+                telegram_user_id=invitee["telegram_user_id"],
+                username=invitee.get("username"),
+                level=invitee.get("level"),
+                image_url=invitee.get("image_url", None),
+                total_coins=invitee.get("total_coins"),
+                invites=invitee.get("invites", 0),
+            )
+            invitees.append(invitee_data)
     return invitees
@@ -1,5 +1,5 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from fastapi.responses import StreamingResponse
 from .dependencies import get_user_invitees, get_user_by_id
 from invite.dependencies import generate_qr_code
@@ -22,8 +22,13 @@ async def generate_invite_qr_code(telegram_user_id: Annotated[str, Depends(get_c
     return response
 
 @inviteApp.get("/invitees", tags=["Invite features"])
-async def get_invitees(telegram_user_id: Annotated[str, Depends(get_current_user)]):
-    """This route returns a list of users that have been invited by the current user."""
-    invitees = get_user_invitees(telegram_user_id)
+async def get_invitees(
+    telegram_user_id: Annotated[str, Depends(get_current_user)],
+    page: int = Query(1, ge=1, description="Page number, when a page size is given"),
+    page_size: int | None = Query(None, ge=1, le=200, description="Page size, omit for every invitee"),
+):
+    """This route returns the users that have been invited by the current user, or a page of them."""
+    skip = (page - 1) * page_size if page_size else 0
+    invitees = get_user_invitees(telegram_user_id, skip, page_size)
 
     return invitees
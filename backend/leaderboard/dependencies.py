@@ -0,0 +1,699 @@
+import asyncio
+import base64
+import calendar
+import json
+from datetime import date, timedelta
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+from coin_engine import daily_coins_pipeline, stats_today
+from database_connection import (
+    async_user_collection,
+    async_coin_stats_daily,
+    get_async_redis_client,
+    get_sync_redis_client,
+    report_redis_failure
+)
+from superuser.leaderboard.schemas import LeaderBoard, LeaderboardPage, LeaderboardType
+from pymongo import IndexModel
+from indexes import register_indexes
+
+
+# leaderboard pages and rank lookups walk users by (total coins, telegram user id)
+register_indexes("users", IndexModel([("total_coins", -1), ("telegram_user_id", -1)]))
+
+
+# ------------------------------ SORTED-SET LEADERBOARDS ------------------------------ #
+# Every leaderboard is a redis sorted set of telegram_user_id -> coins, kept up to date with
+# ZINCRBY wherever coins are credited. Period boards get their own key per day, ISO week and
+# month, and expire once the period is well over.
+
+LEADERBOARD_KEY_PREFIX = "leaderboard:"
+LEADERBOARD_READY_KEY = "leaderboard:ready"
+LEADERBOARD_REBUILD_LOCK_KEY = "leaderboard:rebuild_lock"
+LEADERBOARD_REBUILD_LOG_KEY = "leaderboard:rebuild_log"
+LEADERBOARD_REBUILD_LOG_PASSES = 3     # times the log is drained after the swap
+LEADERBOARD_PAGE_SIZE = 100
+LEADERBOARD_MAX_PAGE_SIZE = 500
+PERIOD_LEADERBOARDS = (LeaderboardType.DAILY, LeaderboardType.WEEKLY, LeaderboardType.MONTHLY)
+LEADERBOARD_TTLS = {
+    LeaderboardType.DAILY: timedelta(days=3),
+    LeaderboardType.WEEKLY: timedelta(days=15),
+    LeaderboardType.MONTHLY: timedelta(days=70),
+}
+HYDRATION_PROJECTION = {
+    "_id": 0,
+    "telegram_user_id": 1,
+    "username": 1,
+    "image_url": 1,
+    "level": 1,
+    "level_name": 1,
+    "clan.name": 1,
+    "streak.longest_streak": 1
+}
+
+# log the users whose scores change while a rebuild holds its lock
+_LOG_REBUILD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('SADD', KEYS[2], unpack(ARGV))
+end
+return 1
+"""
+
+# set when an increment could not be recorded, the boards are rebuilt on next read
+_leaderboards_stale = False
+_stale_marks = 0
+_rebuild_tasks: set[asyncio.Task] = set()
+
+
+def leaderboard_key(category: LeaderboardType, day: date | None = None) -> str:
+    """
+    Return the redis key of a leaderboard for the period containing the given day.
+
+    Args:
+        category (LeaderboardType): The leaderboard period.
+        day (date | None): Any day in the period, defaults to today.
+
+    Returns:
+        str: The sorted-set key.
+    """
+    day = day or stats_today()
+
+    if category == LeaderboardType.DAILY:
+        return f"{LEADERBOARD_KEY_PREFIX}daily:{day.isoformat()}"
+
+    if category == LeaderboardType.WEEKLY:
+        iso_year, iso_week, _ = day.isocalendar()
+        return f"{LEADERBOARD_KEY_PREFIX}weekly:{iso_year}-W{iso_week:02d}"
+
+    if category == LeaderboardType.MONTHLY:
+        return f"{LEADERBOARD_KEY_PREFIX}monthly:{day.strftime('%Y-%m')}"
+
+    return f"{LEADERBOARD_KEY_PREFIX}all_time"
+
+
+def _queue_increments(pipe, increments: list[tuple[str, int, date]], periods: bool = True):
+    expiring_keys = {}
+
+    for telegram_user_id, coins, day in increments:
+        pipe.zincrby(leaderboard_key(LeaderboardType.ALL_TIME), coins, telegram_user_id)
+
+        if periods:
+            for category in PERIOD_LEADERBOARDS:
+                key = leaderboard_key(category, day)
+                pipe.zincrby(key, coins, telegram_user_id)
+                expiring_keys[key] = LEADERBOARD_TTLS[category]
+
+    for key, ttl in expiring_keys.items():
+        pipe.expire(key, ttl)
+
+    if increments:
+        user_ids = list(dict.fromkeys(telegram_user_id for telegram_user_id, _, _ in increments))
+        pipe.eval(_LOG_REBUILD_SCRIPT, 2, LEADERBOARD_REBUILD_LOCK_KEY, LEADERBOARD_REBUILD_LOG_KEY, *user_ids)
+
+
+def mark_leaderboards_stale():
+    """
+    Flag the leaderboards for a rebuild, e.g. after increments that may have been double counted.
+    """
+    global _leaderboards_stale, _stale_marks
+    _leaderboards_stale = True
+    _stale_marks += 1
+
+
+def _mark_stale(error: Exception):
+    print(f"Error recording leaderboard coins: {error}")
+    report_redis_failure(error)
+    mark_leaderboards_stale()
+
+
+def _schedule_rebuild():
+    # reads keep asking while the boards are stale, one rebuild per process answers them all
+    if any(not task.done() for task in _rebuild_tasks):
+        return
+
+    task = asyncio.create_task(rebuild_leaderboards())
+    _rebuild_tasks.add(task)
+    task.add_done_callback(_rebuild_tasks.discard)
+
+
+def record_coins(telegram_user_id: str, coins: int, periods: bool = True):
+    """
+    Add coins to a user's score on every current leaderboard.
+
+    Args:
+        telegram_user_id (str): The telegram user ID of the user.
+        coins (int): The coins credited (negative for spent coins).
+        periods (bool): Whether the coins count towards the daily, weekly and monthly boards.
+            Spent coins only lower the all-time board.
+    """
+    redis_client = get_sync_redis_client()
+    if not redis_client:
+        mark_leaderboards_stale()
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_increments(pipe, [(telegram_user_id, coins, stats_today())], periods)
+        pipe.execute()
+    except RedisError as e:
+        _mark_stale(e)
+
+
+async def record_coins_async(telegram_user_id: str, coins: int, periods: bool = True):
+    """
+    Async variant of `record_coins` for async routes.
+    """
+    await record_coins_batch_async([(telegram_user_id, coins, stats_today())], periods)
+
+
+def record_coins_batch(increments: list[tuple[str, int, date]], periods: bool = True):
+    """
+    Add coins to the leaderboards for many users in a single round trip.
+
+    Args:
+        increments (list[tuple[str, int, date]]): (telegram_user_id, coins, day the coins were earned).
+        periods (bool): Whether the coins count towards the daily, weekly and monthly boards.
+    """
+    redis_client = get_sync_redis_client()
+    if not redis_client:
+        mark_leaderboards_stale()
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_increments(pipe, increments, periods)
+        pipe.execute()
+    except RedisError as e:
+        _mark_stale(e)
+
+
+async def record_coins_batch_async(increments: list[tuple[str, int, date]], periods: bool = True):
+    """
+    Async variant of `record_coins_batch` for async routes.
+    """
+    redis_client = get_async_redis_client()
+    if not redis_client:
+        mark_leaderboards_stale()
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_increments(pipe, increments, periods)
+        await pipe.execute()
+    except RedisError as e:
+        _mark_stale(e)
+
+
+def remove_users_from_leaderboards(telegram_user_ids: list[str]):
+    """
+    Remove deleted users from the current leaderboards.
+
+    Args:
+        telegram_user_ids (list[str]): The telegram user IDs of the deleted users.
+    """
+    redis_client = get_sync_redis_client()
+    if not redis_client or not telegram_user_ids:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for category in LeaderboardType:
+            pipe.zrem(leaderboard_key(category), *telegram_user_ids)
+        pipe.execute()
+    except RedisError as e:
+        _mark_stale(e)
+
+
+# ------------------------------ DATABASE SCORES ------------------------------ #
+def period_range(category: LeaderboardType, day: date | None = None) -> tuple[date, date]:
+    """
+    Return the first and last day of the leaderboard period containing the given day.
+
+    Args:
+        category (LeaderboardType): A daily, weekly or monthly leaderboard.
+        day (date | None): Any day in the period, defaults to today.
+
+    Returns:
+        tuple[date, date]: The first and last day of the period.
+    """
+    day = day or stats_today()
+
+    if category == LeaderboardType.WEEKLY:
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+
+    if category == LeaderboardType.MONTHLY:
+        return day.replace(day=1), day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+    return day, day
+
+
+def period_scores_pipeline(category: LeaderboardType, day: date | None = None, match: dict | None = None) -> list[dict]:
+    """
+    Build the aggregation that sums each user's daily coin stats over a leaderboard period.
+
+    Args:
+        category (LeaderboardType): A daily, weekly or monthly leaderboard.
+        day (date | None): Any day in the period, defaults to today.
+        match (dict | None): Additional conditions on the daily buckets.
+
+    Returns:
+        list[dict]: The pipeline, yielding {telegram_user_id, coins} for users who earned coins.
+    """
+    start, end = period_range(category, day)
+
+    return daily_coins_pipeline(start, end, match)
+
+
+# ------------------------------ REBUILD / BACKFILL ------------------------------ #
+# A rebuild reads the scores from the database while increments keep landing on the live boards,
+# which the rebuilt boards then replace. Increments made while the rebuild holds its lock also log
+# their users, whose scores are read again from the database and set on the rebuilt boards before
+# the swap, and on the live boards after it until the log stays empty, so none of them is lost.
+
+async def _database_scores(day: date, telegram_user_ids: list[str] | None = None) -> dict[LeaderboardType, dict]:
+    scores = {category: {} for category in LeaderboardType}
+    users = {"telegram_user_id": {"$in": telegram_user_ids}} if telegram_user_ids is not None else {}
+
+    # all time scores mirror users' total coins
+    async for user in async_user_collection.find(users, {"_id": 0, "telegram_user_id": 1, "total_coins": 1}):
+        scores[LeaderboardType.ALL_TIME][user["telegram_user_id"]] = user.get("total_coins", 0)
+
+    # period scores are summed from the daily coin stats buckets
+    for category in PERIOD_LEADERBOARDS:
+        async for stats in await async_coin_stats_daily.aggregate(period_scores_pipeline(category, day, users)):
+            scores[category][stats["telegram_user_id"]] = stats["coins"]
+
+    return scores
+
+
+async def _take_rebuild_log(redis_client) -> list[str]:
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.smembers(LEADERBOARD_REBUILD_LOG_KEY)
+    pipe.delete(LEADERBOARD_REBUILD_LOG_KEY)
+    telegram_user_ids, _ = await pipe.execute()
+
+    return list(telegram_user_ids)
+
+
+async def _set_logged_scores(redis_client, keys: dict[LeaderboardType, str], day: date) -> dict[LeaderboardType, dict] | None:
+    """
+    Set the scores of the users logged during the rebuild from the database.
+
+    Returns:
+        dict | None: The scores set, None if no user was logged.
+    """
+    telegram_user_ids = await _take_rebuild_log(redis_client)
+    if not telegram_user_ids:
+        return None
+
+    scores = await _database_scores(day, telegram_user_ids)
+
+    pipe = redis_client.pipeline(transaction=False)
+    for category, key in keys.items():
+        if scores[category]:
+            pipe.zadd(key, scores[category])
+    await pipe.execute()
+
+    return scores
+
+
+async def rebuild_leaderboards() -> bool:
+    """
+    Rebuild the current leaderboards from the database.
+
+    Used to backfill an empty redis and to recover after increments were lost. Boards are
+    built under temporary keys and swapped in atomically, and only one worker rebuilds at a time.
+
+    Returns:
+        bool: True if the leaderboards were rebuilt.
+    """
+    global _leaderboards_stale
+
+    redis_client = get_async_redis_client()
+    if not redis_client:
+        return False
+
+    try:
+        if not await redis_client.set(LEADERBOARD_REBUILD_LOCK_KEY, 1, nx=True, ex=300):
+            return False    # another worker is rebuilding
+        await redis_client.delete(LEADERBOARD_REBUILD_LOG_KEY)
+    except RedisError as e:
+        report_redis_failure(e)
+        return False
+
+    try:
+        today = stats_today()
+        stale_marks = _stale_marks
+        keys = {category: leaderboard_key(category, today) for category in LeaderboardType}
+        rebuild_keys = {category: f"{key}:rebuild" for category, key in keys.items()}
+        scores = await _database_scores(today)
+
+        pipe = redis_client.pipeline(transaction=False)
+        for category, rebuild_key in rebuild_keys.items():
+            pipe.delete(rebuild_key)
+
+            members = list(scores[category].items())
+            for i in range(0, len(members), 1000):
+                pipe.zadd(rebuild_key, dict(members[i:i + 1000]))
+        await pipe.execute()
+
+        # users whose scores changed while the database was read
+        logged = await _set_logged_scores(redis_client, rebuild_keys, today)
+        for category, board in (logged or {}).items():
+            scores[category].update(board)
+
+        pipe = redis_client.pipeline(transaction=True)
+        for category, key in keys.items():
+            if scores[category]:
+                pipe.rename(rebuild_keys[category], key)
+                if category in LEADERBOARD_TTLS:
+                    pipe.expire(key, LEADERBOARD_TTLS[category])
+            else:
+                pipe.delete(key)
+        pipe.set(LEADERBOARD_READY_KEY, today.isoformat())
+        await pipe.execute()
+
+        # users whose increments landed on the replaced boards just before the swap
+        for _ in range(LEADERBOARD_REBUILD_LOG_PASSES):
+            if not await _set_logged_scores(redis_client, keys, today):
+                break
+
+        # unless an increment was lost meanwhile
+        if _stale_marks == stale_marks:
+            _leaderboards_stale = False
+
+        print(f"Leaderboards rebuilt: {len(scores[LeaderboardType.ALL_TIME])} users")
+        return True
+    except RedisError as e:
+        print(f"Error rebuilding leaderboards: {e}")
+        report_redis_failure(e)
+        _leaderboards_stale = True
+        return False
+    finally:
+        try:
+            await redis_client.delete(LEADERBOARD_REBUILD_LOCK_KEY)
+        except RedisError:
+            pass
+
+
+async def init_leaderboards():
+    """
+    Backfill the leaderboards in the background if redis does not have them yet.
+    """
+    redis_client = get_async_redis_client()
+    if not redis_client:
+        return
+
+    try:
+        if not await redis_client.exists(LEADERBOARD_READY_KEY):
+            _schedule_rebuild()
+    except RedisError as e:
+        report_redis_failure(e)
+
+
+# ------------------------------ READ LEADERBOARDS ------------------------------ #
+async def hydrate_leaderboard(entries: list[tuple[str, float]], start_rank: int = 1) -> list[LeaderBoard]:
+    """
+    Attach profile data to (telegram_user_id, score) pairs with a single batched query.
+
+    Args:
+        entries (list[tuple[str, float]]): The ranked user ids and their scores.
+        start_rank (int): The rank of the first entry.
+
+    Returns:
+        list[LeaderBoard]: The leaderboard rows, in the given order.
+    """
+    user_ids = [telegram_user_id for telegram_user_id, _ in entries]
+    users = {
+        user["telegram_user_id"]: user
+        async for user in async_user_collection.find({"telegram_user_id": {"$in": user_ids}}, HYDRATION_PROJECTION)
+    }
+
+    leaderboard: list[LeaderBoard] = []
+    for position, (telegram_user_id, score) in enumerate(entries):
+        user = users.get(telegram_user_id)
+        if not user:
+            continue
+
+        leaderboard.append(
+            LeaderBoard(
+                telegram_user_id=telegram_user_id,
+                rank=f"#{start_rank + position}",
+                username=user.get("username") or "",
+                image_url=user.get("image_url") or "",
+                level=user.get("level", 1),
+                level_name=user.get("level_name", "Novice"),
+                coins_earned=int(score),
+                clan=(user.get("clan") or {}).get("name"),
+                longest_streak=(user.get("streak") or {}).get("longest_streak", 0)
+            )
+        )
+
+    return leaderboard
+
+
+async def _redis_leaderboard_ready(redis_client) -> bool:
+    if _leaderboards_stale or not await redis_client.exists(LEADERBOARD_READY_KEY):
+        _schedule_rebuild()
+        return False
+
+    return True
+
+
+def encode_cursor(score: int, telegram_user_id: str, rank: int) -> str:
+    """
+    Build the opaque continuation token pointing just after the given leaderboard row.
+    """
+    payload = json.dumps([int(score), telegram_user_id, rank], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, str, int]:
+    """
+    Decode a continuation token into the (score, telegram_user_id, rank) of the last row served.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, telegram_user_id, rank = json.loads(base64.urlsafe_b64decode(padded))
+        return int(score), str(telegram_user_id), int(rank)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid leaderboard cursor")
+
+
+async def _redis_page(redis_client, category: LeaderboardType, after: tuple | None, page_size: int):
+    key = leaderboard_key(category)
+    start = 0
+
+    if after:
+        score, telegram_user_id, _ = after
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zrevrank(key, telegram_user_id)
+        pipe.zscore(key, telegram_user_id)
+        rank, current_score = await pipe.execute()
+
+        if rank is not None and int(current_score) == score:
+            start = rank + 1
+        else:
+            # the row moved since the cursor was issued, resume after its old position
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.zcount(key, f"({score}", "+inf")
+            pipe.zrangebyscore(key, score, score)
+            ahead, ties = await pipe.execute()
+            start = ahead + sum(1 for member in ties if member > telegram_user_id)
+
+    entries = await redis_client.zrevrange(key, start, start + page_size - 1, withscores=True)
+    return entries, start + 1
+
+
+def _after(field: str, score: int, telegram_user_id: str) -> dict:
+    # rows ranked below (score, telegram_user_id), ties broken by telegram_user_id descending
+    return {"$or": [
+        {field: {"$lt": score}},
+        {field: score, "telegram_user_id": {"$lt": telegram_user_id}}
+    ]}
+
+
+async def _database_page(category: LeaderboardType, after: tuple | None, page_size: int):
+    # ties are ordered by telegram_user_id descending, the same as ZREVRANGE
+    if category == LeaderboardType.ALL_TIME:
+        query = {}
+        if after:
+            score, telegram_user_id, _ = after
+            query = _after("total_coins", score, telegram_user_id)
+
+        cursor = async_user_collection.find(
+            query, {"_id": 0, "telegram_user_id": 1, "total_coins": 1}
+        ).sort([("total_coins", -1), ("telegram_user_id", -1)]).limit(page_size)
+        entries = [(user["telegram_user_id"], user.get("total_coins", 0)) async for user in cursor]
+    else:
+        pipeline = period_scores_pipeline(category)
+        if after:
+            score, telegram_user_id, _ = after
+            pipeline.append({"$match": _after("coins", score, telegram_user_id)})
+        pipeline += [
+            {"$sort": {"coins": -1, "telegram_user_id": -1}},
+            {"$limit": page_size}
+        ]
+        entries = [(stats["telegram_user_id"], stats["coins"]) async for stats in await async_coin_stats_daily.aggregate(pipeline)]
+
+    start_rank = after[2] + 1 if after else 1
+    return entries, start_rank
+
+
+async def get_leaderboard_page(
+        category: LeaderboardType,
+        cursor: str | None = None,
+        page_size: int = LEADERBOARD_PAGE_SIZE
+    ) -> LeaderboardPage:
+    """
+    Return one page of a leaderboard, keyset-paginated on (score, telegram_user_id).
+
+    Served from the redis sorted sets, falling back to the database while redis is
+    unavailable or the boards are being rebuilt. Only the returned page is hydrated.
+
+    Args:
+        category (LeaderboardType): The leaderboard period.
+        cursor (str | None): The `next_cursor` of the previous page, None for the top.
+        page_size (int): The number of users per page.
+
+    Returns:
+        LeaderboardPage: The users, best first, and the cursor of the next page if any.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    page = None
+
+    redis_client = get_async_redis_client()
+    if redis_client:
+        try:
+            if await _redis_leaderboard_ready(redis_client):
+                page = await _redis_page(redis_client, category, after, page_size)
+        except RedisError as e:
+            print(f"Error reading leaderboard from redis: {e}")
+            report_redis_failure(e)
+
+    entries, start_rank = page or await _database_page(category, after, page_size)
+
+    next_cursor = None
+    if len(entries) == page_size:
+        last_user_id, last_score = entries[-1]
+        next_cursor = encode_cursor(last_score, last_user_id, start_rank + len(entries) - 1)
+
+    return LeaderboardPage(
+        items=await hydrate_leaderboard(entries, start_rank),
+        next_cursor=next_cursor
+    )
+
+
+async def get_my_leaderboard_row(telegram_user_id: str, category: LeaderboardType) -> LeaderBoard | None:
+    """
+    Return the caller's own leaderboard row, pinned above the page they are viewing.
+
+    Args:
+        telegram_user_id (str): The telegram user ID of the caller.
+        category (LeaderboardType): The leaderboard period.
+
+    Returns:
+        LeaderBoard | None: The caller's row, or None if they are not on the leaderboard.
+    """
+    my_rank = await get_rank(telegram_user_id, category)
+    if not my_rank["rank"]:
+        return None
+
+    rows = await hydrate_leaderboard([(telegram_user_id, my_rank["score"])], my_rank["rank"])
+    return rows[0] if rows else None
+
+
+# ------------------------------ RANK LOOKUP ------------------------------ #
+def format_rank(rank: int | None) -> str:
+    return f"#{rank}" if rank else "0"
+
+
+def _ahead_of(field: str, score: int, telegram_user_id: str) -> dict:
+    # rows ranked above (score, telegram_user_id), ties broken by telegram_user_id descending
+    return {"$or": [
+        {field: {"$gt": score}},
+        {field: score, "telegram_user_id": {"$gt": telegram_user_id}}
+    ]}
+
+
+async def _database_rank(telegram_user_id: str, category: LeaderboardType) -> dict:
+    if category == LeaderboardType.ALL_TIME:
+        user = await async_user_collection.find_one({"telegram_user_id": telegram_user_id}, {"_id": 0, "total_coins": 1})
+        if not user:
+            return {"rank": None, "score": 0}
+
+        score = user.get("total_coins", 0)
+        ahead = await async_user_collection.count_documents(_ahead_of("total_coins", score, telegram_user_id))
+        return {"rank": ahead + 1, "score": score}
+
+    pipeline = period_scores_pipeline(category)
+    mine = await (await async_coin_stats_daily.aggregate(
+        period_scores_pipeline(category, match={"telegram_user_id": telegram_user_id})
+    )).to_list()
+    if not mine:
+        return {"rank": None, "score": 0}
+
+    score = mine[0]["coins"]
+    ahead = await (await async_coin_stats_daily.aggregate([
+        *pipeline, {"$match": _ahead_of("coins", score, telegram_user_id)}, {"$count": "ahead"}
+    ])).to_list()
+    return {"rank": (ahead[0]["ahead"] if ahead else 0) + 1, "score": score}
+
+
+async def get_user_ranks(
+        telegram_user_id: str,
+        categories: list[LeaderboardType] | None = None
+    ) -> dict[LeaderboardType, dict]:
+    """
+    Look up a user's rank and score on each leaderboard without scanning the leaderboard.
+
+    Ranks come from ZREVRANK/ZSCORE on the sorted sets in a single round trip, or from
+    count queries against the database while redis is unavailable.
+
+    Args:
+        telegram_user_id (str): The telegram user ID of the user.
+        categories (list[LeaderboardType] | None): The leaderboards to look up, defaults to all.
+
+    Returns:
+        dict[LeaderboardType, dict]: {"rank": int | None, "score": int} per leaderboard,
+        rank is None when the user is not on that leaderboard.
+    """
+    categories = categories or list(LeaderboardType)
+    ranks = {}
+
+    redis_client = get_async_redis_client()
+    if redis_client:
+        try:
+            if await _redis_leaderboard_ready(redis_client):
+                pipe = redis_client.pipeline(transaction=False)
+                for category in categories:
+                    pipe.zrevrank(leaderboard_key(category), telegram_user_id)
+                    pipe.zscore(leaderboard_key(category), telegram_user_id)
+                results = await pipe.execute()
+
+                for i, category in enumerate(categories):
+                    rank, score = results[2 * i], results[2 * i + 1]
+                    if rank is not None:
+                        ranks[category] = {"rank": rank + 1, "score": int(score)}
+                    elif category in PERIOD_LEADERBOARDS:
+                        ranks[category] = {"rank": None, "score": 0}
+        except RedisError as e:
+            print(f"Error reading leaderboard ranks from redis: {e}")
+            report_redis_failure(e)
+
+    for category in categories:
+        if category not in ranks:
+            ranks[category] = await _database_rank(telegram_user_id, category)
+
+    return ranks
+
+
+async def get_rank(telegram_user_id: str, category: LeaderboardType) -> dict:
+    """
+    Look up a user's rank and score on a single leaderboard, see `get_user_ranks`.
+    """
+    return (await get_user_ranks(telegram_user_id, [category]))[category]
@@ -1,18 +1,24 @@
-from datetime import timedelta, datetime
-import json
-from fastapi import FastAPI, Depends, HTTPException, Request
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from redis import Redis
-from database_connection import get_redis_client
+from database_connection import cached, init_redis, close_redis, close_async_mongo
 from dependencies import (
+    all_updates_result,
     get_user_profile,
-    update_coins_in_db,
-    get_user_by_id,
+    update_coins_in_db_async,
     get_image as get_image_func,
-    update_coins_power_limit_last_active_time_autobot,
+    update_coins_power_limit_last_active_time_autobot_async,
     update_photo_url,
-    update_power_limit_last_active_time_autobot
+    update_power_limit_last_active_time_autobot_async
 )
+from indexes import apply_indexes
+from query_metrics import query_metrics_middleware
+from leaderboard.dependencies import init_leaderboards
+from tap_buffer import buffer_taps, start_tap_buffer, stop_tap_buffer, tap_buffer_enabled
+from scheduler import start_scheduler, stop_scheduler
+from reward.counters import flush_reward_counters
 from superuser.level.dependencies import get_levels as get_levels_func
 from superuser.level.models import LevelModelResponse
 from user_reg_and_prof_mngmnt.router import userApp
@@ -21,6 +27,9 @@ from clan.router import user_clan_router
 from boosts.router import userExtraBoostApp
 from tasks.router import taskApp
 from invite.router import inviteApp
+from media.router import mediaApp
+from media.dependencies import prewarm_image_cache
+from media.renditions import shutdown_image_executor
 from telegram_bot import bot_interactions
 from superuser.dashboard.router import adminDashboard
 from superuser.task.router import task_router
@@ -53,16 +62,46 @@ tags_metadata = [
     {
         "name": "Invite features",
         "description": "These routes are for invite action buttons on the invite tab of dashboard."
+    },
+    {
+        "name": "Media",
+        "description": "These routes serve the images uploaded through the admin panel."
     }
 ]
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # make sure every registered index exists
+    await asyncio.to_thread(apply_indexes)
+
+    # load the images every client asks for into memory
+    await asyncio.to_thread(prewarm_image_cache)
+
+    # start background workers
+    await init_redis()
+    await init_leaderboards()
+    await start_tap_buffer()
+    start_scheduler()
+
+    yield
+
+    # drain background workers
+    await stop_scheduler()
+    await flush_reward_counters()
+    await stop_tap_buffer()
+    await asyncio.to_thread(shutdown_image_executor)
+    await close_redis()
+    await close_async_mongo()
+
+
 # initialize fastapi app
 app = FastAPI(
     title="Bored Tap Coin API",
     description="API for Bored Tap Coin",
     version="1.0.0",
-    openapi_tags=tags_metadata
+    openapi_tags=tags_metadata,
+    lifespan=lifespan
 )
 
 origins = [
@@ -82,10 +121,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Query-Count", "X-DB-Time-Ms", "X-DB-Collections", "Server-Timing", "ETag", "Content-Range", "Accept-Ranges"],
 )
 
+# count the database queries of every request
+app.middleware("http")(query_metrics_middleware)
+
 all_routers = [
-    userApp, earnApp, user_clan_router, userExtraBoostApp, taskApp, inviteApp, bot_interactions, 
+    userApp, earnApp, user_clan_router, userExtraBoostApp, taskApp, inviteApp, mediaApp, bot_interactions, 
     adminDashboard, task_router, rewardApp, clan_router, challenge_router,
     adminLeaderboard, boostApp, levelApp, userMgtApp, securityApp
 ]
@@ -131,6 +174,9 @@ async def update_coins(
     - last_active_time (datetime): The new last active time of the user.
     - auto_bot_active (bool): The new auto bot active status of the user.
     
+    When the write-behind tap buffer is enabled, tapped coins are buffered and flushed to the
+    database in batches; the response reflects the buffered state.
+
     Returns:
     - A dictionary containing the status of the update operation.
     """
@@ -145,9 +191,29 @@ async def update_coins(
 
     response = {}
 
+    # ------------------------- buffered (write-behind) coin updates ----------------------------- #
+    if coins and tap_buffer_enabled():
+        state = await buffer_taps(telegram_user_id, coins)
+        if not state:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        if current_power_limit and last_active_time:
+            await update_power_limit_last_active_time_autobot_async(
+                telegram_user_id, current_power_limit, last_active_time, auto_bot_active
+            )
+
+            # same response as the unbuffered update of all four
+            return all_updates_result(state)
+
+        response["coin status"] = "Coins updated successfully"
+        response["current coins"] = state["total_coins"]
+        response["current level"] = state["level"]
+
+        return response
+
     # --------- update all (coins, power limit, last active time, auto bot active) at once ------------- #
     if coins and current_power_limit and last_active_time:
-        response = update_coins_power_limit_last_active_time_autobot(
+        response = await update_coins_power_limit_last_active_time_autobot_async(
             telegram_user_id, coins, current_power_limit, last_active_time, auto_bot_active
         )
 
@@ -155,18 +221,17 @@ async def update_coins(
 
     # ------------------------- update coins only ----------------------------- #
     if coins:
-        result = update_coins_in_db(telegram_user_id, coins)
-        user = get_user_by_id(telegram_user_id)
-        if result:
+        result = await update_coins_in_db_async(telegram_user_id, coins)
+        if result["my_result"]:
             response["coin status"] = "Coins updated successfully"
-            response["current coins"] = user.total_coins
-            response["current level"] = user.level
+            response["current coins"] = result["total_coins"]
+            response["current level"] = result["level"]
 
         return response
     
     # ---------------------- update power limit, last active time and auto_bot_active ------------------------ #
     if current_power_limit and last_active_time:
-        result = update_power_limit_last_active_time_autobot(
+        result = await update_power_limit_last_active_time_autobot_async(
             telegram_user_id, current_power_limit, last_active_time, auto_bot_active
         )
 
@@ -188,6 +253,8 @@ async def update_coins(
 @app.get('/user/profile', tags=["Global Routes"], response_model=UserProfile)
 async def get_user_data(
     telegram_user_id: Annotated[str, Depends(get_current_user)],
+    invitee_page: int = Query(1, ge=1, description="Page number of the invitee list, when a page size is given"),
+    invitee_page_size: int | None = Query(None, ge=1, le=200, description="Page size of the invitee list, omit for every invitee"),
     # redis_client: Annotated[Redis, Depends(get_redis_client)]
 ) -> UserProfile:
     """
@@ -195,55 +262,32 @@ async def get_user_data(
 
     Args:
         telegram_user_id (Annotated[str, Depends(get_current_user)]): The Telegram user ID of the user to retrieve.
+        invitee_page (int): Page number of the invitee list. Defaults to 1.
+        invitee_page_size (int | None): Page size of the invitee list. Defaults to the full list.
 
     Returns:
         UserProfile: The user profile if found, otherwise None.
     """
-    user = get_user_profile(telegram_user_id)
+    skip = (invitee_page - 1) * invitee_page_size if invitee_page_size else 0
+    user = await get_user_profile(telegram_user_id, skip, invitee_page_size)
 
     return user
 
 
 # get levels
 @app.get("/bored-tap/levels", tags=["Global Routes"])
-async def get_levels(request: Request, redis_client: Annotated[Redis, Depends(get_redis_client)]) -> list[LevelModelResponse]:    
+@cached(tags=["levels"])
+async def get_levels() -> list[LevelModelResponse]:
     """
     Retrieve and return all levels available in the system.
 
-    This endpoint fetches levels from the database and caches the result in Redis
-    for subsequent requests to improve performance. If the levels are already cached,
-    it returns the cached data. Otherwise, it fetches the levels from the database,
-    caches them, and then returns the data.
-
-    Args:
-        request (Request): The FastAPI request object containing details of the HTTP request.
+    The response is cached and invalidated whenever an admin creates or deletes a level.
 
     Returns:
         list[LevelModelResponse]: A list of LevelModelResponse instances representing
         the levels retrieved from the database or cache.
     """
-
-    if redis_client:
-        cache_key = f"{request.url.path}"
-        cached_response = redis_client.get(cache_key) if redis_client else None
-
-        if cached_response:
-            print("Cache hit: levels")
-            deserialized_levels = json.loads(cached_response)
-            model_instances = [LevelModelResponse(**level) for level in deserialized_levels]
-
-            return model_instances
-
-        print("Cache miss: levels")
-        level_generator = get_levels_func()
-        serialized_levels = [level.model_dump() for level in level_generator]
-
-        try:
-            redis_client.set(cache_key, json.dumps(serialized_levels), ex=timedelta(minutes=5))
-        except Exception as e:
-            print(f"Error caching levels: {e}")
-
-    return [LevelModelResponse(**level) for level in serialized_levels]
+    return list(get_levels_func())
 
 
 # update profile photo url
@@ -261,7 +305,7 @@ async def get_image(
     image_id: str, request: Request, user: Annotated[str, Depends(get_current_user)]):
 
     if user:
-        return get_image_func(image_id)
+        return get_image_func(image_id, request)
 
     # invalid image id
     raise HTTPException(status_code=404, detail="Image not found")
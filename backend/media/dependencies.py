@@ -0,0 +1,462 @@
+import asyncio
+import hashlib
+import mimetypes
+import time
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from gridfs import NoFile
+from gridfs.synchronous.grid_file import GridOut
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config import get_settings
+from database_connection import fs, img_db, levels_collection, extra_boosts_collection, rewards_collection
+from media.image_cache import CachedImage, image_cache
+from media.renditions import get_image_executor, get_storing_executor, render_image
+from indexes import register_indexes
+
+
+# ------------------------------ GRIDFS MEDIA ------------------------------ #
+# Images are stored once and never modified, a replaced image gets a new file id, so a file id
+# (or the md5 of the file where GridFS recorded one) is a strong validator and responses may be
+# cached by clients indefinitely. Small files are served from the in-process image cache, larger
+# ones are streamed chunk by chunk from GridFS, never buffered. Resized renditions of an image are
+# stored as separate files, listed in the original's metadata once they are built.
+# Uploads are content addressed: an image already stored is not written again, its reference
+# count is raised instead, and deleting an image only removes it with its last reference.
+
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_PENDING_CACHE_CONTROL = "public, max-age=300"     # a resized image asked for before its renditions exist
+DEFAULT_IMAGE_CONTENT_TYPE = "image/jpeg"   # images uploaded before content types were stored
+
+STORE_IMAGE_ATTEMPTS = 3
+STORE_IMAGE_BACKOFF = 0.05     # seconds before the second attempt, doubled for each further one
+
+image_files = img_db["images.files"]
+
+register_indexes(
+    "images.files",
+    IndexModel(
+        [("metadata.sha256", 1)], unique=True,
+        partialFilterExpression={"metadata.sha256": {"$exists": True}}
+    ),
+    database=img_db.name
+)
+
+# leading bytes of the image formats accepted by the upload routes
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def image_content_type(image_bytes: bytes, filename: str | None = None) -> str:
+    """
+    Detect the content type of an image from its leading bytes, falling back to its file name.
+    """
+    for signature, content_type in IMAGE_SIGNATURES:
+        if image_bytes.startswith(signature):
+            return content_type
+
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+
+    guessed, _ = mimetypes.guess_type(filename or "")
+    return guessed or DEFAULT_IMAGE_CONTENT_TYPE
+
+
+def _reference_image(sha256: str) -> ObjectId | None:
+    """
+    Add a reference to the stored image with the given hash, returning its id if there is one.
+    """
+    existing = image_files.find_one_and_update(
+        {"metadata.sha256": sha256, "metadata.refcount": {"$gt": 0}},
+        {"$inc": {"metadata.refcount": 1}},
+        projection={"_id": 1}
+    )
+
+    return existing["_id"] if existing else None
+
+
+def store_image(image_bytes: bytes, filename: str) -> ObjectId:
+    """
+    Store an image in GridFS along with its content type, or reference the identical image
+    already stored.
+
+    Renditions of a new image are built in the background and linked to it once stored.
+
+    Args:
+        image_bytes (bytes): The image.
+        filename (str): The file name to store it under.
+
+    Returns:
+        ObjectId: The id of the stored file.
+    """
+    sha256 = hashlib.sha256(image_bytes).hexdigest()
+
+    for attempt in range(STORE_IMAGE_ATTEMPTS):
+        if attempt:
+            time.sleep(STORE_IMAGE_BACKOFF * 2 ** (attempt - 1))
+
+        existing = _reference_image(sha256)
+        if existing:
+            return existing
+
+        file_id = ObjectId()
+        try:
+            fs.put(
+                image_bytes,
+                _id=file_id,
+                filename=filename,
+                content_type=image_content_type(image_bytes, filename),
+                metadata={"sha256": sha256, "refcount": 1}
+            )
+            break
+        except DuplicateKeyError:
+            # drop the chunks written, and reference the image stored concurrently; if its last
+            # reference is being deleted instead, retry once the deletion released the hash
+            fs.delete(file_id)
+
+            existing = _reference_image(sha256)
+            if existing:
+                return existing
+    else:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Image is being replaced, please retry.")
+
+    # the callback runs on the process pool's management thread, so it only hands the result over
+    future = get_image_executor().submit(render_image, image_bytes)
+    future.add_done_callback(lambda future: get_storing_executor().submit(_store_renditions, file_id, filename, future))
+
+    return file_id
+
+
+async def store_image_async(image_bytes: bytes, filename: str) -> ObjectId:
+    """
+    Async variant of `store_image` for async routes.
+
+    GridFS has no async client here, so the writes and the retry backoff run in a worker thread.
+    """
+    return await asyncio.to_thread(store_image, image_bytes, filename)
+
+
+def _store_renditions(file_id: ObjectId, filename: str, future):
+    try:
+        renditions = [
+            {
+                "width": width,
+                "content_type": content_type,
+                "file_id": fs.put(data, filename=f"{width}w_{filename}", content_type=content_type, metadata={"rendition_of": file_id})
+            }
+            for width, content_type, data in future.result()
+        ]
+    except Exception as e:
+        print(f"Error building renditions of image {file_id}: {e}")
+        return
+
+    # an empty list marks images too small or animated to resize as processed
+    linked = image_files.update_one({"_id": file_id}, {"$set": {"metadata.renditions": renditions}})
+
+    # the original was deleted while its renditions were built
+    if not linked.matched_count:
+        for rendition in renditions:
+            fs.delete(rendition["file_id"])
+
+    image_cache.evict(str(file_id))
+
+
+def open_image(file_id: str) -> GridOut:
+    """
+    Open a stored image for reading.
+
+    Raises:
+        HTTPException: If the id is invalid or no such file exists.
+    """
+    try:
+        return fs.get(ObjectId(file_id))
+    except (InvalidId, TypeError, NoFile):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+
+def delete_image(file_id: str | ObjectId):
+    """
+    Drop a reference to a stored image. The last reference deletes the image and its
+    renditions, and drops them from the image cache.
+    """
+    file_id = ObjectId(file_id)
+
+    # images stored before reference counting have no count and go with their first delete
+    image = image_files.find_one_and_update(
+        {"_id": file_id, "metadata.rendition_of": {"$exists": False}},
+        {"$inc": {"metadata.refcount": -1}},
+        projection={"metadata.refcount": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if image and image["metadata"]["refcount"] > 0:
+        return
+
+    # release the hash first, so the same image uploaded from now on is stored anew
+    image = image_files.find_one_and_update(
+        {"_id": file_id},
+        {"$unset": {"metadata.sha256": ""}},
+        projection={"metadata.renditions": 1}
+    ) or {}
+    renditions = (image.get("metadata") or {}).get("renditions", [])
+
+    for stored_id in [file_id] + [rendition["file_id"] for rendition in renditions]:
+        fs.delete(stored_id)
+        image_cache.evict(str(stored_id))
+
+
+def _renditions(grid_out: GridOut) -> tuple[tuple[int, str, str], ...] | None:
+    """
+    Return the renditions of an image, an empty tuple if it has none, None if they are not built yet.
+    """
+    renditions = (grid_out.metadata or {}).get("renditions")
+    if renditions is None:
+        return None
+
+    return tuple((rendition["width"], rendition["content_type"], str(rendition["file_id"])) for rendition in renditions)
+
+
+def _pick_rendition(renditions: tuple[tuple[int, str, str], ...], width: int, accept: str) -> str | None:
+    """
+    Return the file id of the narrowest rendition at least `width` wide, WebP if accepted.
+    """
+    accepts_webp = "image/webp" in accept
+    candidates = [
+        (rendition_width, content_type != "image/webp", file_id)
+        for rendition_width, content_type, file_id in renditions
+        if rendition_width >= width and (accepts_webp or content_type != "image/webp")
+    ]
+
+    return min(candidates)[2] if candidates else None
+
+
+def _content_type(grid_out: GridOut) -> str:
+    if grid_out.content_type:
+        return grid_out.content_type
+
+    guessed, _ = mimetypes.guess_type(grid_out.filename or "")
+    return guessed if guessed and guessed.startswith("image/") else DEFAULT_IMAGE_CONTENT_TYPE
+
+
+def _etag(grid_out: GridOut) -> str:
+    return f'"{grid_out.md5 or grid_out._id}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _byte_range(header: str, length: int) -> tuple[int, int] | None:
+    """
+    Parse a single range "bytes=start-end", "bytes=start-" or "bytes=-suffix".
+
+    Returns:
+        tuple[int, int] | None: The first and last byte requested, None if the header is not a
+        single byte range and the whole file should be sent.
+
+    Raises:
+        HTTPException: If the range lies outside the file.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), length - 1) if last else length - 1
+        else:
+            start = max(length - int(last), 0)
+            end = length - 1
+    except ValueError:
+        return None
+
+    if start > end or start >= length:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+
+    return start, end
+
+
+def _iter_chunks(grid_out: GridOut, start: int, end: int):
+    try:
+        grid_out.seek(start)
+        remaining = end - start + 1
+
+        while remaining > 0:
+            chunk = grid_out.read(min(grid_out.chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        grid_out.close()
+
+
+def _cache_image(file_id: str, grid_out: GridOut) -> CachedImage:
+    try:
+        image = CachedImage(
+            data=grid_out.read(),
+            content_type=_content_type(grid_out),
+            etag=_etag(grid_out),
+            renditions=_renditions(grid_out)
+        )
+    finally:
+        grid_out.close()
+
+    image_cache.put(file_id, image)
+    return image
+
+
+def _open_image(file_id: str) -> tuple[CachedImage | None, GridOut | None]:
+    image = image_cache.get(file_id)
+    if image:
+        return image, None
+
+    grid_out = open_image(file_id)
+    if grid_out.length <= get_settings().image_cache_max_file_bytes:
+        return _cache_image(file_id, grid_out), None
+
+    return None, grid_out
+
+
+def stream_image(file_id: str, request: Request | None = None, width: int | None = None) -> Response:
+    """
+    Stream a stored image with caching headers.
+
+    When the request is given, conditional (If-None-Match) and Range requests are honoured.
+
+    Args:
+        file_id (str): The id of the GridFS file.
+        request (Request | None): The request being served.
+        width (int | None): The width the image is displayed at, serves the narrowest rendition
+            at least as wide, or the original when there is none.
+
+    Returns:
+        Response: A 200 or 206 response, streamed unless the image is cached, or a 304 without a body.
+    """
+    image, grid_out = _open_image(file_id)
+    cache_control = MEDIA_CACHE_CONTROL
+
+    if width:
+        renditions = image.renditions if image else _renditions(grid_out)
+        if renditions is None:
+            cache_control = MEDIA_PENDING_CACHE_CONTROL
+
+        rendition_id = _pick_rendition(renditions or (), width, request.headers.get("accept", "") if request else "")
+        if rendition_id:
+            if grid_out:
+                grid_out.close()
+            image, grid_out = _open_image(rendition_id)
+
+    if image:
+        etag, content_type, length = image.etag, image.content_type, len(image.data)
+    else:
+        etag, content_type, length = _etag(grid_out), _content_type(grid_out), grid_out.length
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if width:
+        headers["Vary"] = "Accept"
+
+    if request and _etag_matches(request.headers.get("if-none-match", ""), etag):
+        if not image:
+            grid_out.close()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = None
+
+    range_header = request.headers.get("range") if request else None
+    if range_header and length and _etag_matches(request.headers.get("if-range", etag), etag):
+        byte_range = _byte_range(range_header, length)
+
+    start, end = byte_range or (0, length - 1)
+    status_code = status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    if image:
+        return Response(image.data[start:end + 1], status_code=status_code, media_type=content_type, headers=headers)
+
+    return StreamingResponse(
+        _iter_chunks(grid_out, start, end),
+        status_code=status_code,
+        media_type=content_type,
+        headers=headers
+    )
+
+
+# ------------------------------ CACHE PREWARMING ------------------------------ #
+def prewarm_image_cache() -> int:
+    """
+    Load the level badges, extra boost icons and reward images into the image cache.
+
+    Returns:
+        int: The number of images loaded.
+    """
+    file_ids = [level.get("badge_id") for level in levels_collection.find({}, {"badge_id": 1})]
+    file_ids += [boost.get("image_id") for boost in extra_boosts_collection.find({}, {"image_id": 1})]
+    file_ids += [reward.get("reward_image_id") for reward in rewards_collection.find({"status": "on_going"}, {"reward_image_id": 1})]
+
+    loaded = 0
+    for file_id in dict.fromkeys(str(file_id) for file_id in file_ids if file_id):
+        if image_cache.full():
+            break
+
+        try:
+            grid_out = open_image(file_id)
+        except HTTPException:
+            continue
+
+        if grid_out.length > get_settings().image_cache_max_file_bytes:
+            grid_out.close()
+            continue
+
+        _cache_image(file_id, grid_out)
+        loaded += 1
+
+    print(f"Image cache prewarmed with {loaded} images ({image_cache.size} bytes)")
+    return loaded
+
+
+# ------------------------------ RENDITION BACKFILL ------------------------------ #
+def backfill_renditions() -> int:
+    """
+    Build the renditions of images uploaded before renditions existed.
+
+    Returns:
+        int: The number of images processed.
+    """
+    query = {"metadata.renditions": {"$exists": False}, "metadata.rendition_of": {"$exists": False}}
+    processed = 0
+
+    for image in image_files.find(query, {"_id": 1, "filename": 1}):
+        grid_out = open_image(str(image["_id"]))
+        try:
+            future = get_image_executor().submit(render_image, grid_out.read())
+        finally:
+            grid_out.close()
+
+        future.result()
+        _store_renditions(image["_id"], image.get("filename") or str(image["_id"]), future)
+        processed += 1
+
+    return processed
+
+
+if __name__ == "__main__":
+    print(f"Renditions built for {backfill_renditions()} images")
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from config import get_settings
+
+
+# ------------------------------ HOT IMAGE CACHE ------------------------------ #
+# Level badges, booster icons and reward art are a handful of small files requested on every
+# screen load, so they are kept in memory, bounded by a total byte budget. Files are immutable,
+# an entry only goes away when its image is deleted, evicted for space, or after
+# image_cache_ttl seconds, which bounds how long other workers keep serving a deleted image.
+
+class CachedImage(NamedTuple):
+    data: bytes
+    content_type: str
+    etag: str
+    # (width, content type, file id), None while the renditions are not built yet
+    renditions: tuple[tuple[int, str, str], ...] | None = None
+
+
+class _ImageCache:
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._images: OrderedDict[str, tuple[float, CachedImage]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_id: str) -> CachedImage | None:
+        with self._lock:
+            entry = self._images.get(file_id)
+            if not entry:
+                return None
+
+            if entry[0] <= time.monotonic():
+                self._drop(file_id)
+                return None
+
+            self._images.move_to_end(file_id)
+            return entry[1]
+
+    def put(self, file_id: str, image: CachedImage):
+        if len(image.data) > self.max_bytes:
+            return
+
+        with self._lock:
+            self._drop(file_id)
+            self._images[file_id] = (time.monotonic() + self.ttl, image)
+            self.size += len(image.data)
+
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._images)))
+
+    def evict(self, file_id: str):
+        with self._lock:
+            self._drop(file_id)
+
+    def full(self) -> bool:
+        return self.size >= self.max_bytes
+
+    def _drop(self, file_id: str):
+        entry = self._images.pop(file_id, None)
+        if entry:
+            self.size -= len(entry[1].data)
+
+
+image_cache = _ImageCache(get_settings().image_cache_max_bytes, get_settings().image_cache_ttl)
@@ -0,0 +1,99 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image, ImageOps
+from config import get_settings
+
+
+# ------------------------------ IMAGE RENDITIONS ------------------------------ #
+# Uploaded images are resized to a few fixed widths, as WebP and as JPEG (PNG for images with
+# transparency) for clients that do not accept WebP. Resizing runs in a process pool, after the
+# original is stored, so uploads neither wait for it nor block the event loop. The renditions
+# are written to GridFS from a thread pool, not from the process pool's result callbacks,
+# which run on the thread that manages the worker processes.
+
+RENDITION_WIDTHS = (64, 128, 256, 512)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+_executor: ProcessPoolExecutor | None = None
+_storing_executor: ThreadPoolExecutor | None = None
+
+
+def render_image(image_bytes: bytes, widths: tuple[int, ...] = RENDITION_WIDTHS) -> list[tuple[int, str, bytes]]:
+    """
+    Resize an image to every width narrower than the image itself.
+
+    Runs in a worker process. Animated images are left alone.
+
+    Returns:
+        list[tuple[int, str, bytes]]: The width, content type and bytes of every rendition.
+    """
+    with Image.open(BytesIO(image_bytes)) as image:
+        if getattr(image, "is_animated", False):
+            return []
+
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        renditions = []
+        for width in widths:
+            if width >= image.width:
+                continue
+
+            height = max(round(image.height * width / image.width), 1)
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+
+            webp = BytesIO()
+            resized.save(webp, format="WEBP", quality=WEBP_QUALITY, method=4)
+            renditions.append((width, "image/webp", webp.getvalue()))
+
+            fallback = BytesIO()
+            if has_alpha:
+                resized.save(fallback, format="PNG", optimize=True)
+                renditions.append((width, "image/png", fallback.getvalue()))
+            else:
+                resized.save(fallback, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                renditions.append((width, "image/jpeg", fallback.getvalue()))
+
+        return renditions
+
+
+def get_image_executor() -> ProcessPoolExecutor:
+    """
+    Return the process pool images are resized in, created on first use.
+    """
+    global _executor
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=get_settings().image_processing_workers)
+    return _executor
+
+
+def get_storing_executor() -> ThreadPoolExecutor:
+    """
+    Return the thread pool renditions are stored from, created on first use.
+    """
+    global _storing_executor
+
+    if _storing_executor is None:
+        _storing_executor = ThreadPoolExecutor(
+            max_workers=get_settings().image_storing_workers, thread_name_prefix="image-storing"
+        )
+    return _storing_executor
+
+
+def shutdown_image_executor():
+    """
+    Stop the image processing pool, waiting for the renditions being built and stored.
+    """
+    global _executor, _storing_executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+    # after the processing pool, whose last results are still handed over for storing
+    if _storing_executor is not None:
+        _storing_executor.shutdown(wait=True)
+        _storing_executor = None
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Query, Request
+from media.dependencies import stream_image
+
+
+mediaApp = APIRouter(
+    prefix="/media",
+    tags=["Media"],
+)
+
+
+# ----------------------------- GET MEDIA FILE ------------------------------ #
+@mediaApp.get("/{file_id}")
+def get_media(
+    file_id: str,
+    request: Request,
+    w: int | None = Query(None, ge=1, le=4096, description="Width the image is displayed at, in pixels"),
+):
+    """
+    Stream an image stored in GridFS.
+
+    Responses carry a strong ETag and may be cached indefinitely, since a stored image never
+    changes. Supports conditional requests (If-None-Match) and single byte ranges (Range).
+    With `w`, the narrowest resized rendition at least `w` pixels wide is served instead,
+    as WebP when the Accept header allows it.
+
+    Args:
+        file_id (str): The id of the image, as returned when it was uploaded.
+        w (int | None): The width the image is displayed at.
+
+    Returns:
+        StreamingResponse: The image, or the requested part of it.
+    """
+    return stream_image(file_id, request, width=w)
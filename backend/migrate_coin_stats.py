@@ -0,0 +1,99 @@
+import argparse
+from pymongo import UpdateOne
+from coin_engine import daily_stats_filter
+from database_connection import coin_stats, coin_stats_daily
+
+
+# ------------------------------ COIN STATS MIGRATION ------------------------------ #
+# Converts the legacy coin_stats documents, {telegram_user_id, date: {"YYYY-MM-DD": coins}},
+# into per-user-per-day buckets in coin_stats_daily.
+#
+# Each legacy day is added to its bucket at most once (the bucket is flagged `legacy`), and a
+# legacy document is flagged `migrated` once all its days are written, so the migration can be
+# stopped and re-run at any time while the app keeps writing new buckets. Days whose key is not
+# a "YYYY-MM-DD" date are logged and skipped.
+
+def legacy_day_operation(telegram_user_id: str, day: str, coins: int) -> UpdateOne:
+    """
+    Build the bulk write operation that adds a legacy day's coins to its bucket, once.
+    """
+    return UpdateOne(
+        daily_stats_filter(telegram_user_id, day),
+        [{"$set": {
+            "coins": {
+                "$cond": [
+                    {"$eq": ["$legacy", True]},
+                    "$coins",
+                    {"$add": [{"$ifNull": ["$coins", 0]}, coins]}
+                ]
+            },
+            "legacy": True
+        }}],
+        upsert=True
+    )
+
+
+def legacy_operations(legacy: dict) -> tuple[list[UpdateOne], int]:
+    """
+    Build the bulk write operations of a legacy document's days.
+
+    Returns:
+        tuple[list[UpdateOne], int]: The operations, and the number of malformed days skipped.
+    """
+    operations = []
+    skipped = 0
+
+    for day, coins in (legacy.get("date") or {}).items():
+        if not coins:
+            continue
+        try:
+            operations.append(legacy_day_operation(legacy["telegram_user_id"], day, coins))
+        except ValueError:
+            print(f"Skipping malformed day {day!r} of user {legacy['telegram_user_id']}")
+            skipped += 1
+
+    return operations, skipped
+
+
+def migrate_coin_stats(batch_size: int = 500) -> dict:
+    """
+    Migrate the legacy coin stats in batches of users.
+
+    Args:
+        batch_size (int): The number of legacy documents converted per batch.
+
+    Returns:
+        dict: The number of users and days migrated, and of malformed days skipped.
+    """
+    users = days = skipped = 0
+    query = {"migrated": {"$ne": True}}
+
+    while True:
+        batch = list(coin_stats.find(query, {"telegram_user_id": 1, "date": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for legacy in batch:
+            legacy_days, legacy_skipped = legacy_operations(legacy)
+            operations.extend(legacy_days)
+            skipped += legacy_skipped
+
+        if operations:
+            coin_stats_daily.bulk_write(operations, ordered=False)
+
+        coin_stats.update_many({"_id": {"$in": [legacy["_id"] for legacy in batch]}}, {"$set": {"migrated": True}})
+
+        users += len(batch)
+        days += len(operations)
+        print(f"Migrated {users} users ({days} days, {skipped} malformed days skipped)")
+
+    return {"users": users, "days": days, "skipped": skipped}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert legacy coin_stats documents into daily buckets.")
+    parser.add_argument("--batch-size", type=int, default=500, help="legacy documents converted per batch")
+    args = parser.parse_args()
+
+    print(migrate_coin_stats(args.batch_size))
@@ -0,0 +1,120 @@
+import logging
+import time
+from contextvars import ContextVar
+from fastapi import Request
+from pymongo import monitoring
+from config import get_settings
+
+
+# ------------------------------ PER-REQUEST QUERY METRICS ------------------------------ #
+# A pymongo command listener attached to both mongo clients adds every command to the stats
+# of the request that issued it. The stats live in a context variable set by the middleware,
+# which sync routes (run in the threadpool) and async routes both inherit.
+
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "buildInfo", "endSessions", "saslStart", "saslContinue"}
+
+
+class QueryStats:
+    """
+    The database commands issued while handling one request.
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration_ms = 0.0
+        self.collections: dict[str, list] = {}     # collection: [commands, duration in ms]
+        self._pending: dict[int, str] = {}
+
+    def started(self, request_id: int, collection: str):
+        self._pending[request_id] = collection
+
+    def finished(self, request_id: int, duration_micros: int):
+        collection = self._pending.pop(request_id, None)
+        if collection is None:
+            return
+
+        duration_ms = duration_micros / 1000
+        self.count += 1
+        self.duration_ms += duration_ms
+
+        breakdown = self.collections.setdefault(collection, [0, 0.0])
+        breakdown[0] += 1
+        breakdown[1] += duration_ms
+
+    def breakdown(self) -> str:
+        return ",".join(
+            f"{collection}={commands}" for collection, (commands, _) in
+            sorted(self.collections.items(), key=lambda item: item[1][0], reverse=True)
+        )
+
+
+_request_stats: ContextVar[QueryStats | None] = ContextVar("request_query_stats", default=None)
+
+
+def current_query_stats() -> QueryStats | None:
+    """
+    Return the query stats of the request being handled, None outside of a request.
+    """
+    return _request_stats.get()
+
+
+def _command_collection(event: monitoring.CommandStartedEvent) -> str:
+    target = event.command.get(event.command_name)
+    if event.command_name == "getMore":
+        target = event.command.get("collection")
+
+    return target if isinstance(target, str) else event.command_name
+
+
+class QueryMetricsListener(monitoring.CommandListener):
+    def started(self, event: monitoring.CommandStartedEvent):
+        stats = _request_stats.get()
+        if stats is not None and event.command_name not in IGNORED_COMMANDS:
+            stats.started(event.request_id, _command_collection(event))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.finished(event.request_id, event.duration_micros)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.finished(event.request_id, event.duration_micros)
+
+
+query_metrics_listener = QueryMetricsListener()
+
+
+async def query_metrics_middleware(request: Request, call_next):
+    """
+    Count the database commands of each request and report them as response headers.
+
+    Adds X-DB-Query-Count, X-DB-Time-Ms, X-DB-Collections and a Server-Timing entry, and logs
+    a warning when a request issues more commands than the configured query budget.
+    """
+    settings = get_settings()
+    if not settings.query_metrics_enabled:
+        return await call_next(request)
+
+    stats = QueryStats()
+    token = _request_stats.set(stats)
+    started = time.perf_counter()
+
+    try:
+        response = await call_next(request)
+    finally:
+        _request_stats.reset(token)
+
+    response.headers["X-DB-Query-Count"] = str(stats.count)
+    response.headers["X-DB-Time-Ms"] = f"{stats.duration_ms:.1f}"
+    response.headers["X-DB-Collections"] = stats.breakdown()
+    response.headers["Server-Timing"] = f'db;dur={stats.duration_ms:.1f};desc="{stats.count} queries"'
+
+    if stats.count > settings.query_budget:
+        logging.warning(
+            f"Query budget exceeded: {request.method} {request.url.path} issued {stats.count} queries "
+            f"({stats.duration_ms:.1f} ms db, {(time.perf_counter() - started) * 1000:.1f} ms total) "
+            f"[{stats.breakdown()}]"
+        )
+
+    return response
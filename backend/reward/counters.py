@@ -0,0 +1,155 @@
+import time
+from uuid import uuid4
+from bson import ObjectId
+from pymongo import UpdateOne
+from redis.exceptions import RedisError, ResponseError
+from config import get_settings
+from database_connection import async_rewards_collection, get_async_redis_client, report_redis_failure
+from scheduler import register_job
+
+
+# ------------------------------ REWARD COUNTERS ------------------------------ #
+# Impressions and claims of rewards are counted in a redis hash (or in process while redis is
+# unavailable) and written to the rewards with one bulk_write per flush, instead of one update
+# each time a user opens the rewards tab. The persisted counts lag by up to a flush interval.
+# A batch left behind by a worker that died mid-flush is applied by a later flush, which counts
+# it twice only if the worker died between writing the batch and deleting it.
+
+PENDING_KEY = "reward_counters:pending"
+FLUSHING_KEY_PREFIX = "reward_counters:flushing:"
+IMPRESSION_COUNT = "impression_count"
+CLAIM_COUNT = "claim_count"
+
+# in-process fallback, counts keyed by "<reward_id>|<counter>"
+_pending: dict[str, int] = {}
+
+
+def reward_claim_rate(reward: dict) -> float:
+    """
+    Return the percentage of a reward's impressions that were claimed, rounded to one decimal.
+    """
+    impressions = reward.get(IMPRESSION_COUNT, 0)
+    claims = reward.get(CLAIM_COUNT, 0)
+
+    return round((claims / impressions) * 100, 1) if impressions > 0 else 0.0
+
+
+async def _count(reward_ids: list[str], counter: str):
+    fields = [f"{reward_id}|{counter}" for reward_id in reward_ids]
+    if not fields:
+        return
+
+    redis_client = get_async_redis_client()
+    if redis_client:
+        try:
+            # a transaction, so a failure never leaves some of the counts behind
+            pipe = redis_client.pipeline()
+            for field in fields:
+                pipe.hincrby(PENDING_KEY, field, 1)
+            await pipe.execute()
+            return
+        except RedisError as e:
+            print(f"Reward counters: redis unavailable, counting in process: {e}")
+            report_redis_failure(e)
+
+    for field in fields:
+        _pending[field] = _pending.get(field, 0) + 1
+
+
+async def record_impressions(reward_ids: list[str]):
+    """
+    Count one impression of each of the rewards.
+
+    Args:
+        reward_ids (list[str]): The IDs of the rewards shown to a user.
+    """
+    await _count(reward_ids, IMPRESSION_COUNT)
+
+
+async def record_claim(reward_id: str):
+    """
+    Count one claim of a reward.
+    """
+    await _count([reward_id], CLAIM_COUNT)
+
+
+# ------------------------------ FLUSHING ------------------------------ #
+async def _apply(entries: dict[str, int]):
+    increments: dict[str, dict[str, int]] = {}
+    for field, count in entries.items():
+        reward_id, counter = field.rsplit("|", 1)
+        if ObjectId.is_valid(reward_id):
+            counters = increments.setdefault(reward_id, {})
+            counters[counter] = counters.get(counter, 0) + int(count)
+
+    if increments:
+        await async_rewards_collection.bulk_write(
+            [UpdateOne({"_id": ObjectId(reward_id)}, {"$inc": counters}) for reward_id, counters in increments.items()],
+            ordered=False
+        )
+
+
+def _new_flushing_key() -> str:
+    return f"{FLUSHING_KEY_PREFIX}{int(time.time())}-{uuid4().hex[:8]}"
+
+
+async def _flush_batch(redis_client, flushing_key: str):
+    await _apply(await redis_client.hgetall(flushing_key))
+    await redis_client.delete(flushing_key)
+
+
+async def _flush_redis(redis_client):
+    stale_after = max(30.0, get_settings().reward_counters_flush_interval * 10)
+
+    # apply batches left behind by a worker that died mid-flush, claiming each with a rename
+    # so that two workers never apply the same batch
+    async for flushing_key in redis_client.scan_iter(match=FLUSHING_KEY_PREFIX + "*"):
+        started_at = int(flushing_key[len(FLUSHING_KEY_PREFIX):].split("-", 1)[0])
+        if time.time() - started_at > stale_after:
+            claimed_key = _new_flushing_key()
+            try:
+                await redis_client.rename(flushing_key, claimed_key)
+            except ResponseError:
+                continue
+            print(f"Reward counters: applying orphaned batch {flushing_key}")
+            await _flush_batch(redis_client, claimed_key)
+
+    flushing_key = _new_flushing_key()
+    try:
+        await redis_client.rename(PENDING_KEY, flushing_key)
+    except ResponseError:
+        # nothing counted (or another worker grabbed it first)
+        return
+
+    await _flush_batch(redis_client, flushing_key)
+
+
+async def flush_reward_counters():
+    """
+    Write the counted impressions and claims to the rewards.
+    """
+    global _pending
+
+    if _pending:
+        entries, _pending = _pending, {}
+        try:
+            await _apply(entries)
+        except Exception:
+            # keep the counts for the next flush
+            for field, count in entries.items():
+                _pending[field] = _pending.get(field, 0) + count
+            raise
+
+    redis_client = get_async_redis_client()
+    if not redis_client:
+        return
+
+    try:
+        await _flush_redis(redis_client)
+    except RedisError as e:
+        print(f"Reward counters: flush failed: {e}")
+        report_redis_failure(e)
+
+
+# every worker flushes, as each may hold counts in process
+register_job("flush_reward_counters", get_settings().reward_counters_flush_interval, flush_reward_counters, exclusive=False)
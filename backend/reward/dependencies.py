@@ -1,85 +1,178 @@
 from bson import ObjectId
 from fastapi import HTTPException
-from database_connection import user_collection, rewards_collection, user_collection
+from redis.exceptions import RedisError
+from config import get_settings
+from coin_engine import credit_coins_async
+from database_connection import async_user_collection, async_rewards_collection, get_async_redis_client, report_redis_failure
 from reward.schemas import RewardSchema
-from superuser.reward.dependencies import get_rewards
-from dependencies import update_coins_in_db
+from dependencies import update_coin_stats_async
+from reward.counters import record_claim, record_impressions
+from superuser.reward.dependencies import reward_expiry_cutoff
+from targeting import AUDIENCE_PROJECTION, targeting_query
+from pymongo import IndexModel
+from indexes import register_indexes
 
 
-def my_on_going_rewards(telegram_user_id: str):
-    my_data: dict = user_collection.find_one({"telegram_user_id": telegram_user_id})
+register_indexes("rewards", IndexModel([("status", 1), ("beneficiary", 1), ("expiry_date", 1)]))
+
+
+async def my_on_going_rewards(telegram_user_id: str):
+    my_data: dict = await async_user_collection.find_one(
+        {"telegram_user_id": telegram_user_id},
+        {**AUDIENCE_PROJECTION, "claimed_rewards": 1}
+    )
+    my_rewards: list[RewardSchema] = []
 
     if my_data:
-        my_username: str = my_data["username"]
-        my_level: str = my_data["level"]
-        my_level_name: str = my_data["level_name"].lower()
-        my_clan_id = my_data["clan"]["id"]
-        my_clan_name = my_data["clan"]["name"]
-        my_claimed_rewards = my_data["claimed_rewards"]
-
-        conditions = [
-            "all_users", my_username, telegram_user_id, 
-            my_level, my_level_name, 
-            my_clan_name, my_clan_id
-        ]
-
-        for reward in get_rewards():
-            if reward.status == "on_going" and reward.id not in my_claimed_rewards:
-                if any(condition in reward.beneficiary for condition in conditions):
-                    # update to increment impression count
-                    update_reward = {
-                        "$inc": {
-                            "impression_count": 1
-                        }
-                    }
-
-                    # increment impression count if reward is viewed
-                    rewards_collection.update_one({"_id": ObjectId(reward.id)}, update_reward)
-
-                    yield RewardSchema(
-                        reward_id=reward.id,
-                        reward_title=reward.reward_title,
-                        reward=reward.reward,
-                        reward_image_id=reward.reward_image_id
-                        )
-
-
-
-def claim_reward(telegram_user_id: str, reward_id: str):
-    reward = rewards_collection.find_one({"_id": ObjectId(reward_id)})
-    my_data = user_collection.find_one({"telegram_user_id": telegram_user_id})
-
-    if reward:
-        if reward_id in my_data["claimed_rewards"]:
-            raise HTTPException(status_code=400, detail="Reward already claimed.")
-        
-        reward_value = reward["reward"]
-
-        # claim reward
-        update_coins_in_db(telegram_user_id, reward_value)
-
-        # update claim count
-        update_reward = {
-            "$inc": {
-                "claim_count": 1
-            }
-        }
-        rewards_collection.update_one({"_id": ObjectId(reward_id)}, update_reward)
+        my_claimed_rewards = [ObjectId(reward_id) for reward_id in my_data.get("claimed_rewards", []) if ObjectId.is_valid(reward_id)]
+
+        # ongoing, unexpired and unclaimed rewards targeting the user
+        query = targeting_query(
+            my_data, "beneficiary",
+            status="on_going",
+            expiry_date={"$gte": reward_expiry_cutoff()},
+            _id={"$nin": my_claimed_rewards}
+        )
+        projection = {"reward_title": 1, "reward": 1, "reward_image_id": 1}
+
+        async for reward in async_rewards_collection.find(query, projection):
+            my_rewards.append(
+                RewardSchema(
+                    reward_id=str(reward["_id"]),
+                    reward_title=reward["reward_title"],
+                    reward=reward["reward"],
+                    reward_image_id=str(reward["reward_image_id"])
+                )
+            )
 
-        # update user claimed rewards
-        update_user = {
-            "$push": {
-                "claimed_rewards": reward_id
-            }
-        }
-        user_collection.update_one({"telegram_user_id": telegram_user_id}, update_user)
+        # count an impression of every viewed reward, written to the rewards in batches
+        await record_impressions([reward.reward_id for reward in my_rewards])
+
+    return my_rewards
+
+
+
+# ------------------------------ CLAIM REWARD ------------------------------ #
+# A claim credits the reward and records it as claimed in one conditional write to the user,
+# which only matches while the reward is not among the user's claimed rewards, so concurrent
+# claims of the same reward credit it once. Clients may send an idempotency key with a claim:
+# its outcome is kept in redis and a retry with the same key gets it back without a write.
+
+CLAIM_IDEMPOTENCY_KEY_PREFIX = "idempotency:claim:"
+CLAIM_PENDING = "pending"
+
+
+async def _begin_claim(idempotency_key: str) -> str | None:
+    """
+    Reserve an idempotency key, returning the outcome of an earlier claim with the same key.
+    """
+    redis_client = get_async_redis_client()
+    if not redis_client:
+        return None
+
+    try:
+        reserved = await redis_client.set(
+            idempotency_key, CLAIM_PENDING, nx=True, ex=get_settings().idempotency_key_ttl
+        )
+        if reserved:
+            return None
+
+        outcome = await redis_client.get(idempotency_key)
+    except RedisError as e:
+        report_redis_failure(e)
+        return None
+
+    if outcome == CLAIM_PENDING:
+        raise HTTPException(status_code=409, detail="Reward claim already in progress.")
 
-        return True
+    return outcome
 
-    return False
 
-def my_claimed_rewards(telegram_user_id: str):
-    my_data = user_collection.find_one({"telegram_user_id": telegram_user_id})
+async def _finish_claim(idempotency_key: str, outcome: str | None):
+    """
+    Record the outcome of a claim under its idempotency key, or release the key if it failed.
+    """
+    redis_client = get_async_redis_client()
+    if not redis_client:
+        return
+
+    try:
+        if outcome is None:
+            await redis_client.delete(idempotency_key)
+        else:
+            await redis_client.set(idempotency_key, outcome, ex=get_settings().idempotency_key_ttl)
+    except RedisError as e:
+        report_redis_failure(e)
+
+
+async def _claim(telegram_user_id: str, reward_id: str) -> str:
+    if not ObjectId.is_valid(reward_id):
+        return "not_found"
+
+    reward = await async_rewards_collection.find_one({"_id": ObjectId(reward_id)}, {"reward": 1})
+    if not reward:
+        return "not_found"
+
+    # credit the reward unless it was already claimed
+    user = await credit_coins_async(
+        telegram_user_id,
+        reward["reward"],
+        extra_filter={"claimed_rewards": {"$ne": reward_id}},
+        extra_push={"claimed_rewards": reward_id}
+    )
+    if not user:
+        # no match means the reward was claimed, unless there is no such user
+        if not await async_user_collection.find_one({"telegram_user_id": telegram_user_id}, {"_id": 1}):
+            return "user_not_found"
+        return "already_claimed"
+
+    await update_coin_stats_async(telegram_user_id, reward["reward"])
+    await record_claim(reward_id)
+
+    return "claimed"
+
+
+async def claim_reward(telegram_user_id: str, reward_id: str, idempotency_key: str | None = None):
+    """
+    Claim a reward for a user.
+
+    Args:
+        telegram_user_id (str): The telegram user ID of the user claiming.
+        reward_id (str): The ID of the reward.
+        idempotency_key (str | None): A key chosen by the client, retries with the same key
+            return the outcome of the first claim.
+
+    Returns:
+        bool: True if the reward was claimed, False if it does not exist.
+
+    Raises:
+        HTTPException: If the user does not exist, already claimed the reward, or a claim
+            with the same idempotency key is still in progress.
+    """
+    outcome = None
+
+    if idempotency_key:
+        idempotency_key = f"{CLAIM_IDEMPOTENCY_KEY_PREFIX}{telegram_user_id}:{reward_id}:{idempotency_key}"
+        outcome = await _begin_claim(idempotency_key)
+
+    if outcome is None:
+        try:
+            outcome = await _claim(telegram_user_id, reward_id)
+        finally:
+            if idempotency_key:
+                await _finish_claim(idempotency_key, outcome)
+
+    if outcome == "user_not_found":
+        raise HTTPException(status_code=404, detail="User not found.")
+    if outcome == "already_claimed":
+        raise HTTPException(status_code=400, detail="Reward already claimed.")
+
+    return outcome == "claimed"
+
+
+async def my_claimed_rewards(telegram_user_id: str):
+    my_data = await async_user_collection.find_one({"telegram_user_id": telegram_user_id})
+    my_rewards: list[RewardSchema] = []
 
     if my_data:
         reward_ids = [ObjectId(reward_id) for reward_id in my_data["claimed_rewards"] if ObjectId.is_valid(reward_id)]
@@ -88,12 +181,14 @@ def my_claimed_rewards(telegram_user_id: str):
             "_id": {"$in": reward_ids}
         }
 
-        claim_rewards = rewards_collection.find(query)
-
-        for reward in claim_rewards:
-            yield RewardSchema(
-                reward_id=str(reward["_id"]),
-                reward_title=reward["reward_title"],
-                reward=reward["reward"],
-                reward_image_id=str(reward["reward_image_id"])
+        async for reward in async_rewards_collection.find(query):
+            my_rewards.append(
+                RewardSchema(
+                    reward_id=str(reward["_id"]),
+                    reward_title=reward["reward_title"],
+                    reward=reward["reward"],
+                    reward_image_id=str(reward["reward_image_id"])
                 )
+            )
+
+    return my_rewards
@@ -0,0 +1,109 @@
+import asyncio
+import inspect
+import time
+from typing import Callable, NamedTuple
+from uuid import uuid4
+from redis.exceptions import RedisError
+from config import get_settings
+from database_connection import get_async_redis_client, report_redis_failure
+
+
+# ------------------------------ PERIODIC JOBS ------------------------------ #
+# Housekeeping that used to run inline with requests runs here instead, in the background of
+# every worker. Subsystems declare their jobs with `register_job`, next to the job itself.
+# Before each run of an exclusive job a worker takes the job's redis lock for the length of the
+# interval, so the job runs once per interval across all workers. While redis is unavailable every worker runs its
+# jobs itself, which is why jobs must be safe to run concurrently.
+
+JOB_LOCK_KEY_PREFIX = "scheduler:lock:"
+
+
+class Job(NamedTuple):
+    name: str
+    interval: float         # seconds between runs
+    func: Callable          # sync functions run in a thread, coroutine functions on the loop
+    exclusive: bool = True  # whether a single worker runs the job per interval, or each of them
+
+
+_jobs: dict[str, Job] = {}
+_tasks: list[asyncio.Task] = []
+_worker_id = uuid4().hex
+
+
+def register_job(name: str, interval: float, func: Callable, exclusive: bool = True):
+    """
+    Declare a job to run every `interval` seconds.
+
+    Args:
+        name (str): A unique name for the job, also its lock name.
+        interval (float): Seconds between runs.
+        func (Callable): The job, called without arguments.
+        exclusive (bool): Whether one worker runs the job per interval, False for jobs that
+            tend to per-process state and must run on every worker.
+    """
+    _jobs[name] = Job(name, interval, func, exclusive)
+
+
+async def _acquire(job: Job) -> bool:
+    redis_client = get_async_redis_client()
+    if not job.exclusive or not redis_client:
+        return True
+
+    try:
+        # held until it expires, so no other worker runs the job within the same interval
+        return bool(await redis_client.set(
+            f"{JOB_LOCK_KEY_PREFIX}{job.name}", _worker_id, nx=True, px=max(int(job.interval * 1000) - 100, 1)
+        ))
+    except RedisError as e:
+        report_redis_failure(e)
+        return True
+
+
+async def run_job(job: Job):
+    """
+    Run a job once, logging rather than raising its errors.
+    """
+    started = time.perf_counter()
+
+    try:
+        if inspect.iscoroutinefunction(job.func):
+            await job.func()
+        else:
+            await asyncio.to_thread(job.func)
+    except Exception as e:
+        print(f"Scheduler: job {job.name} failed: {e}")
+        return
+
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms > job.interval * 1000:
+        print(f"Scheduler: job {job.name} took {duration_ms:.0f} ms, longer than its interval")
+
+
+async def _job_loop(job: Job):
+    while True:
+        if await _acquire(job):
+            await run_job(job)
+        await asyncio.sleep(job.interval)
+
+
+def start_scheduler():
+    """
+    Start running every registered job, the first run of each right away.
+    """
+    if not get_settings().scheduler_enabled:
+        print("Scheduler disabled")
+        return
+
+    for job in _jobs.values():
+        _tasks.append(asyncio.create_task(_job_loop(job), name=f"job:{job.name}"))
+
+
+async def stop_scheduler():
+    """
+    Cancel every job, waiting for the ones running to stop.
+    """
+    for task in _tasks:
+        task.cancel()
+
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -1,12 +1,16 @@
 from datetime import datetime, timezone
-from io import BytesIO
 
 from bson import ObjectId
-from fastapi import HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import HTTPException, Request
 from superuser.boost.models import AutoBotModel, AutoBotModelResponse, ExtraBoostModel, ExtraBoostModelResponse
 from superuser.boost.schemas import CreateExtraBoost, UpdateUpgradeCost
-from database_connection import extra_boosts_collection, fs
+from database_connection import extra_boosts_collection
+from media.dependencies import delete_image, store_image, stream_image
+from pymongo import IndexModel
+from indexes import register_indexes
+
+
+register_indexes("extra_boosts", IndexModel([("name", 1), ("level", -1)]))
 
 
 # ------------------------------ VERIFY NEW EXTRA BOOST ------------------------------ #
@@ -97,7 +101,7 @@ def create_extra_boost(eboost: CreateExtraBoost):
     verify_new_extra_boost(eboost)
 
     if verify_image(image_format):
-        image_id = fs.put(image, filename="eboost_" + image_name)
+        image_id = store_image(image, "eboost_" + image_name)
 
         if eboost.name == "Auto-bot Tapping":
             new_boost = AutoBotModel(
@@ -172,12 +176,8 @@ def get_extra_boosters():
 
 
 # ----------------------------- GET EXTRA BOOST IMAGE ------------------------------ #
-def get_extra_boost_image(image_id: str):
-    image = fs.get(ObjectId(image_id))
-    image_format = image.filename.split(".")[1]
-    image_buffer = BytesIO(image.read())
-    image_buffer.seek(0)
-    return StreamingResponse(image_buffer, media_type=f"image/{image_format}")
+def get_extra_boost_image(image_id: str, request: Request | None = None):
+    return stream_image(image_id, request)
 
 
 # ----------------------------- UPDATE UPGRADE COST ------------------------------ #
@@ -213,7 +213,7 @@ def delete_extra_boost(eboost_id):
 
     # delete eboost image
     image_id = eboost["image_id"]
-    fs.delete(ObjectId(image_id))
+    delete_image(image_id)
 
     deleted = extra_boosts_collection.delete_one({"_id": ObjectId(eboost_id)})
 
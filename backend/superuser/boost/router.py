@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends
+import asyncio
+from fastapi import APIRouter, Depends, Request
 from superuser.dashboard.admin_auth import get_current_admin
+from database_connection import invalidate_cache_tags_async
 from superuser.boost.schemas import CreateExtraBoost, UpdateUpgradeCost
 from superuser.boost.models import AutoBotModelResponse, ExtraBoostModelResponse
 from superuser.boost.dependencies import (
@@ -23,7 +25,8 @@ boostApp = APIRouter(
 @boostApp.post("/create_extra_boost")
 async def create_extra_boost(eboost: CreateExtraBoost = Depends(CreateExtraBoost)) -> ExtraBoostModelResponse | AutoBotModelResponse:
 
-    extra_boost = create_extra_boost_func(eboost)
+    extra_boost = await asyncio.to_thread(create_extra_boost_func, eboost)
+    await invalidate_cache_tags_async("extra_boosts")
 
     return extra_boost
 
@@ -37,22 +40,26 @@ async def get_extra_boosters() -> list[ExtraBoostModelResponse | AutoBotModelRes
 
 # ----------------------------- GET EXTRA BOOST IMAGE ------------------------------ #
 @boostApp.get("/extra_boost_image/{image_id}")
-async def get_extra_boost_image(image_id: str) -> bytes:
+async def get_extra_boost_image(image_id: str, request: Request) -> bytes:
 
-    return get_extra_boost_image_func(image_id)
+    return get_extra_boost_image_func(image_id, request)
 
 
 # ----------------------------- UPDATE UPGRADE COST ------------------------------ #
 @boostApp.put("/edit_upgrade_cost")
 async def update_upgrade_cost(upgrade: UpdateUpgradeCost = Depends(UpdateUpgradeCost)):
 
-    return update_upgrade_cost_func(upgrade)
+    updated = update_upgrade_cost_func(upgrade)
+    await invalidate_cache_tags_async("extra_boosts")
+
+    return updated
 
 
 @boostApp.delete("/extra_booster")
 async def delete_extra_boost(extra_boost_id: str):
     
     deleted = delete_extra_boost_func(extra_boost_id)
+    await invalidate_cache_tags_async("extra_boosts")
 
     if deleted:
         return {"message": "extra booster deleted successfully"}
\ No newline at end of file
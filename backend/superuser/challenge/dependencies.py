@@ -1,13 +1,42 @@
 from datetime import date, datetime, timedelta
 from email.mime import image
-from io import BytesIO
 from bson import ObjectId
-from fastapi import HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import HTTPException, Request
 from superuser.challenge.models import ChallengeModel, ChallengeModelResponse
 from superuser.challenge.schemas import CreateChallenge
 from dependencies import user_levels
-from database_connection import user_collection, fs, challenges_collection, clans_collection
+from database_connection import invalidate_cache_tags, user_collection, challenges_collection, clans_collection
+from media.dependencies import delete_image, store_image, stream_image
+from pymongo import IndexModel
+from indexes import register_indexes
+from config import get_settings
+from scheduler import register_job
+
+
+register_indexes("challenges", IndexModel([("launch_date", 1)]))
+
+CHALLENGE_COMPLETED = "00:00:00:00"
+
+# launch_date plus the "DD:HH:MM:SS" duration, evaluated by the database
+CHALLENGE_END_DATE = {
+    "$let": {
+        "vars": {"parts": {"$map": {"input": {"$split": ["$duration", ":"]}, "in": {"$toInt": "$$this"}}}},
+        "in": {
+            "$dateAdd": {
+                "startDate": "$launch_date",
+                "unit": "second",
+                "amount": {
+                    "$add": [
+                        {"$multiply": [{"$arrayElemAt": ["$$parts", 0]}, 86400]},
+                        {"$multiply": [{"$arrayElemAt": ["$$parts", 1]}, 3600]},
+                        {"$multiply": [{"$arrayElemAt": ["$$parts", 2]}, 60]},
+                        {"$arrayElemAt": ["$$parts", 3]}
+                    ]
+                }
+            }
+        }
+    }
+}
 
 
 def verify_image(format: str):
@@ -153,7 +182,7 @@ def create_challenge(challenge: CreateChallenge, image_bytes: bytes, image_name:
     # challenge_remaining_time = f"{days:02d}:{hours:02d}:{minutes:02d}:{seconds:02d}"
     challenge_remaining_time = calculate_remaining_time(challenge.duration, challenge.launch_date)
 
-    image_id = fs.put(image_bytes, filename="challenge_" + image_name)
+    image_id = store_image(image_bytes, "challenge_" + image_name)
 
     if not image_id:
         raise HTTPException("Challenge creation failed.")
@@ -198,12 +227,12 @@ def update_challenge(challenge_id: str, challenge: CreateChallenge, image_bytes:
     challenge_launch_date = challenge.launch_date
     remaining_time = calculate_remaining_time(challenge_duration, challenge_launch_date)
 
-    # delete old image and insert updated image
+    # insert updated image and release the old one, an unchanged image is kept as is
     try:
-        old_img_id = challenge_data["image_id"]
-        fs.delete(ObjectId(old_img_id))
+        new_img_id = store_image(image_bytes, image_name)
 
-        new_img_id = fs.put(image_bytes, filename=image_name)
+        old_img_id = challenge_data["image_id"]
+        delete_image(old_img_id)
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -241,11 +270,8 @@ def update_challenge(challenge_id: str, challenge: CreateChallenge, image_bytes:
 
 
 # --------------------------------- GET CHALLENGE IMAGE --------------------------------- #
-def get_challenge_image(image_id: str):
-    challenge_image = fs.get(ObjectId(image_id))
-    image_buffer = BytesIO(challenge_image.read())
-    image_buffer.seek(0)
-    return StreamingResponse(image_buffer, media_type="image/jpeg")
+def get_challenge_image(image_id: str, request: Request | None = None):
+    return stream_image(image_id, request)
 
 
 # --------------------------------- GET CHALLENGES --------------------------------- #
@@ -257,15 +283,6 @@ def get_challenges(status: str):
         challenge_launch_date: datetime = challenge["launch_date"]
 
         remaining_time = calculate_remaining_time(challenge_duration, challenge_launch_date)
-        
-        if remaining_time == "00:00:00:00":
-            # update remaining time in db
-            update_operation = {
-                "$set": {
-                    "remaining_time": remaining_time
-                }
-            }
-            challenges_collection.update_one({"_id": ObjectId(challenge['_id'])}, update_operation)
 
         # ongoing challenges
         if status == "ongoing" and remaining_time != "00:00:00:00":
@@ -344,7 +361,7 @@ def delete_challenge(challenge_id: str):
 
         # delete challenge image
         image_id = challenge["image_id"]
-        fs.delete(ObjectId(image_id))
+        delete_image(image_id)
 
         # delete challenge
         deleted = challenges_collection.delete_one({"_id": ObjectId(challenge_id)})
@@ -357,3 +374,23 @@ def delete_challenge(challenge_id: str):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+
+# --------------------------------- UPDATE EXPIRED CHALLENGES --------------------------------- #
+def update_status_of_expired_challenges():
+    """
+    Record every challenge past its end as completed.
+    """
+    expired = challenges_collection.update_many(
+        {
+            "remaining_time": {"$ne": CHALLENGE_COMPLETED},
+            "$expr": {"$lte": [CHALLENGE_END_DATE, "$$NOW"]}
+        },
+        {"$set": {"remaining_time": CHALLENGE_COMPLETED}}
+    )
+
+    if expired.modified_count:
+        print(f"completed challenges: {expired.modified_count}")
+        invalidate_cache_tags("challenges")
+
+
+register_job("expire_challenges", get_settings().expiry_sweep_interval, update_status_of_expired_challenges)
@@ -1,7 +1,8 @@
+import asyncio
 from datetime import date
 from enum import verify
 from io import BytesIO
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from superuser.challenge.models import ChallengeModelResponse
 from superuser.challenge.schemas import ChallengeStatus, CreateChallenge
 from superuser.challenge.dependencies import (
@@ -14,6 +15,7 @@ from superuser.challenge.dependencies import (
     delete_challenge as delete_challenge_func
 )
 from superuser.dashboard.admin_auth import get_current_admin
+from database_connection import invalidate_cache_tags_async
 from superuser.challenge.dependencies import verify_participants
 
 
@@ -70,7 +72,8 @@ async def create_challenge(
 
     verify_participants(challenge, clan, level, specific_users)
 
-    created_challenge = create_challenge_func(challenge, image_bytes, image_filename)
+    created_challenge = await asyncio.to_thread(create_challenge_func, challenge, image_bytes, image_filename)
+    await invalidate_cache_tags_async("challenges")
 
     return created_challenge
 
@@ -95,7 +98,8 @@ async def update_challenge(
 
         verify_participants(challenge, clan, level, specific_users)
 
-        updated_challenge = update_challenge_func(challenge_id, challenge, image_bytes, img_name, )
+        updated_challenge = await asyncio.to_thread(update_challenge_func, challenge_id, challenge, image_bytes, img_name)
+        await invalidate_cache_tags_async("challenges")
 
         return updated_challenge
     except Exception as e:
@@ -104,8 +108,8 @@ async def update_challenge(
 
 # --------------------------------- GET CHALLENGE IMAGE --------------------------------- #
 @challenge_router.get("/get_challenge_image/{challenge_id}")
-async def get_challenge_image(image_id: str) -> bytes:
-    image = get_challenge_image_func(image_id)
+async def get_challenge_image(image_id: str, request: Request) -> bytes:
+    image = get_challenge_image_func(image_id, request)
 
     return image
 
@@ -139,6 +143,7 @@ async def get_challenge_by_date(date: date) -> ChallengeModelResponse:
 @challenge_router.delete("/delete_challenge/{challenge_id}")
 async def delete_challenge(challenge_id: str):
     deleted = delete_challenge_func(challenge_id)
+    await invalidate_cache_tags_async("challenges")
 
     if not deleted:
         raise HTTPException(status_code=400, detail="Challenge deletion failed.")
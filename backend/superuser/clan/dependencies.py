@@ -1,8 +1,7 @@
-from io import BytesIO
 from bson import ObjectId
-from fastapi import HTTPException
-from fastapi.responses import StreamingResponse
-from database_connection import clans_collection, user_collection, fs
+from fastapi import HTTPException, Request
+from database_connection import clans_collection, user_collection
+from media.dependencies import stream_image
 from superuser.clan.schemas import AlterClanStatus, ClanCategories, ClanProfile
 
 
@@ -49,11 +48,8 @@ def get_clans(category: ClanCategories, skip: int, page_size: int):
 
 
 # ------------------------------- CLAN PROFILE IMAGE -------------------------------- #
-def get_clan_profile_image(image_id: str):
-    image = fs.get(ObjectId(image_id))
-    image_buffer = BytesIO(image.read())
-    image_buffer.seek(0)
-    return StreamingResponse(image_buffer, media_type="image/jpeg")
+def get_clan_profile_image(image_id: str, request: Request | None = None):
+    return stream_image(image_id, request)
 
 
 # ------------------------------- CLAN PROFILE -------------------------------- #
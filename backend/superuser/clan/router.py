@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from clan.dependencies import clan_top_earners as clan_top_earners_func
 from superuser.clan.dependencies import (
     get_clans as get_clans_func,
@@ -8,6 +8,7 @@ from superuser.clan.dependencies import (
 )
 from superuser.clan.schemas import AlterClanStatus, ClanCategories
 from superuser.dashboard.admin_auth import get_current_admin
+from database_connection import invalidate_cache_tags_async
 
 
 clan_router = APIRouter(
@@ -44,9 +45,9 @@ async def get_clans(
 
 # ----------------------------- CLAN PROFILE ------------------------------ #
 @clan_router.get("/get_clan/{clan_id}/image")
-async def get_clan_profile_image(image_id: str):
+async def get_clan_profile_image(image_id: str, request: Request):
 
-    return get_clan_profile_image_func(image_id)
+    return get_clan_profile_image_func(image_id, request)
 
 
 # ----------------------------- CLAN PROFILE ------------------------------ #
@@ -80,6 +81,7 @@ async def alter_clan_status(alter_action: AlterClanStatus, clan_id: str):
         dict: A dictionary containing the status and message of the operation.
     """
     response = alter_clan_status_func(clan_id, alter_action)
+    await invalidate_cache_tags_async("clans")
 
     return response
 
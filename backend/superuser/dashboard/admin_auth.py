@@ -1,7 +1,12 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Annotated
 from typing_extensions import deprecated
-import jwt
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -10,10 +15,16 @@ from superuser.dashboard.models import AdminProfile as modelsAdminProfile
 from superuser.dashboard.schemas import AdminProfile as schemasAdminProfile
 from superuser.dashboard.schemas import AdminSignin, TokenData
 from config import get_settings
-from database_connection import user_collection, invites_ref, admin_collection
+from database_connection import user_collection, invites_ref, admin_collection, async_admin_collection
 from user_reg_and_prof_mngmnt.schemas import InviteeData, Invites, Signup, UserProfile
 from user_reg_and_prof_mngmnt.dependencies import get_user_by_id, serialize_any_http_url, referral_url_prefix
 from user_reg_and_prof_mngmnt.user_authentication import oauth2_scheme
+from user_reg_and_prof_mngmnt.token_cache import decode_token
+from pymongo import IndexModel
+from indexes import register_indexes
+
+
+register_indexes("admins", IndexModel([("username", 1)], unique=True))
 
 
 SECRET_KEY = get_settings().secret_key
@@ -48,6 +59,102 @@ def authenticate_admin(username: str, password: str) -> schemasAdminProfile | No
     return admin_data
 
 
+# ------------------------------ OFFLOADED BCRYPT ------------------------------ #
+# bcrypt takes a few hundred milliseconds of CPU, so it runs in a small dedicated thread pool
+# instead of on the event loop. At most `bcrypt_max_pending` verifications wait for the pool,
+# further sign-ins are refused, and failed attempts are remembered for a short while so that
+# repeating the same wrong credentials does not cost another hash.
+
+_bcrypt_executor = ThreadPoolExecutor(max_workers=get_settings().bcrypt_max_workers, thread_name_prefix="bcrypt")
+_bcrypt_slots = asyncio.Semaphore(get_settings().bcrypt_max_pending)
+
+_failed_logins: OrderedDict[bytes, float] = OrderedDict()
+_failed_logins_lock = threading.Lock()
+
+
+def _login_digest(username: str, password: str) -> bytes:
+    return hashlib.sha256(f"{username}\0{password}".encode()).digest()
+
+
+def _recently_failed(digest: bytes) -> bool:
+    with _failed_logins_lock:
+        expires_at = _failed_logins.get(digest)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del _failed_logins[digest]
+            return False
+        return True
+
+
+def _remember_failure(digest: bytes):
+    with _failed_logins_lock:
+        _failed_logins[digest] = time.monotonic() + get_settings().admin_failed_login_ttl
+        _failed_logins.move_to_end(digest)
+        while len(_failed_logins) > get_settings().admin_failed_login_cache_size:
+            _failed_logins.popitem(last=False)
+
+
+def forget_failed_logins():
+    """
+    Drop remembered failed admin sign-ins, to be called when admin credentials change.
+    """
+    with _failed_logins_lock:
+        _failed_logins.clear()
+
+
+async def _run_bcrypt(func, *args):
+    if _bcrypt_slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in attempts, try again shortly",
+            headers={"Retry-After": "1"}
+        )
+
+    async with _bcrypt_slots:
+        return await asyncio.get_running_loop().run_in_executor(_bcrypt_executor, func, *args)
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Hash a password in the bcrypt thread pool.
+    """
+    return await _run_bcrypt(hash_password, password)
+
+
+async def authenticate_admin_async(username: str, password: str) -> schemasAdminProfile | None:
+    """
+    Authenticate an admin by username and password without blocking the event loop.
+
+    Args:
+        username (str): The admin's username.
+        password (str): The plain password.
+
+    Returns:
+        schemasAdminProfile | None: The admin's profile, or None if the credentials are wrong.
+
+    Raises:
+        HTTPException: If too many verifications are already waiting for the thread pool.
+    """
+    digest = _login_digest(username, password)
+    if _recently_failed(digest):
+        return None
+
+    admin_check: dict = await async_admin_collection.find_one({"username": username})
+    if not admin_check:
+        _remember_failure(digest)
+        return None
+
+    if not await _run_bcrypt(verify_password, password, admin_check.get("hashed_password")):
+        _remember_failure(digest)
+        return None
+
+    return schemasAdminProfile(
+        username=admin_check.get("username", None),
+        role=admin_check.get("role", None)
+    )
+
+
 async def get_current_admin(token: Annotated[str, Depends(oauth2_scheme)]):
     """
     Authorize a user by validating a JWT token and extracting the username.
@@ -79,7 +186,7 @@ async def get_current_admin(token: Annotated[str, Depends(oauth2_scheme)]):
     )
 
     try:
-        payload: dict = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload: dict = decode_token(token)
         username: str = payload.get("username")
         role: str = payload.get("role")
         
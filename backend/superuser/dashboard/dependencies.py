@@ -1,16 +1,18 @@
 from typing import Collection
-from database_connection import fs
+from fastapi import Request
+from media.dependencies import stream_image
 from datetime import datetime, timedelta, tzinfo, timezone
-from io import BytesIO
-from bson import ObjectId
-from fastapi.responses import StreamingResponse
 from superuser.challenge.models import ChallengeModelResponse
 from superuser.clan.schemas import ClanProfile
 from superuser.dashboard.admin_auth import verify_password
-from superuser.dashboard.schemas import AdminProfile as schemasAdminProfile, LeaderboardData, LevelDataInfo, NewUserData, RecentActivityData
-from database_connection import user_collection, coin_stats, task_collection, rewards_collection, challenges_collection, clans_collection, levels_collection
+from superuser.dashboard.schemas import AdminProfile as schemasAdminProfile, LeaderboardData, LeaderboardDataPage, LevelDataInfo, NewUserData, RecentActivityData
+from database_connection import user_collection, coin_stats_daily, task_collection, rewards_collection, challenges_collection, clans_collection, levels_collection
 from superuser.level.models import LevelModelResponse
+from coin_engine import stats_day
+from superuser.leaderboard.schemas import LeaderboardType
+from leaderboard.dependencies import LEADERBOARD_PAGE_SIZE, get_leaderboard_page
 from superuser.reward.models import RewardsModelResponse
+from reward.counters import reward_claim_rate
 from superuser.task.schemas import TaskSchemaResponse
 from superuser.user_mgt.schemas import UserMgtDashboard
 
@@ -72,7 +74,7 @@ def retrieve_search_results(collection_name: Collection, results: list):
                 beneficiary=result["beneficiary"],
                 expiry_date=result["expiry_date"],
                 status=result["status"],
-                claim_rate=result["claim_rate"],
+                claim_rate=reward_claim_rate(result),
                 claim_count=result["claim_count"],
                 reward_image_id=str(result["reward_image_id"])
             )
@@ -272,24 +274,22 @@ def get_total_new_users() -> dict[str, int]:
 
 # ------------------------------------- get overall total coins -------------------------------------
 def get_overall_total_coins_earned() -> dict[str, int] | dict:
-    # get total coins earned today
-    today_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    print(today_date)
-
-    # today coins pipeline for aggregation
+    # get total coins earned today from today's coin stats buckets
     today_coins_pipeline = [
         {
+            "$match": {"day": stats_day()}
+        }, {
             "$group": {
-                "_id": None,  # Group all documents together
+                "_id": None,  # Group all of today's buckets together
                 "total_coins": {
-                    "$sum": f"$date.{today_date}"
+                    "$sum": "$coins"
                 }
             }
         }
     ]
 
     # Execute the aggregation pipeline
-    today_coins_result = coin_stats.aggregate(today_coins_pipeline)
+    today_coins_result = coin_stats_daily.aggregate(today_coins_pipeline)
 
     # Extract the total coins value from the aggregation result
     try:
@@ -369,38 +369,20 @@ def get_new_users() -> list:
 
 
 # ------------------------------------- get leaderboard ------------------------------------- 
-def get_users_leaderboard() -> list:
-    # aggregation to get leaderboard data
-    pipeline = [
-        {
-            '$sort': {
-                'total_coins': -1
-            }
-        }, {
-            '$project': {
-                'username': 1, 
-                'image_url': 1, 
-                'total_coins': 1, 
-                '_id': 0
-            }
-        }
-    ]
-
-    leaderboard_data_cursor = user_collection.aggregate(pipeline)
-
-    # extract data from pipeline result
-    leaderboard_data: list[LeaderboardData] = []
-
-    for data in leaderboard_data_cursor:
-        data = LeaderboardData(
-            username=data["username"],
-            image_url=data["image_url"],
-            total_coins=data["total_coins"]
+async def get_users_leaderboard(cursor: str | None = None, page_size: int = LEADERBOARD_PAGE_SIZE) -> LeaderboardDataPage:
+    # one keyset-paginated page of the all time leaderboard
+    page = await get_leaderboard_page(LeaderboardType.ALL_TIME, cursor, page_size)
+
+    leaderboard_data: list[LeaderboardData] = [
+        LeaderboardData(
+            username=row.username,
+            image_url=row.image_url,
+            total_coins=row.coins_earned
         )
+        for row in page.items
+    ]
 
-        leaderboard_data.append(data)
-    
-    return leaderboard_data
+    return LeaderboardDataPage(items=leaderboard_data, next_cursor=page.next_cursor)
 
 
 # ------------------------------------- get recent activity data for coins -------------------------------------
@@ -408,43 +390,13 @@ def recent_activity_data_for_coins() -> dict:
     # aggregation to get recent activity data: coins earned monthly
     pipeline_for_coins_activity = [
         {
-            '$project': {
-                'yearlyCoins': {
-                    '$map': {
-                        'input': {
-                            '$objectToArray': '$date'
-                        }, 
-                        'as': 'dateItem', 
-                        'in': {
-                            'year': {
-                                '$year': {
-                                    '$dateFromString': {
-                                        'dateString': '$$dateItem.k'
-                                    }
-                                }
-                            },
-                            'month': {
-                                '$month': {
-                                    '$dateFromString': {
-                                        'dateString': '$$dateItem.k'
-                                    }
-                                }
-                            },
-                            'coins': '$$dateItem.v'
-                        }
-                    }
-                }
-            }
-        }, {
-            '$unwind': '$yearlyCoins'
-        }, {
             '$group': {
                 '_id': {
-                    'year': '$yearlyCoins.year', 
-                    'month': '$yearlyCoins.month'
+                    'year': {'$year': '$day'}, 
+                    'month': {'$month': '$day'}
                 }, 
                 'totalCoins': {
-                    '$sum': '$yearlyCoins.coins'
+                    '$sum': '$coins'
                 }
             }
         }, {
@@ -460,7 +412,7 @@ def recent_activity_data_for_coins() -> dict:
         }
     ]
 
-    recent_activity_for_coins = coin_stats.aggregate(pipeline_for_coins_activity)
+    recent_activity_for_coins = coin_stats_daily.aggregate(pipeline_for_coins_activity)
 
     data: list[RecentActivityData] = []
     # sample data structure
@@ -588,8 +540,5 @@ def get_users_level_data() -> dict:
 
 
 # ------------------------------------- get image -------------------------------------
-def get_image(image_id: str):
-    image = fs.get(ObjectId(image_id))
-    image_buffer = BytesIO(image.read())
-    image_buffer.seek(0)
-    return StreamingResponse(image_buffer, media_type="image/jpeg")
+def get_image(image_id: str, request: Request | None = None):
+    return stream_image(image_id, request)
@@ -1,6 +1,6 @@
 from datetime import timedelta
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from superuser.dashboard.models import AdminProfile
 from superuser.dashboard.dependencies import (
@@ -15,12 +15,14 @@ from superuser.dashboard.dependencies import (
     get_image as get_image_func,
     search_through_app
 )
-from superuser.dashboard.admin_auth import authenticate_admin, get_current_admin, hash_password
+from leaderboard.dependencies import LEADERBOARD_MAX_PAGE_SIZE, LEADERBOARD_PAGE_SIZE
+from superuser.dashboard.admin_auth import authenticate_admin_async, forget_failed_logins, get_current_admin, hash_password_async
 from superuser.dashboard.schemas import (
     AddAdmin
 )
 from user_reg_and_prof_mngmnt.schemas import Token
 from user_reg_and_prof_mngmnt.user_authentication import create_access_token
+from user_reg_and_prof_mngmnt.token_cache import token_cache_stats
 from database_connection import admin_collection
 
 
@@ -41,7 +43,7 @@ async def add_admin(admin: AddAdmin):
             detail="Admin already exists"
         )
     
-    hashed_password = hash_password(admin.password)
+    hashed_password = await hash_password_async(admin.password)
     new_admin = AdminProfile(
         username=admin.username,
         hashed_password=hashed_password,
@@ -49,6 +51,7 @@ async def add_admin(admin: AddAdmin):
     )
 
     admin_collection.insert_one(new_admin.model_dump())
+    forget_failed_logins()
     return {
         "message": "Admin added successfully"
     }
@@ -56,7 +59,7 @@ async def add_admin(admin: AddAdmin):
 
 @adminDashboard.post("/signin", deprecated=True)
 async def sign_in(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
-    admin = authenticate_admin(form_data.username, form_data.password)
+    admin = await authenticate_admin_async(form_data.username, form_data.password)
 
     if not admin:
         raise HTTPException(
@@ -129,8 +132,11 @@ async def new_users():
 
 # ------------------------------------- get users leaderboard -------------------------------------
 @adminDashboard.get("/leaderboard")
-async def leaderboard():
-    leaderboard_data = get_users_leaderboard()
+async def leaderboard(
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    page_size: int = Query(LEADERBOARD_PAGE_SIZE, ge=1, le=LEADERBOARD_MAX_PAGE_SIZE, description="Page size")
+):
+    leaderboard_data = await get_users_leaderboard(cursor, page_size)
 
     return leaderboard_data
 
@@ -161,6 +167,11 @@ async def levels_data():
 
 # ------------------------------------- get images -------------------------------------
 @adminDashboard.get("/images/image")
-async def get_image(image_id: str):
+async def get_image(image_id: str, request: Request):
     
-    return get_image_func(image_id)
\ No newline at end of file
+    return get_image_func(image_id, request)
+
+# ------------------------------------- get auth token cache metrics -------------------------------------
+@adminDashboard.get("/auth/token_cache")
+async def token_cache_metrics():
+    return token_cache_stats()
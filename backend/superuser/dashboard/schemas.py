@@ -33,6 +33,10 @@ class LeaderboardData(BaseModel):
     image_url: str
     total_coins: int
 
+class LeaderboardDataPage(BaseModel):
+    items: list[LeaderboardData]
+    next_cursor: str | None = None
+
 class RecentActivityData(BaseModel):
     year: int
     data: dict[int, int]
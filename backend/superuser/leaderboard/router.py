@@ -1,7 +1,8 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from superuser.dashboard.admin_auth import get_current_admin
-from superuser.leaderboard.dependencies import all_time_leaderboard, daily_leaderboard, leaderboard_date_filter, leaderboard_profile, monthly_leaderboard, weekly_leaderboard
+from superuser.leaderboard.dependencies import leaderboard_date_filter, leaderboard_profile
+from leaderboard.dependencies import LEADERBOARD_MAX_PAGE_SIZE, LEADERBOARD_PAGE_SIZE, get_leaderboard_page
 from superuser.leaderboard.schemas import LeaderboardType
 
 
@@ -14,18 +15,12 @@ adminLeaderboard = APIRouter(
 
 # ------------------------------------- get leaderboard ------------------------------------- #
 @adminLeaderboard.get("/")
-async def leaderboard(category: LeaderboardType):
-    if category == LeaderboardType.ALL_TIME:
-        leaderboard = all_time_leaderboard()
-    
-    if category == LeaderboardType.DAILY:
-        leaderboard = daily_leaderboard()
-    
-    if category == LeaderboardType.WEEKLY:
-        leaderboard = weekly_leaderboard()
-    
-    if category == LeaderboardType.MONTHLY:
-        leaderboard = monthly_leaderboard() 
+async def leaderboard(
+    category: LeaderboardType,
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    page_size: int = Query(LEADERBOARD_PAGE_SIZE, ge=1, le=LEADERBOARD_MAX_PAGE_SIZE, description="Page size")
+):
+    leaderboard = await get_leaderboard_page(category, cursor, page_size)
     
     return leaderboard
 
@@ -33,10 +28,10 @@ async def leaderboard(category: LeaderboardType):
 # ------------------------------------- filter leaderboard by date ------------------------------------- #
 @adminLeaderboard.get("/filter")
 async def leaderboard(date_filter: datetime):
-    return leaderboard_date_filter(date_filter)
+    return await leaderboard_date_filter(date_filter)
 
 
 # ------------------------------------- LEADERBOARD PROFILE ------------------------------------- #
 @adminLeaderboard.get("/leaderboard_profile")
 async def overall_achievement(telegram_user_id: str):
-    return leaderboard_profile(telegram_user_id)
+    return await leaderboard_profile(telegram_user_id)
@@ -41,6 +41,11 @@ class LeaderBoard(BaseModel):
     clan: str | None
     longest_streak: int
 
+class LeaderboardPage(BaseModel):
+    items: list[LeaderBoard]
+    next_cursor: str | None = None
+    me: LeaderBoard | None = None
+
 class LeaderBoardUserProfile(BaseModel):
     username: str
     level: int
@@ -2,7 +2,17 @@ from bson import ObjectId
 from fastapi import HTTPException
 from superuser.level.models import LevelModel, LevelModelResponse
 from superuser.level.schemas import CreateLevel
-from database_connection import levels_collection, fs
+from database_connection import levels_collection
+from media.dependencies import delete_image, store_image
+from pymongo import IndexModel
+from indexes import register_indexes
+
+
+register_indexes(
+    "levels",
+    IndexModel([("level", 1)], unique=True),
+    IndexModel([("name", 1)], unique=True)
+)
 
 
 # ------------------------------ VERIFY BADGE ------------------------------ #
@@ -43,7 +53,7 @@ def verify_new_level(level: CreateLevel):
 
 # ---------------------------------- CREATE LEVEL ------------------------------ #
 def create_level(level: CreateLevel, badge: bytes, badge_name: str):
-    badge_id = fs.put(badge, filename="badge_" + badge_name)
+    badge_id = store_image(badge, "badge_" + badge_name)
 
     # insert new level
     new_level = LevelModel(
@@ -84,7 +94,7 @@ def delete_level(level_id: str):
         raise HTTPException(status_code=400, detail="Level not found.")
     
     badge_id = level["badge_id"]
-    fs.delete(ObjectId(badge_id))
+    delete_image(badge_id)
     deleted_level = levels_collection.delete_one({"_id": ObjectId(level_id)})
 
     if not deleted_level.acknowledged:
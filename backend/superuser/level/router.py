@@ -1,6 +1,8 @@
+import asyncio
 from io import BytesIO
 from fastapi import APIRouter, Depends, HTTPException
 from superuser.dashboard.admin_auth import get_current_admin
+from database_connection import invalidate_cache_tags_async
 from superuser.level.dependencies import verify_badge
 from superuser.level.schemas import CreateLevel
 from superuser.level.dependencies import (
@@ -30,7 +32,8 @@ async def create_level(level: CreateLevel = Depends(CreateLevel)):
     verify_badge(badge_format)
     verify_new_level(level)
         
-    created_level = create_level_func(level, badge_bytes, badge_filename)
+    created_level = await asyncio.to_thread(create_level_func, level, badge_bytes, badge_filename)
+    await invalidate_cache_tags_async("levels")
 
     return created_level
 
@@ -47,6 +50,7 @@ async def get_levels():
 async def delete_level(level_id: str):
 
     deleted = delete_level_func(level_id)
+    await invalidate_cache_tags_async("levels")
 
     if deleted:
         return {
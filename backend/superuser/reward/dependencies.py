@@ -1,12 +1,20 @@
 from datetime import datetime, timedelta, timezone
 from io import BytesIO
 from bson import ObjectId
-from fastapi import HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import HTTPException, Request
 from superuser.reward.models import RewardsModel, RewardsModelResponse
 from superuser.reward.schemas import CreateReward, UpdateReward, Status
-from database_connection import rewards_collection, fs, user_collection, clans_collection
+from database_connection import rewards_collection, user_collection, clans_collection
+from media.dependencies import delete_image, store_image, stream_image
+from reward.counters import reward_claim_rate
 from dependencies import user_levels
+from pymongo import IndexModel
+from indexes import register_indexes
+from config import get_settings
+from scheduler import register_job
+
+
+register_indexes("rewards", IndexModel([("launch_date", 1)]), IndexModel([("status", 1), ("expiry_date", 1)]))
 
 
 # ------------------------------- VERIFY BENEFICIARIES ------------------------------ #
@@ -84,7 +92,7 @@ def set_datetime_to_utc(date_time: datetime):
 
 # ------------------------------- CREATE REWARD ------------------------------ #
 def create_reward(reward: CreateReward, reward_image: bytes, image_name: str):
-    image_id = fs.put(reward_image, filename="reward_" + image_name)
+    image_id = store_image(reward_image, "reward_" + image_name)
 
     today = datetime.now(timezone.utc)
     expiry_date = reward.expiry_date
@@ -131,11 +139,8 @@ def create_reward(reward: CreateReward, reward_image: bytes, image_name: str):
     )
 
 
-def get_reward_image(image_id: str):
-    reward_image = fs.get(ObjectId(image_id))
-    image_buffer = BytesIO(reward_image.read())
-    image_buffer.seek(0)
-    return StreamingResponse(image_buffer, media_type="image/jpeg")
+def get_reward_image(image_id: str, request: Request | None = None):
+    return stream_image(image_id, request)
 
 
 def update_reward(reward: UpdateReward, reward_image: bytes, img_name: str, reward_id: str):
@@ -147,11 +152,11 @@ def update_reward(reward: UpdateReward, reward_image: bytes, img_name: str, rewa
     if not reward_data:
         raise HTTPException("Reward not found.")
 
-    # delete old image and insert updated image
-    old_img_id = reward_data["reward_image_id"]
-    fs.delete(ObjectId(old_img_id))
+    # insert updated image and release the old one, an unchanged image is kept as is
+    new_img_id = store_image(reward_image, img_name)
 
-    new_img_id = fs.put(reward_image, filename=img_name)
+    old_img_id = reward_data["reward_image_id"]
+    delete_image(old_img_id)
 
     update_operation = {
         "$set": {
@@ -179,7 +184,7 @@ def update_reward(reward: UpdateReward, reward_image: bytes, img_name: str, rewa
         beneficiary=reward.beneficiary,
         expiry_date=reward.expiry_date,
         status=reward_data["status"],
-        claim_rate=f"{reward_data['claim_rate']}%",
+        claim_rate=f"{reward_claim_rate(reward_data)}%",
         reward_image_id=str(new_img_id)
     )
 
@@ -193,7 +198,7 @@ def delete_reward(reward_id: str):
     
     # delete reward image
     image_id = reward["reward_image_id"]
-    fs.delete(ObjectId(image_id))
+    delete_image(image_id)
 
     # delete reward
     deleted = rewards_collection.delete_one({"_id": ObjectId(reward_id)})
@@ -231,10 +236,6 @@ def get_rewards():
         raise Exception("No rewards found.")
     
     for reward in rewards:
-        impression = reward["impression_count"]
-        claim_count = reward["claim_count"]
-        claim_rate = ((claim_count / impression) * 100) if impression > 0 else 0.0
-        rewards_collection.update_one({"_id": reward["_id"]}, {"$set": {"claim_rate": round(claim_rate, 1)}})
         yield RewardsModelResponse(
             id=str(reward["_id"]),
             reward_title=reward["reward_title"],
@@ -242,7 +243,7 @@ def get_rewards():
             beneficiary=reward["beneficiary"],  
             expiry_date=reward["expiry_date"],
             status=reward["status"],
-            claim_rate=f"{reward['claim_rate']}%",
+            claim_rate=f"{reward_claim_rate(reward)}%",
             claim_count=reward["claim_count"],
             reward_image_id=str(reward["reward_image_id"])
         )
@@ -266,7 +267,7 @@ def get_rewards_by_status(status: str):
                 beneficiary=reward["beneficiary"],
                 expiry_date=reward["expiry_date"],
                 status=reward["status"],
-                claim_rate=f"{reward['claim_rate']}%",
+                claim_rate=f"{reward_claim_rate(reward)}%",
                 reward_image_id=str(reward["reward_image_id"])
             )
 
@@ -289,26 +290,33 @@ def get_rewards_by_date(date: datetime):
                 beneficiary=reward["beneficiary"],
                 expiry_date=reward["expiry_date"],
                 status=reward["status"],
-                claim_rate=f"{reward['claim_rate']}%",
+                claim_rate=f"{reward_claim_rate(reward)}%",
                 reward_image_id=reward["reward_image_id"]
             )
 
 
+def reward_expiry_cutoff() -> datetime:
+    """
+    Return the expiry date before which rewards are expired.
+
+    A reward expires at the start (UTC) of its expiry date, see `reward_remaining_time`.
+    """
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return today + timedelta(days=1)
+
+
 def update_status_of_expired_rewards():
-    on_going_rewards = rewards_collection.find({"status": "on_going"})
+    """
+    Mark every ongoing reward past its expiry date as expired.
+    """
+    expired = rewards_collection.update_many(
+        {"status": "on_going", "expiry_date": {"$lt": reward_expiry_cutoff()}},
+        {"$set": {"status": "expired"}}
+    )
+
+    if expired.modified_count:
+        print(f"expired rewards: {expired.modified_count}")
 
-    count = 0
-    for reward in on_going_rewards:
-        remaining_time = reward_remaining_time(reward)
-        
-        if remaining_time <= timedelta(days=0, hours=0, minutes=0, seconds=0, microseconds=0):
-            exp_check_update = {
-                "$set": {
-                    "status": "expired"
-                }
-            }
 
-            update = rewards_collection.update_one({"_id": ObjectId(reward['_id'])}, exp_check_update)
-            if update.modified_count > 0:
-                count += 1
-    print(f"expired rewards: {count}")
+register_job("expire_rewards", get_settings().expiry_sweep_interval, update_status_of_expired_rewards)
@@ -1,12 +1,12 @@
+import asyncio
 from datetime import datetime, timezone
 from io import BytesIO
 from fastapi import HTTPException
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from superuser.dashboard.admin_auth import get_current_admin
 from superuser.reward.dependencies import (
     create_reward as create_reward_func,
     set_datetime_to_utc,
-    update_status_of_expired_rewards,
     verify_beneficiaries,
     update_reward as update_reward_func,
     delete_reward as delete_reward_func,
@@ -25,7 +25,7 @@ rewardApp = APIRouter(
     prefix="/admin/reward",
     tags=["Admin Panel Reward"],
     # responses={404: {"description": "Not found"}},
-    dependencies=[Depends(get_current_admin), Depends(update_status_of_expired_rewards)]
+    dependencies=[Depends(get_current_admin)]
 )
 
 
@@ -76,15 +76,15 @@ async def create_reward(
     # set datetime timezone to UTC
     new_reward.expiry_date = set_datetime_to_utc(new_reward.expiry_date)
 
-    created_reward = create_reward_func(new_reward, image_bytes, image_filename)
+    created_reward = await asyncio.to_thread(create_reward_func, new_reward, image_bytes, image_filename)
 
     return created_reward
 
 
 # ------------------------------ REWARD IMAGE URL ------------------------------ #
 @rewardApp.get("/reward_image/{image_id}", status_code=201)
-async def get_reward_image(image_id: str):
-    image = get_reward_image_func(image_id)
+async def get_reward_image(image_id: str, request: Request):
+    image = get_reward_image_func(image_id, request)
 
     return image
 
@@ -111,7 +111,7 @@ async def update_reward(
     # set datetime timezone to UTC
     reward_update.expiry_date = set_datetime_to_utc(reward_update.expiry_date)
 
-    updated_reward = update_reward_func(reward_update, img_bytes, img_name, reward_id)
+    updated_reward = await asyncio.to_thread(update_reward_func, reward_update, img_bytes, img_name, reward_id)
 
     return updated_reward
 
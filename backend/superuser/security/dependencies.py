@@ -2,6 +2,7 @@ from datetime import datetime, timezone
 from fastapi import HTTPException, status
 from superuser.security.models import SuspendDetails
 from database_connection import user_collection
+from user_reg_and_prof_mngmnt.profile_cache import invalidate_profile
 
 
 # ---------------------------------- SUSPEND USER -------------------------------------- #
@@ -54,6 +55,8 @@ def suspend_user(user_id: str, end_date: datetime, reason: str = None):
                 }
             )
 
+            invalidate_profile(user_id)
+
             if not suspend_info.acknowledged:
                 update = user_collection.update_one(
                     {"telegram_user_id": user_id},
@@ -89,6 +92,8 @@ def resume_user(user_id: str):
     if release_suspend.modified_count == 0:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="User suspension release failed.")
 
+    invalidate_profile(user_id)
+
     return {
         "message": "User suspension has been successfully raised by admin"
     }
@@ -149,6 +154,7 @@ def ban_user(user_id: str):
             upsert=True
         )
 
+    invalidate_profile(user_id)
 
     if not update.acknowledged:
         raise HTTPException(status_code=400, detail="User ban failed.")
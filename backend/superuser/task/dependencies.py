@@ -9,7 +9,20 @@ from urlextract import URLExtract
 from fastapi import HTTPException, UploadFile
 from superuser.task.schemas import TaskSchema, TaskSchemaResponse, UpdateTask
 from superuser.task.models import Task, TaskModelResponse, TaskStatus, TaskType, UpdateTask as UpdateTaskModel
-from database_connection import task_collection, fs
+from config import get_settings
+from database_connection import invalidate_cache_tags, task_collection
+from media.dependencies import delete_image, store_image_async
+from pymongo import IndexModel
+from indexes import register_indexes
+from scheduler import register_job
+
+
+register_indexes(
+    "tasks",
+    IndexModel([("task_name", 1)]),
+    IndexModel([("task_status", 1), ("task_deadline", -1)]),
+    IndexModel([("task_deadline", -1)])
+)
 
 
 
@@ -42,7 +55,7 @@ async def validate_image(task_image: UploadFile):
     # convert image to bytes and add to fs
     image_bytes = await task_image.read()
 
-    inserted_id = fs.put(image_bytes, filename="task_" + image_name)
+    inserted_id = await store_image_async(image_bytes, "task_" + image_name)
 
     return str(inserted_id)
 
@@ -144,7 +157,7 @@ def create_task(task: TaskSchema):
         return response
     
     # delete inserted id
-    fs.delete(ObjectId(task.task_image_id))
+    delete_image(task.task_image_id)
 
     raise HTTPException(status_code=400, detail="Task creation failed.")
 
@@ -157,7 +170,7 @@ def update_task(task: UpdateTaskModel, task_id: str):
     if task_to_update and task.task_image_id != None:
         old_img_id = task_to_update["task_image_id"]
 
-        fs.delete(ObjectId(old_img_id))
+        delete_image(old_img_id)
 
     query_filter = {"_id": ObjectId(task_id)}
     update_operation_with_new_img = {
@@ -347,7 +360,7 @@ def delete_task(task_id: str) -> bool:
     # delete image
     task_img_id = task["task_image_id"]
     if task_img_id != None:
-        fs.delete(ObjectId(task_img_id))
+        delete_image(task_img_id)
 
     # delete task
     result = task_collection.delete_one({"_id": ObjectId(task_id)})
@@ -360,12 +373,17 @@ def delete_task(task_id: str) -> bool:
 
 # --------------------------------- UPDATE EXPIRED TASK STATUS ---------------------------------
 def update_status_of_expired_tasks():
-    tasks = task_collection.find({"task_deadline": {"$lt": datetime.now(timezone.utc)}})
+    """
+    Deactivate every task past its deadline.
+    """
+    expired = task_collection.update_many(
+        {"task_deadline": {"$lt": datetime.now(timezone.utc)}, "task_status": {"$ne": "inactive"}},
+        {"$set": {"task_status": "inactive"}}
+    )
 
-    for task in tasks:
-        task_collection.update_one(
-            {"_id": ObjectId(task["_id"])}, 
-            {
-                "$set": {"task_status": "inactive"}
-            }
-        )
\ No newline at end of file
+    if expired.modified_count:
+        print(f"expired tasks: {expired.modified_count}")
+        invalidate_cache_tags("tasks")
+
+
+register_job("expire_tasks", get_settings().expiry_sweep_interval, update_status_of_expired_tasks)
@@ -3,11 +3,11 @@ from typing import List
 from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from superuser.dashboard.admin_auth import get_current_admin
+from database_connection import invalidate_cache_tags_async
 from superuser.task.models import ExportFormat, TaskParticipants, TaskStatus, TaskType, UpdateTask as UpdateTaskModel
 from superuser.task.schemas import CreateTask, TaskSchema, TaskSchemaResponse, UpdateTask
 from superuser.task.dependencies import (
         extract_url_from_description,
-        update_status_of_expired_tasks,
         validate_image,
         create_task as create_task_func, 
         check_task_by_id, task_exists_in_db,
@@ -27,7 +27,7 @@ task_router = APIRouter(
     prefix="/admin/task",
     tags=["Admin Panel Task"],
     # responses={404: {"description": "Not found"}},
-    dependencies=[Depends(get_current_admin), Depends(update_status_of_expired_tasks)]
+    dependencies=[Depends(get_current_admin)]
 )
 
 # --------------------------------- CREATE TASK ---------------------------------
@@ -83,6 +83,7 @@ async def create_task(task: CreateTask = Depends(CreateTask)):
     )
 
     created_task = create_task_func(task)
+    await invalidate_cache_tags_async("tasks")
 
     return created_task
 
@@ -144,6 +145,7 @@ async def update_task(task_id: str, task: UpdateTask = Depends(UpdateTask)):
     )
 
     updated_task = update_task_func(task=task, task_id=task_id)
+    await invalidate_cache_tags_async("tasks")
 
 
     return updated_task
@@ -252,6 +254,7 @@ async def get_task_by_status(
 @task_router.delete("/delete_task")
 async def delete_task(task_id: str):
     deleted_task = delete_task_func(task_id)
+    await invalidate_cache_tags_async("tasks")
 
     if deleted_task:
         return {"message": "Task deleted successfully."}
@@ -1,8 +1,11 @@
 from bson import ObjectId
-from database_connection import user_collection, task_collection, coin_stats, invites_ref, clans_collection
+from database_connection import user_collection, task_collection, coin_stats, coin_stats_daily, invites_ref, clans_collection
 from clan.dependencies import next_potential_clan_leader, exit_clan
 from superuser.user_mgt.schemas import OverallAchievement, TodayAchievement, UserMgtDashboard, UserProfile
-from superuser.leaderboard.dependencies import all_time_achievement, daily_achievement
+from superuser.leaderboard.schemas import LeaderboardType
+from leaderboard.dependencies import format_rank, get_user_ranks, remove_users_from_leaderboards
+from user_hydration import invalidate_user_stubs
+from user_reg_and_prof_mngmnt.profile_cache import invalidate_profile
 
 # ------------------------------- ALL USERS --------------------------------
 def get_all_users():
@@ -65,17 +68,16 @@ def completed_tasks(telegram_user_id: str, user:dict) -> int:
 
 
 # --------------------------- USER PROFILE -------------------------------
-def get_user_profile(telegram_user_id: str):
+async def get_user_profile(telegram_user_id: str):
     user: dict = user_collection.find_one({"telegram_user_id": telegram_user_id})
     completedTasks = completed_tasks(telegram_user_id, user)
-    user_daily_achievement = daily_achievement(telegram_user_id)
-    user_overall_achievement = all_time_achievement(telegram_user_id)
+    ranks = await get_user_ranks(telegram_user_id, [LeaderboardType.DAILY, LeaderboardType.ALL_TIME])
 
     overall_achieveiment = OverallAchievement(
         total_coins=user["total_coins"],
         completed_tasks=completedTasks,
         longest_streak=user["streak"]["longest_streak"],
-        rank=user_overall_achievement["rank"],
+        rank=format_rank(ranks[LeaderboardType.ALL_TIME]["rank"]),
         invitees=len(user["invite"])
     )
 
@@ -83,7 +85,7 @@ def get_user_profile(telegram_user_id: str):
         total_coins=user["total_coins"],
         completed_tasks=completedTasks,
         current_streak=user["streak"]["current_streak"],
-        rank=user_daily_achievement.get("rank", '0'),
+        rank=format_rank(ranks[LeaderboardType.DAILY]["rank"]),
         invitees=len(user["invite"])
     )
 
@@ -129,7 +131,8 @@ def delete_one_user(telegram_user_id: str):
             exit_clan(clan_id)
     
     # delete user coin references
-    deleted_coins = coin_stats.delete_one({"telegram_user_id": telegram_user_id})
+    deleted_coins = coin_stats_daily.delete_many({"telegram_user_id": telegram_user_id})
+    coin_stats.delete_one({"telegram_user_id": telegram_user_id})
 
     # invite handler:
     # delete_user_invitees_references
@@ -140,15 +143,22 @@ def delete_one_user(telegram_user_id: str):
 
     # delete user profile data
     deleted_user = user_collection.delete_one({"telegram_user_id": telegram_user_id})
+    remove_users_from_leaderboards([telegram_user_id])
+    invalidate_user_stubs([telegram_user_id])
+    invalidate_profile(telegram_user_id)
 
     return {"message": "User deleted successfully."}
 
 
 # --------------------------- DELETE MANY USERS ------------------------------- #
 def delete_many_users(telegram_user_ids: list[str]):
-    delete_coin_stats = coin_stats.delete_many({"telegram_user_id": {"$in": telegram_user_ids}})
+    delete_coin_stats = coin_stats_daily.delete_many({"telegram_user_id": {"$in": telegram_user_ids}})
+    coin_stats.delete_many({"telegram_user_id": {"$in": telegram_user_ids}})
     # delete_user_invites = invites_ref.delete_many({"telegram_user_id": {"$in": telegram_user_ids}})
     deleted_users = user_collection.delete_many({"telegram_user_id": {"$in": telegram_user_ids}})
+    remove_users_from_leaderboards(telegram_user_ids)
+    invalidate_user_stubs(telegram_user_ids)
+    invalidate_profile(*telegram_user_ids)
 
     if deleted_users.deleted_count > 0 and delete_coin_stats.deleted_count > 0:
         return {"message": "Users deleted successfully."}
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends
+from database_connection import invalidate_cache_tags_async
 from superuser.dashboard.admin_auth import get_current_admin
 from superuser.user_mgt.dependencies import (
     delete_many_users,
@@ -25,19 +26,23 @@ async def get_users():
 @userMgtApp.get("/user/{telegram_user_id}")
 async def get_user_profile(telegram_user_id: str):
 
-    return get_user_profile_func(telegram_user_id)
+    return await get_user_profile_func(telegram_user_id)
 
 
 # ---------------------------------- DELETE A USER -------------------------------- #
 @userMgtApp.delete("/delete/user/{telegram_user_id}")
 async def delete_user(telegram_user_id: str):
-    
-    return delete_one_user(telegram_user_id)
+    response = delete_one_user(telegram_user_id)
+    # a deleted member leaves their clan
+    await invalidate_cache_tags_async("clans")
+
+    return response
 
 
 # --------------------------------------- DELETE MANY USERS --------------------------------------- #
 @userMgtApp.delete("/delete/users")
 async def delete_users(user_ids: list[str] | None = None):
+    response = delete_many_users(telegram_user_ids=user_ids)
+    await invalidate_cache_tags_async("clans")
 
-    
-    return delete_many_users(telegram_user_ids=user_ids)
\ No newline at end of file
+    return response
\ No newline at end of file
@@ -0,0 +1,590 @@
+import asyncio
+import fcntl
+import os
+import time
+from datetime import date
+from uuid import uuid4
+from redis.exceptions import RedisError, ResponseError
+from pymongo import UpdateOne
+from coin_engine import daily_stats_filter, level_stages, register_credit_listener, stats_today, USER_COIN_PROJECTION
+from config import get_settings
+from database_connection import (
+    async_user_collection, async_coin_stats_daily, get_async_redis_client, get_sync_redis_client, report_redis_failure
+)
+from dependencies import get_user_current_level
+from leaderboard.dependencies import mark_leaderboards_stale, record_coins_batch_async
+from scheduler import register_job
+from user_reg_and_prof_mngmnt.profile_cache import invalidate_profile_async
+
+
+# ------------------------------ WRITE-BEHIND TAP BUFFER ------------------------------ #
+# Taps are accumulated per user and per day, either in redis (shared by every worker)
+# or in an in-process buffer backed by an append-only journal. A background flusher
+# periodically coalesces them into one bulk_write against users and one against the daily coin stats.
+#
+# Every flush is tagged with a batch id that is recorded on the documents it touches,
+# so replaying a batch after a crash never counts the same taps twice.
+
+PENDING_KEY = "tap_buffer:pending"
+FLUSHING_KEY_PREFIX = "tap_buffer:flushing:"
+USER_STATE_KEY_PREFIX = "tap_buffer:user:"
+USER_STATE_TTL = 300            # seconds a user's buffered state is kept after their last tap
+TAP_BATCH_HISTORY = 64          # batch ids remembered per document for replay protection
+
+# record a tap if the user's state is cached, returns None otherwise
+_TAP_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+redis.call('HINCRBY', KEYS[2], ARGV[1], ARGV[2])
+redis.call('HINCRBY', KEYS[1], 'buffered', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {redis.call('HMGET', KEYS[1], 'base', 'buffered', 'level', 'level_name'), redis.call('HLEN', KEYS[2])}
+"""
+
+# seed a user's state from the database unless another request already did
+_SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], 'base', ARGV[1], 'buffered', 0, 'level', ARGV[2], 'level_name', ARGV[3])
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+return 1
+"""
+
+# release a flushed batch: move its coins from 'buffered' to the persisted 'base'
+_FINISH_SCRIPT = """
+for i = 2, #ARGV, 5 do
+    local key = ARGV[1] .. ARGV[i]
+    if redis.call('EXISTS', key) == 1 then
+        local buffered = redis.call('HINCRBY', key, 'buffered', -tonumber(ARGV[i + 1]))
+        if buffered < 0 then
+            redis.call('HSET', key, 'buffered', 0)
+        end
+        redis.call('HSET', key, 'base', ARGV[i + 2], 'level', ARGV[i + 3], 'level_name', ARGV[i + 4])
+    end
+end
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+# move a user's persisted 'base' along with a credit made outside the buffer, if their state is cached
+_CREDIT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBY', KEYS[1], 'base', ARGV[1])
+    if ARGV[2] ~= '' and tonumber(ARGV[2]) > tonumber(redis.call('HGET', KEYS[1], 'level') or 0) then
+        redis.call('HSET', KEYS[1], 'level', ARGV[2], 'level_name', ARGV[3])
+    end
+end
+return 1
+"""
+
+_flusher_task: asyncio.Task | None = None
+_flush_event: asyncio.Event | None = None
+
+# in-process fallback
+_pending: dict[str, int] = {}
+_unflushed: list[tuple] = []
+_user_state: dict[str, dict] = {}
+_journal = None
+
+
+def tap_buffer_enabled() -> bool:
+    return get_settings().tap_buffer_enabled
+
+
+# ------------------------------ BATCH APPLICATION ------------------------------ #
+def _guarded_increment(batch_id: str, increments: dict[str, int]) -> list[dict]:
+    """
+    Build an update pipeline that applies the increments once per batch id.
+
+    Args:
+        batch_id (str): The id of the batch being applied.
+        increments (dict[str, int]): The field paths to increment and their amounts.
+
+    Returns:
+        list[dict]: The update pipeline.
+    """
+    batches = {"$ifNull": ["$tap_batches", []]}
+    applied = {"$in": [batch_id, batches]}
+
+    return [
+        {"$set": {
+            field: {
+                "$cond": [
+                    applied,
+                    {"$ifNull": [f"${field}", 0]},
+                    {"$add": [{"$ifNull": [f"${field}", 0]}, amount]}
+                ]
+            } for field, amount in increments.items()
+        }},
+        {"$set": {
+            "tap_batches": {
+                "$cond": [
+                    applied,
+                    batches,
+                    {"$slice": [{"$concatArrays": [batches, [batch_id]]}, -TAP_BATCH_HISTORY]}
+                ]
+            }
+        }}
+    ]
+
+
+async def apply_tap_batch(batch_id: str, entries: dict[str, int], replay: bool = False) -> dict[str, tuple]:
+    """
+    Write a batch of buffered taps to the database and the leaderboards.
+
+    Args:
+        batch_id (str): The id of the batch.
+        entries (dict[str, int]): Coins keyed by "<day>|<telegram_user_id>".
+        replay (bool): Whether the batch is being replayed after a crash, in which case it
+            may already be on the leaderboards and they are rebuilt instead.
+
+    Returns:
+        dict[str, tuple]: The persisted (total_coins, level, level_name) of every user in the batch.
+    """
+    per_user: dict[str, dict[str, int]] = {}
+    for field, coins in entries.items():
+        day, telegram_user_id = field.split("|", 1)
+        days = per_user.setdefault(telegram_user_id, {})
+        days[day] = days.get(day, 0) + int(coins)
+
+    if not per_user:
+        return {}
+
+    user_operations = []
+    stats_operations = []
+    for telegram_user_id, days in per_user.items():
+        query = {"telegram_user_id": telegram_user_id}
+        user_operations.append(
+            UpdateOne(query, _guarded_increment(batch_id, {"total_coins": sum(days.values())}) + level_stages())
+        )
+        stats_operations.extend(
+            UpdateOne(daily_stats_filter(telegram_user_id, day), _guarded_increment(batch_id, {"coins": coins}), upsert=True)
+            for day, coins in days.items()
+        )
+
+    await async_user_collection.bulk_write(user_operations, ordered=False)
+    await async_coin_stats_daily.bulk_write(stats_operations, ordered=False)
+    await invalidate_profile_async(*per_user)
+
+    users = async_user_collection.find({"telegram_user_id": {"$in": list(per_user)}}, USER_COIN_PROJECTION)
+    persisted = {
+        user["telegram_user_id"]: (user.get("total_coins", 0), user.get("level", 1), user.get("level_name", "Novice"))
+        async for user in users
+    }
+
+    if replay:
+        mark_leaderboards_stale()
+    else:
+        await record_coins_batch_async([
+            (telegram_user_id, coins, date.fromisoformat(day))
+            for telegram_user_id, days in per_user.items()
+            for day, coins in days.items()
+        ])
+
+    print(f"Tap buffer: flushed batch {batch_id} ({len(entries)} entries, {len(per_user)} users)")
+    return persisted
+
+
+def _user_totals(entries: dict[str, int]) -> dict[str, int]:
+    totals: dict[str, int] = {}
+    for field, coins in entries.items():
+        telegram_user_id = field.split("|", 1)[1]
+        totals[telegram_user_id] = totals.get(telegram_user_id, 0) + int(coins)
+    return totals
+
+
+def _new_batch_id() -> str:
+    return f"{int(time.time() * 1000)}-{uuid4().hex[:8]}"
+
+
+def _stale_after() -> float:
+    return max(30.0, get_settings().tap_buffer_flush_interval * 10)
+
+
+# ------------------------------ REDIS BUFFER ------------------------------ #
+async def _seed_user_state(redis_client, telegram_user_id: str):
+    user = await async_user_collection.find_one({"telegram_user_id": telegram_user_id}, USER_COIN_PROJECTION)
+    if not user:
+        return False
+
+    await redis_client.eval(
+        _SEED_SCRIPT, 1, USER_STATE_KEY_PREFIX + telegram_user_id,
+        user.get("total_coins", 0), user.get("level", 1), user.get("level_name", "Novice"), USER_STATE_TTL
+    )
+    return True
+
+
+async def _buffer_taps_redis(redis_client, telegram_user_id: str, coins: int, day: str):
+    state_key = USER_STATE_KEY_PREFIX + telegram_user_id
+    field = f"{day}|{telegram_user_id}"
+
+    result = await redis_client.eval(_TAP_SCRIPT, 2, state_key, PENDING_KEY, field, coins, USER_STATE_TTL)
+    if result is None:
+        if not await _seed_user_state(redis_client, telegram_user_id):
+            return None
+        result = await redis_client.eval(_TAP_SCRIPT, 2, state_key, PENDING_KEY, field, coins, USER_STATE_TTL)
+
+    (base, buffered, level, level_name), pending_size = result
+    total_coins = int(base) + int(buffered)
+    new_level, new_level_name = get_user_current_level(total_coins, int(level), level_name)
+
+    if new_level != int(level):
+        await redis_client.hset(state_key, mapping={"level": new_level, "level_name": new_level_name})
+
+    return total_coins, new_level, new_level_name, pending_size
+
+
+async def _flush_redis_batch(redis_client, flushing_key: str, replay: bool = False):
+    batch_id = flushing_key[len(FLUSHING_KEY_PREFIX):]
+    entries = await redis_client.hgetall(flushing_key)
+
+    persisted = await apply_tap_batch(batch_id, entries, replay)
+
+    args = [USER_STATE_KEY_PREFIX]
+    for telegram_user_id, coins in _user_totals(entries).items():
+        if telegram_user_id in persisted:
+            total_coins, level, level_name = persisted[telegram_user_id]
+            args.extend([telegram_user_id, coins, total_coins, level, level_name])
+
+    await redis_client.eval(_FINISH_SCRIPT, 1, flushing_key, *args)
+
+
+async def _flush_redis(redis_client):
+    # replay batches left behind by a worker that died mid-flush
+    async for flushing_key in redis_client.scan_iter(match=FLUSHING_KEY_PREFIX + "*"):
+        started_at = int(flushing_key[len(FLUSHING_KEY_PREFIX):].split("-", 1)[0]) / 1000
+        if time.time() - started_at > _stale_after():
+            print(f"Tap buffer: replaying orphaned batch {flushing_key}")
+            await _flush_redis_batch(redis_client, flushing_key, replay=True)
+
+    flushing_key = FLUSHING_KEY_PREFIX + _new_batch_id()
+    try:
+        await redis_client.rename(PENDING_KEY, flushing_key)
+    except ResponseError:
+        # nothing buffered (or another worker grabbed it first)
+        return
+
+    await _flush_redis_batch(redis_client, flushing_key)
+
+
+# ------------------------------ IN-PROCESS BUFFER ------------------------------ #
+def _journal_dir() -> str:
+    return get_settings().tap_buffer_journal_dir
+
+
+def _open_journal():
+    global _journal
+
+    path = os.path.join(_journal_dir(), f"taps-{uuid4().hex}.log")
+    _journal = open(path, "a")
+    fcntl.flock(_journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _read_journal(path: str) -> dict[str, int]:
+    entries: dict[str, int] = {}
+    with open(path) as journal:
+        for line in journal:
+            try:
+                day, telegram_user_id, coins = line.strip().split("|")
+                field = f"{day}|{telegram_user_id}"
+                entries[field] = entries.get(field, 0) + int(coins)
+            except ValueError:
+                # torn write from a crash
+                continue
+    return entries
+
+
+async def _replay_orphaned_journals():
+    """
+    Apply journals left behind by workers that are no longer running.
+
+    A journal is orphaned when no process holds its lock. Unflushed journals are
+    renamed to a batch file first so that a crash during replay stays idempotent.
+    """
+    for name in sorted(os.listdir(_journal_dir())):
+        path = os.path.join(_journal_dir(), name)
+        try:
+            handle = open(path)
+        except FileNotFoundError:
+            continue    # flushed or replayed by another worker since the listing
+
+        with handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue    # owned by a live worker
+
+            if not os.path.exists(path):
+                continue    # replayed by the worker that held the lock before us
+
+            if name.endswith(".log"):
+                batch_path = os.path.join(_journal_dir(), f"batch-{_new_batch_id()}.flushing")
+                os.rename(path, batch_path)
+                path, name = batch_path, os.path.basename(batch_path)
+
+            if name.endswith(".flushing"):
+                batch_id = name[len("batch-"):-len(".flushing")]
+                print(f"Tap buffer: replaying orphaned journal {name}")
+                await apply_tap_batch(batch_id, _read_journal(path), replay=True)
+                os.remove(path)
+
+
+async def replay_orphaned_journals():
+    """
+    Apply the journals of workers that died since this one started.
+    """
+    # the journal directory exists once the buffer has started
+    if tap_buffer_enabled() and _journal:
+        await _replay_orphaned_journals()
+
+
+# journals are local files, so every worker looks for orphans in its own journal directory
+register_job("replay_tap_journals", get_settings().tap_buffer_replay_interval, replay_orphaned_journals, exclusive=False)
+
+
+async def _buffer_taps_local(telegram_user_id: str, coins: int, day: str):
+    state = _user_state.get(telegram_user_id)
+    if not state or state["expires_at"] < time.monotonic():
+        user = await async_user_collection.find_one({"telegram_user_id": telegram_user_id}, USER_COIN_PROJECTION)
+        if not user:
+            return None
+
+        # another tap may have seeded the state while we were waiting
+        state = _user_state.get(telegram_user_id)
+        buffered = state["buffered"] if state else 0
+        state = {
+            "base": user.get("total_coins", 0),
+            "buffered": buffered,
+            "level": user.get("level", 1),
+            "level_name": user.get("level_name", "Novice"),
+        }
+        _user_state[telegram_user_id] = state
+
+    _journal.write(f"{day}|{telegram_user_id}|{coins}\n")
+    _journal.flush()
+
+    field = f"{day}|{telegram_user_id}"
+    _pending[field] = _pending.get(field, 0) + coins
+    state["buffered"] += coins
+    state["expires_at"] = time.monotonic() + USER_STATE_TTL
+
+    total_coins = state["base"] + state["buffered"]
+    state["level"], state["level_name"] = get_user_current_level(total_coins, state["level"], state["level_name"])
+
+    return total_coins, state["level"], state["level_name"], len(_pending)
+
+
+async def _apply_local_batch(batch_id: str, batch_path: str, journal, entries: dict[str, int]):
+    persisted = await apply_tap_batch(batch_id, entries)
+    # removed while still locked, so a concurrent replay never picks it up
+    os.remove(batch_path)
+    journal.close()
+
+    for telegram_user_id, coins in _user_totals(entries).items():
+        state = _user_state.get(telegram_user_id)
+        if state:
+            state["buffered"] = max(0, state["buffered"] - coins)
+            if telegram_user_id in persisted:
+                state["base"], state["level"], state["level_name"] = persisted[telegram_user_id]
+
+
+async def _flush_local():
+    global _pending
+
+    # retry batches whose earlier flush failed
+    while _unflushed:
+        await _apply_local_batch(*_unflushed[0])
+        _unflushed.pop(0)
+
+    if not _pending:
+        return
+
+    entries, _pending = _pending, {}
+    batch_id = _new_batch_id()
+    batch_path = os.path.join(_journal_dir(), f"batch-{batch_id}.flushing")
+
+    # the lock travels with the renamed file, so other workers won't replay it
+    journal = _journal
+    os.rename(journal.name, batch_path)
+    _open_journal()
+
+    _unflushed.append((batch_id, batch_path, journal, entries))
+    await _apply_local_batch(batch_id, batch_path, journal, entries)
+    _unflushed.pop()
+
+    # forget idle users
+    now = time.monotonic()
+    for telegram_user_id in [uid for uid, state in _user_state.items() if state["expires_at"] < now and not state["buffered"]]:
+        del _user_state[telegram_user_id]
+
+
+# ------------------------------ CREDITS OUTSIDE THE BUFFER ------------------------------ #
+# Rewards, streaks and other credits are written straight to the database, while the cached
+# state of a tapping user still holds the total read before them. Each credit moves that state
+# along, so the next buffered tap doesn't report a total that misses it.
+def _credit_args(coins: int, user: dict) -> tuple:
+    level = user.get("level")
+    return coins, level if level is not None else "", user.get("level_name") or ""
+
+
+def _credit_local_state(telegram_user_id: str, coins: int, user: dict):
+    state = _user_state.get(telegram_user_id)
+    if not state:
+        return
+
+    state["base"] += coins
+    if user.get("level") is not None and user["level"] > state["level"]:
+        state["level"], state["level_name"] = user["level"], user.get("level_name", state["level_name"])
+
+
+def _on_credit(telegram_user_id: str, coins: int, user: dict):
+    if not tap_buffer_enabled():
+        return
+
+    _credit_local_state(telegram_user_id, coins, user)
+
+    redis_client = get_sync_redis_client()
+    if redis_client:
+        try:
+            redis_client.eval(_CREDIT_SCRIPT, 1, USER_STATE_KEY_PREFIX + telegram_user_id, *_credit_args(coins, user))
+        except RedisError as e:
+            print(f"Tap buffer: error refreshing user state: {e}")
+            report_redis_failure(e)
+
+
+async def _on_credit_async(telegram_user_id: str, coins: int, user: dict):
+    if not tap_buffer_enabled():
+        return
+
+    _credit_local_state(telegram_user_id, coins, user)
+
+    redis_client = get_async_redis_client()
+    if redis_client:
+        try:
+            await redis_client.eval(_CREDIT_SCRIPT, 1, USER_STATE_KEY_PREFIX + telegram_user_id, *_credit_args(coins, user))
+        except RedisError as e:
+            print(f"Tap buffer: error refreshing user state: {e}")
+            report_redis_failure(e)
+
+
+register_credit_listener(_on_credit, _on_credit_async)
+
+
+# ------------------------------ PUBLIC API ------------------------------ #
+async def buffer_taps(telegram_user_id: str, coins: int):
+    """
+    Buffer tapped coins for a user and return their up-to-date state.
+
+    Args:
+        telegram_user_id (str): The telegram user ID of the user who tapped.
+        coins (int): The number of coins tapped.
+
+    Returns:
+        dict | None: The user's total coins, level and level name including
+        buffered taps, or None if the user does not exist.
+    """
+    day = str(stats_today())
+
+    redis_client = get_async_redis_client()
+    if redis_client:
+        try:
+            result = await _buffer_taps_redis(redis_client, telegram_user_id, coins, day)
+        except RedisError as e:
+            print(f"Tap buffer: redis unavailable, buffering in process: {e}")
+            report_redis_failure(e)
+            result = await _buffer_taps_local(telegram_user_id, coins, day)
+    else:
+        result = await _buffer_taps_local(telegram_user_id, coins, day)
+
+    if not result:
+        return None
+
+    total_coins, level, level_name, pending_size = result
+    if pending_size >= get_settings().tap_buffer_max_size:
+        _flush_event.set()
+
+    return {
+        "total_coins": total_coins,
+        "level": level,
+        "level_name": level_name
+    }
+
+
+async def flush_tap_buffer():
+    """
+    Flush every buffered tap to the database.
+    """
+    await _flush_local()
+
+    redis_client = get_async_redis_client()
+    if redis_client:
+        try:
+            await _flush_redis(redis_client)
+        except RedisError as e:
+            print(f"Tap buffer: error flushing redis buffer: {e}")
+            report_redis_failure(e)
+
+
+async def _flush_loop():
+    interval = get_settings().tap_buffer_flush_interval
+
+    while True:
+        try:
+            await asyncio.wait_for(_flush_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        _flush_event.clear()
+
+        try:
+            await flush_tap_buffer()
+        except Exception as e:
+            print(f"Tap buffer: flush failed, will retry: {e}")
+
+
+async def start_tap_buffer():
+    """
+    Replay anything left over from a crash and start the flusher.
+
+    Taps go to redis through the shared pool while it is available and to the
+    in-process buffer otherwise.
+    """
+    global _flusher_task, _flush_event
+
+    if not tap_buffer_enabled():
+        return
+
+    os.makedirs(_journal_dir(), exist_ok=True)
+    await _replay_orphaned_journals()
+    _open_journal()
+
+    _flush_event = asyncio.Event()
+    _flusher_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_tap_buffer():
+    """
+    Stop the flusher and write out whatever is still buffered.
+    """
+    global _flusher_task, _journal
+
+    if not _flusher_task:
+        return
+
+    _flusher_task.cancel()
+    try:
+        await _flusher_task
+    except asyncio.CancelledError:
+        pass
+    _flusher_task = None
+
+    try:
+        await flush_tap_buffer()
+    except Exception as e:
+        print(f"Tap buffer: final flush failed, journal kept for replay: {e}")
+
+    if _journal:
+        _journal.close()
+        if not _pending and not _unflushed:
+            os.remove(_journal.name)
+        _journal = None
@@ -0,0 +1,65 @@
+# ------------------------------ AUDIENCE TARGETING ------------------------------ #
+# Rewards, tasks and challenges list their audience in an array of keys: "all_users", user ids
+# and usernames, level names and clan ids or names. Instead of loading every document and
+# checking its audience in python, a user's own keys are matched with one $in query over a
+# multikey index on that array, next to the status and expiry predicates of the caller.
+
+ALL_USERS = "all_users"
+
+# the user fields audience keys are built from
+AUDIENCE_PROJECTION = {
+    "_id": 0,
+    "telegram_user_id": 1,
+    "username": 1,
+    "level": 1,
+    "level_name": 1,
+    "clan": 1
+}
+
+
+def audience_keys(user: dict) -> list[str | int]:
+    """
+    Return every audience key that targets a user.
+
+    Levels may be stored as numbers or as strings, so both are matched. Level names are
+    entered by admins, so they are matched as stored, in lower case and capitalized.
+
+    Args:
+        user (dict): The user, with at least the fields of AUDIENCE_PROJECTION.
+
+    Returns:
+        list[str | int]: The user's audience keys, without duplicates.
+    """
+    level = user.get("level")
+    level_name = user.get("level_name") or ""
+    clan = user.get("clan") or {}
+
+    keys = [
+        ALL_USERS,
+        user.get("telegram_user_id"),
+        user.get("username"),
+        level,
+        str(level) if level is not None else None,
+        level_name,
+        level_name.lower(),
+        level_name.capitalize(),
+        clan.get("id"),
+        clan.get("name"),
+    ]
+
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+def targeting_query(user: dict, audience_field: str, **predicates) -> dict:
+    """
+    Build a query for the documents whose audience includes a user.
+
+    Args:
+        user (dict): The user, with at least the fields of AUDIENCE_PROJECTION.
+        audience_field (str): The array field holding the audience of each document.
+        **predicates: Further conditions of the query, such as status or expiry.
+
+    Returns:
+        dict: The query.
+    """
+    return {audience_field: {"$in": audience_keys(user)}, **predicates}
@@ -1,6 +1,12 @@
 from bson import ObjectId
 from database_connection import task_collection, user_collection
 from tasks.schemas import MyTasks
+from pymongo import IndexModel
+from indexes import register_indexes
+from targeting import AUDIENCE_PROJECTION, targeting_query
+
+
+register_indexes("tasks", IndexModel([("task_type", 1), ("task_status", 1), ("task_participants", 1), ("task_deadline", -1)]))
 
 
 # ------------------------------------------ GET USER ------------------------------------------
@@ -12,27 +18,29 @@ def get_user(telegram_user_id: str):
 
 # ------------------------------------------ GET MY TASKS BY TASK TYPE ------------------------------------------
 def my_tasks_by_type(telegram_user_id: str, task_type: str, skip: int = 0, limit: int = 10) -> list[MyTasks]:
-    user: dict = get_user(telegram_user_id=telegram_user_id)
-    current_level: str = user.get("level_name").lower()
+    user: dict = user_collection.find_one({"telegram_user_id": telegram_user_id}, AUDIENCE_PROJECTION)
+    if not user:
+        return []
 
-    tasks = task_collection.find({"task_type": task_type, "task_participants": {"$in": ["all_users", current_level]}}).sort('task_deadline', -1).skip(skip).limit(limit)
+    # active tasks targeting the user, filtered before paginating
+    query = targeting_query(user, "task_participants", task_type=task_type, task_status="active")
+    tasks = task_collection.find(query).sort('task_deadline', -1).skip(skip).limit(limit)
 
     my_tasks: list[MyTasks] = []
 
     for task in tasks:
-        if task["task_status"] == "active":
-            my_tasks.append(
-                MyTasks(
-                    task_id=str(task.get("_id", None)),
-                    task_name=task.get("task_name", None),
-                    task_reward=task.get("task_reward", None),
-                    task_image_id=task.get("task_image_id", None),
-                    task_description=task.get("task_description", None),
-                    task_url=task.get("task_url", None),
-                    task_participants=task.get("task_participants", None),
-                    task_deadline=task.get("task_deadline", None)
-                )
+        my_tasks.append(
+            MyTasks(
+                task_id=str(task.get("_id", None)),
+                task_name=task.get("task_name", None),
+                task_reward=task.get("task_reward", None),
+                task_image_id=task.get("task_image_id", None),
+                task_description=task.get("task_description", None),
+                task_url=task.get("task_url", None),
+                task_participants=task.get("task_participants", None),
+                task_deadline=task.get("task_deadline", None)
             )
+        )
 
     return my_tasks
 
@@ -1,7 +1,7 @@
 from typing import Annotated
 from fastapi import APIRouter, Depends, Query
 from fastapi.responses import RedirectResponse
-from superuser.task.dependencies import update_status_of_expired_tasks
+from database_connection import cached
 from superuser.task.models import TaskType
 from tasks.dependencies import (
         my_tasks_by_type,
@@ -15,12 +15,13 @@ from user_reg_and_prof_mngmnt.user_authentication import get_current_user
 taskApp = APIRouter(
     prefix="/user/tasks",
     tags=["User Tasks"],
-    dependencies=[Depends(get_current_user), Depends(update_status_of_expired_tasks)],
+    dependencies=[Depends(get_current_user)],
 )
 
 
 # ------------------------------------- GET MY TASKS BY TYPE -------------------------------------
 @taskApp.get("/my_tasks")
+@cached(ttl=60, tags=["tasks"], vary_on_user=True)
 async def my_tasks(
         task_type: TaskType, 
         telegram_user_id: Annotated[str, Depends(get_current_user)],
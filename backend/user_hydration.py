@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+from config import get_settings
+from database_connection import user_collection, async_user_collection
+
+
+# ------------------------------ BULK USER HYDRATION ------------------------------ #
+# Turns lists of telegram user ids into projected user stubs with one $in query per chunk
+# instead of one find_one per id. Stubs can be kept in a small in-process LRU for a few
+# seconds, for lists that are read far more often than the users in them change.
+
+HYDRATION_CHUNK_SIZE = 1000
+
+INVITEE_PROJECTION = {
+    "_id": 0,
+    "telegram_user_id": 1,
+    "username": 1,
+    "image_url": 1,
+    "level": 1,
+    "total_coins": 1,
+    "invites": {"$size": {"$ifNull": ["$invite", []]}}
+}
+
+
+class _UserStubCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._stubs: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, projection_key: str, telegram_user_ids: list[str]) -> dict[str, dict]:
+        now = time.monotonic()
+        found = {}
+
+        with self._lock:
+            for telegram_user_id in telegram_user_ids:
+                entry = self._stubs.get((projection_key, telegram_user_id))
+                if entry and entry[0] > now:
+                    self._stubs.move_to_end((projection_key, telegram_user_id))
+                    found[telegram_user_id] = entry[1]
+
+        return found
+
+    def set_many(self, projection_key: str, stubs: dict[str, dict]):
+        expires_at = time.monotonic() + self.ttl
+
+        with self._lock:
+            for telegram_user_id, stub in stubs.items():
+                self._stubs[(projection_key, telegram_user_id)] = (expires_at, stub)
+                self._stubs.move_to_end((projection_key, telegram_user_id))
+
+            while len(self._stubs) > self.max_size:
+                self._stubs.popitem(last=False)
+
+    def invalidate(self, telegram_user_ids: list[str]):
+        ids = set(telegram_user_ids)
+
+        with self._lock:
+            for key in [key for key in self._stubs if key[1] in ids]:
+                del self._stubs[key]
+
+
+_cache = _UserStubCache(get_settings().user_hydration_cache_size, get_settings().user_hydration_cache_ttl)
+
+
+def invalidate_user_stubs(telegram_user_ids: list[str]):
+    """
+    Drop cached stubs of users whose profile changed.
+    """
+    _cache.invalidate(telegram_user_ids)
+
+
+def _split(telegram_user_ids: list[str], projection: dict, cache: bool) -> tuple[str, dict[str, dict], list[str]]:
+    projection_key = repr(sorted(projection.items()))
+    found = _cache.get_many(projection_key, telegram_user_ids) if cache else {}
+    missing = list(dict.fromkeys(i for i in telegram_user_ids if i not in found))
+
+    return projection_key, found, missing
+
+
+def _ordered(telegram_user_ids: list[str], stubs: dict[str, dict]) -> list[dict]:
+    return [stubs[telegram_user_id] for telegram_user_id in telegram_user_ids if telegram_user_id in stubs]
+
+
+def hydrate_users(telegram_user_ids: list[str], projection: dict, cache: bool = False) -> list[dict]:
+    """
+    Fetch many users in as few queries as possible.
+
+    Args:
+        telegram_user_ids (list[str]): The telegram user IDs, in the order to return them.
+        projection (dict): The fields to return, must include telegram_user_id.
+        cache (bool): Whether stubs may be served from, and stored in, the in-process LRU.
+
+    Returns:
+        list[dict]: The projected users in the given order, users that do not exist are skipped.
+    """
+    projection_key, stubs, missing = _split(telegram_user_ids, projection, cache)
+
+    fetched = {}
+    for i in range(0, len(missing), HYDRATION_CHUNK_SIZE):
+        for user in user_collection.find({"telegram_user_id": {"$in": missing[i:i + HYDRATION_CHUNK_SIZE]}}, projection):
+            fetched[user["telegram_user_id"]] = user
+
+    if cache:
+        _cache.set_many(projection_key, fetched)
+
+    return _ordered(telegram_user_ids, {**stubs, **fetched})
+
+
+async def hydrate_users_async(telegram_user_ids: list[str], projection: dict, cache: bool = False) -> list[dict]:
+    """
+    Async variant of `hydrate_users` for async routes.
+    """
+    projection_key, stubs, missing = _split(telegram_user_ids, projection, cache)
+
+    fetched = {}
+    for i in range(0, len(missing), HYDRATION_CHUNK_SIZE):
+        async for user in async_user_collection.find({"telegram_user_id": {"$in": missing[i:i + HYDRATION_CHUNK_SIZE]}}, projection):
+            fetched[user["telegram_user_id"]] = user
+
+    if cache:
+        _cache.set_many(projection_key, fetched)
+
+    return _ordered(telegram_user_ids, {**stubs, **fetched})
@@ -4,6 +4,15 @@ from user_reg_and_prof_mngmnt.schemas import BasicProfile, Invites, SuspendedUse
 from user_reg_and_prof_mngmnt.models import UserProfile as UserProfileModel
 from database_connection import user_collection, invites_ref
 from config import get_settings
+from pymongo import IndexModel
+from indexes import register_indexes
+
+
+register_indexes(
+    "users",
+    IndexModel([("username", 1)]),
+    IndexModel([("created_at", -1)])
+)
 
 
 BOT_TOKEN = get_settings().bot_token
@@ -0,0 +1,162 @@
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from redis.exceptions import RedisError
+from config import get_settings
+from database_connection import (
+    get_async_redis_client, get_sync_redis_client, report_redis_failure,
+    invalidate_cache_tags, invalidate_cache_tags_async, user_cache_tag
+)
+from user_reg_and_prof_mngmnt.schemas import UserProfile
+
+
+# ------------------------------ PROFILE CACHE ------------------------------ #
+# Profiles are cached in redis as "<version>|<profile json>" and in a small in-process L1.
+# Every write to a user bumps the user's version counter, after the write, so a cached
+# profile is only served while its version is still the current one. A profile rebuilt
+# concurrently with a write is stored under the old version and never served.
+# While redis is unavailable profiles are read straight from the database, and a write
+# missed during an outage is only visible until its profile expires (profile_cache_ttl).
+# Invitees are not part of the cached profile: their coins and levels change with writes to
+# them, not to the inviter, so they are read on every request.
+
+PROFILE_KEY_PREFIX = "profile:"
+PROFILE_VERSION_KEY_PREFIX = "profile:version:"
+PROFILE_VERSION_TTL = 86400         # seconds, outlives any cached profile
+
+_l1: OrderedDict[str, tuple[int, UserProfile]] = OrderedDict()
+_l1_lock = threading.Lock()
+
+
+def _profile_key(telegram_user_id: str) -> str:
+    return f"{PROFILE_KEY_PREFIX}{telegram_user_id}"
+
+
+def _version_key(telegram_user_id: str) -> str:
+    return f"{PROFILE_VERSION_KEY_PREFIX}{telegram_user_id}"
+
+
+def _l1_get(telegram_user_id: str, version: int) -> UserProfile | None:
+    with _l1_lock:
+        entry = _l1.get(telegram_user_id)
+        if entry and entry[0] == version:
+            _l1.move_to_end(telegram_user_id)
+            return entry[1]
+    return None
+
+
+def _l1_set(telegram_user_id: str, version: int, profile: UserProfile):
+    with _l1_lock:
+        _l1[telegram_user_id] = (version, profile)
+        _l1.move_to_end(telegram_user_id)
+        while len(_l1) > get_settings().profile_cache_l1_size:
+            _l1.popitem(last=False)
+
+
+def _l1_drop(telegram_user_ids: tuple[str, ...]):
+    with _l1_lock:
+        for telegram_user_id in telegram_user_ids:
+            _l1.pop(telegram_user_id, None)
+
+
+async def get_cached_profile(
+        telegram_user_id: str,
+        loader: Callable[[], Awaitable[UserProfile | None]]
+    ) -> UserProfile | None:
+    """
+    Return a user's profile from the cache, building it with `loader` on a miss.
+
+    Args:
+        telegram_user_id (str): The telegram user ID of the user.
+        loader (Callable): Builds the profile from the database.
+
+    Returns:
+        UserProfile | None: The profile, or None if the user does not exist.
+    """
+    redis_client = get_async_redis_client()
+    if not redis_client:
+        return await loader()
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(_version_key(telegram_user_id))
+        pipe.get(_profile_key(telegram_user_id))
+        version, cached = await pipe.execute()
+        version = int(version or 0)
+
+        profile = _l1_get(telegram_user_id, version)
+        if profile:
+            return profile
+
+        if cached:
+            cached_version, _, payload = cached.partition("|")
+            if int(cached_version) == version:
+                profile = UserProfile.model_validate_json(payload)
+                _l1_set(telegram_user_id, version, profile)
+                return profile
+    except RedisError as e:
+        print(f"Error reading cached profile: {e}")
+        report_redis_failure(e)
+        return await loader()
+
+    profile = await loader()
+    if profile:
+        try:
+            await redis_client.set(
+                _profile_key(telegram_user_id),
+                f"{version}|{profile.model_dump_json()}",
+                ex=get_settings().profile_cache_ttl
+            )
+            _l1_set(telegram_user_id, version, profile)
+        except RedisError as e:
+            report_redis_failure(e)
+
+    return profile
+
+
+def _queue_invalidation(pipe, telegram_user_ids: tuple[str, ...]):
+    for telegram_user_id in telegram_user_ids:
+        pipe.incr(_version_key(telegram_user_id))
+        pipe.expire(_version_key(telegram_user_id), PROFILE_VERSION_TTL)
+
+
+def invalidate_profile(*telegram_user_ids: str):
+    """
+    Invalidate the cached profiles of users, to be called after every write to them.
+
+    Responses cached per user are invalidated along with the profile.
+    """
+    _l1_drop(telegram_user_ids)
+    invalidate_cache_tags(*[user_cache_tag(telegram_user_id) for telegram_user_id in telegram_user_ids])
+
+    redis_client = get_sync_redis_client()
+    if not redis_client or not telegram_user_ids:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_invalidation(pipe, telegram_user_ids)
+        pipe.execute()
+    except RedisError as e:
+        print(f"Error invalidating cached profile: {e}")
+        report_redis_failure(e)
+
+
+async def invalidate_profile_async(*telegram_user_ids: str):
+    """
+    Async variant of `invalidate_profile` for async routes.
+    """
+    _l1_drop(telegram_user_ids)
+    await invalidate_cache_tags_async(*[user_cache_tag(telegram_user_id) for telegram_user_id in telegram_user_ids])
+
+    redis_client = get_async_redis_client()
+    if not redis_client or not telegram_user_ids:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _queue_invalidation(pipe, telegram_user_ids)
+        await pipe.execute()
+    except RedisError as e:
+        print(f"Error invalidating cached profile: {e}")
+        report_redis_failure(e)
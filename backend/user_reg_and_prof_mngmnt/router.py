@@ -2,7 +2,7 @@ from datetime import timedelta
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from superuser.dashboard.admin_auth import authenticate_admin
+from superuser.dashboard.admin_auth import authenticate_admin_async
 from config import get_settings
 from database_connection import user_collection
 from user_reg_and_prof_mngmnt.dependencies import (
@@ -106,30 +106,28 @@ async def sign_in(
     Returns:
         Token: Access token with username and telegram_user_id data.
     """
+    # users sign in with their telegram id alone, only fall back to the admin check,
+    # and its bcrypt verification, when no user matches
     user = authenticate_user(form_data.password)
-    admin = authenticate_admin(form_data.username, form_data.password)
-    
-    if not user and not admin:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"}
-        )
-    user_access_token_expires = timedelta(hours=USER_ACCESS_TOKEN_EXPIRE_HOURS)
-    admin_access_token_expires = timedelta(hours=ADMIN_ACCESS_TOKEN_EXPIRE_HOURS)
-
     if user:
         access_token = create_access_token(
             data={
                 "username": user.username, "telegram_user_id": user.telegram_user_id
-            }, expires_delta=user_access_token_expires
+            }, expires_delta=timedelta(hours=USER_ACCESS_TOKEN_EXPIRE_HOURS)
         )
         return Token(access_token=access_token, token_type="bearer")
-    
-    if admin:
-        access_token = create_access_token(
-            data={
-                "username": admin.username, "role": admin.role
-            }, expires_delta=admin_access_token_expires
+
+    admin = await authenticate_admin_async(form_data.username, form_data.password)
+    if not admin:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"}
         )
-        return Token(access_token=access_token, token_type="bearer")
+
+    access_token = create_access_token(
+        data={
+            "username": admin.username, "role": admin.role
+        }, expires_delta=timedelta(hours=ADMIN_ACCESS_TOKEN_EXPIRE_HOURS)
+    )
+    return Token(access_token=access_token, token_type="bearer")
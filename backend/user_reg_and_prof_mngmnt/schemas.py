@@ -77,6 +77,7 @@ class UserProfile(
     ):
     streak: StreakData = Field(default_factory=StreakData)
     invite: list[InviteeData] | None = []
+    invite_count: int = 0
     clan: Clan = Field(default_factory=Clan)
 
 
@@ -0,0 +1,196 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, patch
+import clan.dependencies as clans
+import coin_engine
+import leaderboard.dependencies as leaderboards
+from coin_engine import add_daily_coins, stats_day
+from database_connection import clan_settlements, clans_collection, coin_stats_daily, user_collection
+from fakes import clear_databases, use_emulated_stages, use_fake_redis
+
+
+class ClanSettlementTestCase(unittest.TestCase):
+
+    def setUp(self):
+        clear_databases()
+        use_fake_redis(self)
+        use_emulated_stages(self)
+
+        patcher = patch.multiple(leaderboards, _leaderboards_stale=False, _stale_marks=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.previous_day = datetime.now(timezone.utc).date() - timedelta(days=1)
+        self.day = self.previous_day.strftime("%Y-%m-%d")
+        self.earning = self.add_clan("Earning", "active", 1000)
+        self.idle = self.add_clan("Idle", "active", 500)
+        self.disbanded = self.add_clan("Disbanded", "disbanded", 700)
+        self.earnings = {self.earning: 20, self.idle: 0}
+
+        # 0.1% of each member's coins of the previous day, truncated per member
+        for telegram_user_id, clan_id, previous_day_coins in [
+            ("1", self.earning, 10500),
+            ("2", self.earning, 10999),
+            ("3", self.idle, 999),
+            ("4", self.disbanded, 50000),
+            ("5", None, 50000),
+        ]:
+            user_collection.insert_one({
+                "telegram_user_id": telegram_user_id,
+                "total_coins": 100,
+                "level": 1,
+                "level_name": "Novice",
+                **({"clan": {"id": clan_id}} if clan_id else {})
+            })
+            add_daily_coins(telegram_user_id, previous_day_coins, self.previous_day)
+            add_daily_coins(telegram_user_id, 100)
+
+    def add_clan(self, name: str, status: str, total_coins: int) -> str:
+        return str(clans_collection.insert_one({"name": name, "status": status, "total_coins": total_coins}).inserted_id)
+
+    def checkpoint(self, stage: str):
+        clan_settlements.insert_one({"_id": self.day, "stage": stage, "earnings": self.earnings})
+
+    def coins(self) -> dict[str, int]:
+        return {user["telegram_user_id"]: user["total_coins"] for user in user_collection.find()}
+
+    def clans(self) -> dict[str, tuple]:
+        return {clan["name"]: (clan["total_coins"], clan.get("rank")) for clan in clans_collection.find()}
+
+    def daily_coins(self) -> dict[str, int]:
+        return {stats["telegram_user_id"]: stats["coins"] for stats in coin_stats_daily.find({"day": stats_day()})}
+
+    def stage(self) -> str:
+        return clan_settlements.find_one({"_id": self.day})["stage"]
+
+
+class TestSettlementPipelines(ClanSettlementTestCase):
+
+    def test_earnings_are_read_from_the_members_coins_of_the_previous_day(self):
+        lookup = clans.clan_earnings_pipeline([self.earning], self.previous_day)[1]["$lookup"]
+
+        self.assertEqual((lookup["localField"], lookup["foreignField"]), ("telegram_user_id", "telegram_user_id"))
+        self.assertEqual(lookup["pipeline"][0], {"$match": {"day": stats_day(self.previous_day)}})
+
+    def test_plan_covers_every_active_clan(self):
+        self.assertEqual(clans._plan_clan_earnings(self.previous_day, self.day), self.earnings)
+
+    def test_plan_skips_clans_already_settled(self):
+        clans_collection.update_one({"name": "Earning"}, {"$set": {"last_earn_date": self.day}})
+
+        self.assertEqual(clans._plan_clan_earnings(self.previous_day, self.day), {self.idle: 0})
+
+    def test_ranks_only_update_existing_clans(self):
+        merge = clans.clan_rank_pipeline()[-1]["$merge"]
+
+        self.assertEqual((merge["into"], merge["on"], merge["whenNotMatched"]), (clans_collection.name, "_id", "discard"))
+
+    def test_clans_are_ranked_by_total_coins(self):
+        clans._rank_clans()
+
+        self.assertEqual(self.clans(), {"Earning": (1000, 1), "Disbanded": (700, 2), "Idle": (500, 3)})
+        self.assertEqual(clans_collection.count_documents({}), 3)
+
+
+class TestSettlement(ClanSettlementTestCase):
+
+    def test_settlement_credits_clans_and_their_members(self):
+        clans.settle_clan_earnings()
+
+        self.assertEqual(self.coins(), {"1": 120, "2": 120, "3": 100, "4": 100, "5": 100})
+        self.assertEqual(self.daily_coins(), {"1": 120, "2": 120, "3": 100, "4": 100, "5": 100})
+        self.assertEqual(self.clans(), {"Earning": (1020, 1), "Disbanded": (700, 2), "Idle": (500, 3)})
+        self.assertEqual(self.stage(), "done")
+        self.assertFalse(leaderboards._leaderboards_stale)
+
+    def test_credited_members_are_reported_to_the_credit_listeners(self):
+        listener = Mock()
+
+        with patch.object(coin_engine, "_credit_listeners", [listener]):
+            clans.settle_clan_earnings()
+
+        credits = {call.args[0]: (call.args[1], call.args[2]["total_coins"]) for call in listener.call_args_list}
+        self.assertEqual(credits, {"1": (20, 120), "2": (20, 120)})
+
+    def test_settled_day_is_not_settled_again(self):
+        clans.settle_clan_earnings()
+
+        with patch.object(clans, "_rank_clans") as rank_clans:
+            clans.settle_clan_earnings()
+
+        self.assertEqual(self.coins(), {"1": 120, "2": 120, "3": 100, "4": 100, "5": 100})
+        self.assertEqual(self.clans()["Earning"], (1020, 1))
+        rank_clans.assert_not_called()
+
+    def test_day_planned_by_another_worker_is_left_to_it(self):
+        with patch.object(clans.clan_settlements, "insert_one", side_effect=clans.DuplicateKeyError("planned")):
+            clans.settle_clan_earnings()
+
+        self.assertEqual(self.coins(), {"1": 100, "2": 100, "3": 100, "4": 100, "5": 100})
+        self.assertEqual(self.clans()["Earning"], (1000, None))
+
+
+class TestResumedSettlement(ClanSettlementTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        # a resumed settlement applies its checkpoint, it never plans again
+        patcher = patch.object(clans, "_plan_clan_earnings", side_effect=AssertionError("planned again"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resume_from_planned_credits_what_is_left(self):
+        self.checkpoint("planned")
+        # a settlement that crashed after its first write
+        user_collection.update_one({"telegram_user_id": "1"}, {"$inc": {"total_coins": 20}, "$set": {"clan_earn_date": self.day}})
+
+        clans.settle_clan_earnings()
+
+        self.assertEqual(self.coins(), {"1": 120, "2": 120, "3": 100, "4": 100, "5": 100})
+        self.assertEqual(self.clans()["Earning"], (1020, 1))
+        self.assertEqual(self.stage(), "done")
+
+    def test_resume_from_planned_after_the_clans_were_credited(self):
+        self.checkpoint("planned")
+        for telegram_user_id in ("1", "2"):
+            user_collection.update_one({"telegram_user_id": telegram_user_id}, {"$inc": {"total_coins": 20}, "$set": {"clan_earn_date": self.day}})
+        coin_stats_daily.update_many(
+            {"telegram_user_id": {"$in": ["1", "2"]}, "day": stats_day()},
+            {"$inc": {"coins": 20}, "$set": {"clan_earn_date": self.day}}
+        )
+        clans_collection.update_one({"name": "Earning"}, {"$inc": {"total_coins": 20}, "$set": {"last_earn_date": self.day}})
+
+        clans.settle_clan_earnings()
+
+        self.assertEqual(self.coins(), {"1": 120, "2": 120, "3": 100, "4": 100, "5": 100})
+        self.assertEqual(self.daily_coins(), {"1": 120, "2": 120, "3": 100, "4": 100, "5": 100})
+        self.assertEqual(self.clans()["Earning"], (1020, 1))
+
+    def test_replayed_credits_mark_the_leaderboards_stale(self):
+        self.checkpoint("planned")
+
+        clans.settle_clan_earnings()
+
+        self.assertTrue(leaderboards._leaderboards_stale)
+
+    def test_resume_from_credited_only_ranks_the_clans(self):
+        self.checkpoint("credited")
+
+        clans.settle_clan_earnings()
+
+        self.assertEqual(self.coins(), {"1": 100, "2": 100, "3": 100, "4": 100, "5": 100})
+        self.assertEqual(self.clans(), {"Earning": (1000, 1), "Disbanded": (700, 2), "Idle": (500, 3)})
+        self.assertEqual(self.stage(), "done")
+
+    def test_done_settlement_is_not_resumed(self):
+        self.checkpoint("done")
+
+        clans.settle_clan_earnings()
+
+        self.assertEqual(self.coins(), {"1": 100, "2": 100, "3": 100, "4": 100, "5": 100})
+        self.assertEqual(self.clans()["Earning"], (1000, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from datetime import date, datetime, timezone
+from unittest.mock import patch
+import coin_engine
+from database_connection import coin_stats_daily, user_collection
+from fakes import clear_databases
+from superuser.dashboard.dependencies import get_overall_total_coins_earned
+
+
+class LateEvening(datetime):
+    """
+    23:30 UTC on new year's eve, already the next day on servers east of UTC.
+    """
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2026, 12, 31, 23, 30, tzinfo=timezone.utc).astimezone(tz)
+
+
+class TestLevelPipeline(unittest.TestCase):
+
+    def setUp(self):
+        clear_databases()
+
+    def credit(self, user: dict, coins: int, **kwargs) -> dict:
+        user_collection.insert_one({"telegram_user_id": "1", **user})
+        return coin_engine.credit_coins("1", coins, **kwargs)
+
+    def test_level_follows_the_thresholds(self):
+        for total_coins, level, level_name in [
+            (0, 1, "Novice"),
+            (4999, 1, "Novice"),
+            (5000, 2, "Explorer"),
+            (24999, 2, "Explorer"),
+            (25000, 3, "Apprentice"),
+            (1000000000, 10, "Legend"),
+        ]:
+            with self.subTest(total_coins=total_coins):
+                clear_databases()
+                user = self.credit({"total_coins": 0, "level": 1, "level_name": "Novice"}, total_coins)
+
+                self.assertEqual(user, {"telegram_user_id": "1", "total_coins": total_coins, "level": level, "level_name": level_name})
+
+    def test_credit_skips_levels(self):
+        user = self.credit({"total_coins": 4000, "level": 1, "level_name": "Novice"}, 100000)
+
+        self.assertEqual((user["level"], user["level_name"]), (4, "Warrior"))
+
+    def test_debit_never_drops_the_level(self):
+        user = self.credit({"total_coins": 30000, "level": 3, "level_name": "Apprentice"}, -29000)
+
+        self.assertEqual(user["total_coins"], 1000)
+        self.assertEqual((user["level"], user["level_name"]), (3, "Apprentice"))
+
+    def test_missing_fields_start_from_the_first_level(self):
+        user = self.credit({}, 10)
+
+        self.assertEqual(user, {"telegram_user_id": "1", "total_coins": 10, "level": 1, "level_name": "Novice"})
+
+    def test_extra_fields_are_set_in_the_same_write(self):
+        user = self.credit({"total_coins": 0}, 10, extra_set={"power_limit": 500, "note": "$not_a_field"}, projection={"_id": 0})
+
+        self.assertEqual(user["power_limit"], 500)
+        self.assertEqual(user["note"], "$not_a_field")
+
+    def test_extra_filter_that_does_not_match_credits_nothing(self):
+        user = self.credit({"total_coins": 0, "banned": True}, 10, extra_filter={"banned": False})
+
+        self.assertIsNone(user)
+        self.assertEqual(user_collection.find_one({"telegram_user_id": "1"})["total_coins"], 0)
+
+    def test_unknown_user_is_not_credited(self):
+        self.assertIsNone(coin_engine.credit_coins("404", 10))
+        self.assertEqual(user_collection.count_documents({}), 0)
+
+
+
+class TestStatsDay(unittest.TestCase):
+
+    def setUp(self):
+        clear_databases()
+
+        patcher = patch.object(coin_engine, "datetime", LateEvening)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_today_is_the_utc_day(self):
+        self.assertEqual(coin_engine.stats_today(), date(2026, 12, 31))
+        self.assertEqual(coin_engine.stats_day(), datetime(2026, 12, 31, tzinfo=timezone.utc))
+
+    def test_dashboard_reads_the_bucket_coins_are_added_to(self):
+        user_collection.insert_one({"telegram_user_id": "1", "total_coins": 1000})
+        coin_engine.add_daily_coins("1", 250)
+
+        self.assertEqual(coin_stats_daily.find_one()["day"], datetime(2026, 12, 31))
+        self.assertEqual(get_overall_total_coins_earned()["percentage_increase"], "25.0%")
+
+
+if __name__ == '__main__':
+    unittest.main()
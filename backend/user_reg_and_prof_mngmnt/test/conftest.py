@@ -0,0 +1,38 @@
+import os
+import sys
+
+
+# ------------------------------ TEST BOOTSTRAP ------------------------------ #
+# The app connects to mongo and reads its settings at import time, so before any app module is
+# imported the tests point it at mongomock and fill in the required settings. Redis is swapped
+# for fakeredis per test case, see fakes.py. The tests need pytest, mongomock, fakeredis and lupa
+# (for the Lua scripts) on top of requirements.txt. Run from the backend directory: python -m pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+TEST_SETTINGS = {
+    "MONGODB_CONNECTION_STRING": "mongodb://localhost",
+    "REDIS_PORT": "6379",
+    "SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "BOT_TOKEN": "1:test",
+}
+for name, value in TEST_SETTINGS.items():
+    os.environ.setdefault(name, value)
+
+import mongomock            # noqa: E402
+import mongomock.database   # noqa: E402
+import mongomock.gridfs     # noqa: E402
+import pymongo              # noqa: E402
+
+mongomock.gridfs.enable_gridfs_integration()
+
+# mongomock does not know create_collection's check_exists
+_create_collection = mongomock.database.Database.create_collection
+mongomock.database.Database.create_collection = (
+    lambda self, name, check_exists=True, **kwargs: _create_collection(self, name, **kwargs)
+)
+
+pymongo.MongoClient = mongomock.MongoClient
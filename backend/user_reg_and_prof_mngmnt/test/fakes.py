@@ -0,0 +1,211 @@
+import fakeredis
+import mongomock
+import redis
+import redis.asyncio as aioredis
+from unittest.mock import patch
+from pymongo.asynchronous.collection import AsyncCollection as _AsyncMongoCollection
+import database_connection
+
+
+# ------------------------------ TEST DOUBLES ------------------------------ #
+# The sync collections are mongomock collections (see conftest.py). Async modules get an adapter
+# over the same mongomock collection, so data written through either API is visible to both.
+# Redis is a fakeredis server behind the shared connection pools, so the app's own
+# get_sync_redis_client / get_async_redis_client hand out clients of the fake server.
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, count: int):
+        self._cursor = self._cursor.skip(count)
+        return self
+
+    def limit(self, count: int):
+        self._cursor = self._cursor.limit(count)
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._cursor:
+            yield document
+
+    async def to_list(self, length: int | None = None):
+        documents = list(self._cursor)
+        return documents[:length] if length else documents
+
+
+class AsyncCollection:
+    """
+    The subset of pymongo's AsyncCollection the app uses, over a mongomock collection.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+
+    def find(self, *args, **kwargs) -> AsyncCursor:
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    async def aggregate(self, pipeline: list[dict], **kwargs) -> AsyncCursor:
+        return AsyncCursor(self.collection.aggregate(pipeline, **kwargs))
+
+    async def find_one_and_update(self, filter: dict, update, projection: dict | None = None, **kwargs):
+        # mongomock only re-reads the updated document by _id when _id is projected, otherwise it
+        # re-runs the filter, which a conditional write (e.g. a streak check-in) no longer matches
+        projection = dict(projection or {})
+        hide_id = projection.pop("_id", 1) == 0
+        document = self.collection.find_one_and_update(filter, update, projection=projection or None, **kwargs)
+        if document and hide_id:
+            document.pop("_id", None)
+        return document
+
+    def __getattr__(self, name: str):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+def patch_async_collections(test_case, *modules):
+    """
+    Replace the async collections imported by the modules with adapters over the mongomock ones.
+    """
+    for module in modules:
+        for name, value in vars(module).copy().items():
+            sync_name = name.removeprefix("async_")
+            if isinstance(value, _AsyncMongoCollection) and hasattr(database_connection, sync_name):
+                patcher = patch.object(module, name, AsyncCollection(getattr(database_connection, sync_name)))
+                patcher.start()
+                test_case.addCleanup(patcher.stop)
+
+
+# ------------------------------ AGGREGATION STAGES ------------------------------ #
+# mongomock lacks a few stages the app relies on: $lookup with both a localField and a pipeline,
+# $setWindowFields and $merge. `use_emulated_stages` runs those stages in Python, as the server
+# documents them for the options the app uses, and hands every other stage to mongomock.
+
+_mongomock_aggregate = mongomock.collection.Collection.aggregate
+_scratch = mongomock.MongoClient().fakes.scratch
+
+
+def _run_native(collection, documents: list[dict] | None, stages: list[dict]) -> list[dict]:
+    if documents is None:
+        return list(_mongomock_aggregate(collection, stages))
+
+    _scratch.delete_many({})
+    if documents:
+        _scratch.insert_many(documents)
+    return list(_mongomock_aggregate(_scratch, stages))
+
+
+def _lookup(collection, documents: list[dict], options: dict) -> list[dict]:
+    if "let" in options:
+        raise NotImplementedError("$lookup with let")
+
+    foreign = collection.database[options["from"]]
+    for document in documents:
+        match = {"$match": {options["foreignField"]: document.get(options["localField"])}}
+        document[options["as"]] = list(_mongomock_aggregate(foreign, [match, *options["pipeline"]]))
+    return documents
+
+
+def _set_window_fields(documents: list[dict], options: dict) -> list[dict]:
+    if "partitionBy" in options or any(output != {"$documentNumber": {}} for output in options["output"].values()):
+        raise NotImplementedError("$setWindowFields other than $documentNumber over one partition")
+
+    for field, direction in reversed(list(options["sortBy"].items())):
+        documents.sort(key=lambda document: document.get(field), reverse=direction < 0)
+    for number, document in enumerate(documents, start=1):
+        for field in options["output"]:
+            document[field] = number
+    return documents
+
+
+def _merge(collection, documents: list[dict], options: dict) -> list[dict]:
+    if (options.get("on", "_id"), options.get("whenMatched"), options.get("whenNotMatched")) != ("_id", "merge", "discard"):
+        raise NotImplementedError("$merge other than merging into existing documents by _id")
+
+    target = collection.database[options["into"]]
+    for document in documents:
+        fields = {field: value for field, value in document.items() if field != "_id"}
+        if fields:
+            target.update_one({"_id": document["_id"]}, {"$set": fields})
+    return []
+
+
+def aggregate(collection, pipeline: list[dict], **kwargs) -> list[dict]:
+    """
+    Run a pipeline on a mongomock collection, emulating the stages mongomock lacks.
+    """
+    documents = None
+    native = []
+
+    for stage in pipeline:
+        operator, options = next(iter(stage.items()))
+        emulated = (operator == "$lookup" and "pipeline" in options) or operator in ("$setWindowFields", "$merge")
+        if not emulated:
+            native.append(stage)
+            continue
+
+        if native or documents is None:
+            documents = _run_native(collection, documents, native)
+            native = []
+
+        if operator == "$lookup":
+            documents = _lookup(collection, documents, options)
+        elif operator == "$setWindowFields":
+            documents = _set_window_fields(documents, options)
+        else:
+            documents = _merge(collection, documents, options)
+
+    return _run_native(collection, documents, native) if native or documents is None else documents
+
+
+def use_emulated_stages(test_case):
+    """
+    Let mongomock collections run the stages `aggregate` emulates for the rest of the test.
+    """
+    patcher = patch.object(mongomock.collection.Collection, "aggregate", aggregate)
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+
+
+def clear_databases():
+    for db in (database_connection.db, database_connection.img_db):
+        for name in db.list_collection_names():
+            db[name].delete_many({})
+
+
+def use_fake_redis(test_case) -> fakeredis.FakeServer:
+    """
+    Serve redis from a fresh fakeredis server for the rest of the test.
+
+    Call it from asyncSetUp in async test cases, the async pool belongs to the test's event loop.
+    """
+    server = fakeredis.FakeServer()
+    patchers = [
+        patch.object(database_connection, "redis_pool", redis.ConnectionPool(
+            connection_class=fakeredis.FakeRedisConnection, server=server, decode_responses=True
+        )),
+        patch.object(database_connection, "async_redis_pool", aioredis.ConnectionPool(
+            connection_class=fakeredis.FakeAsyncRedisConnection, server=server, decode_responses=True
+        )),
+        patch.dict(database_connection.redis_state, {"available": True, "failures": 0}),
+    ]
+    for patcher in patchers:
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+
+    return server
+
+
+def sync_redis() -> redis.Redis:
+    return database_connection.get_sync_redis_client()
@@ -0,0 +1,61 @@
+import io
+import os
+import runpy
+import sys
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+import mongomock
+from pymongo.errors import OperationFailure
+import indexes
+from conftest import BACKEND_DIR
+from fakes import clear_databases
+
+
+class TestIndexCommand(unittest.TestCase):
+
+    def setUp(self):
+        clear_databases()
+        for collection_name in indexes.load_index_registry():
+            indexes._collection(collection_name).drop_indexes()
+
+    def run_command(self, command: str) -> str:
+        output = io.StringIO()
+        # mongomock has no $indexStats, the report goes without usage as on a server that refuses it
+        index_stats = patch.object(mongomock.collection.Collection, "aggregate", side_effect=OperationFailure("$indexStats"))
+
+        with patch.object(sys, "argv", ["indexes.py", command]), index_stats, redirect_stdout(output):
+            # as `python indexes.py <command>` runs it: the file is loaded as __main__
+            runpy.run_path(os.path.join(BACKEND_DIR, "indexes.py"), run_name="__main__")
+        return output.getvalue()
+
+    def declared(self, collection_name: str) -> set[str]:
+        return {index.document["name"] for index in indexes._registry[collection_name]}
+
+    def existing(self, collection_name: str) -> set[str]:
+        return {index["name"] for index in indexes._collection(collection_name).list_indexes()} - {"_id_"}
+
+    def test_apply_creates_the_registered_indexes(self):
+        self.run_command("apply")
+
+        self.assertTrue(indexes._registry)
+        for collection_name in indexes._registry:
+            with self.subTest(collection=collection_name):
+                self.assertEqual(self.existing(collection_name), self.declared(collection_name))
+
+    def test_report_lists_missing_indexes_as_missing(self):
+        output = self.run_command("report")
+
+        self.assertIn(f"missing    {sorted(self.declared('users'))[0]}", output)
+        self.assertNotIn("undeclared", output)
+
+    def test_report_after_apply_has_nothing_missing_or_undeclared(self):
+        self.run_command("apply")
+        output = self.run_command("report")
+
+        self.assertNotIn("missing ", output)
+        self.assertNotIn("undeclared", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+import dependencies
+import invite.dependencies as invites
+import user_hydration
+from coin_engine import credit_coins
+from database_connection import invites_ref, user_collection
+from fakes import clear_databases, patch_async_collections, use_fake_redis
+from user_hydration import INVITEE_PROJECTION
+
+
+class InviteeTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        clear_databases()
+        use_fake_redis(self)
+        patch_async_collections(self, dependencies, user_hydration)
+
+        # mongomock has no expressions in find projections, the invitees' own invite count is left out
+        projection = {field: value for field, value in INVITEE_PROJECTION.items() if field != "invites"}
+        for module in (dependencies, invites):
+            patcher = patch.object(module, "INVITEE_PROJECTION", projection)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        user_collection.insert_one({
+            "telegram_user_id": "1",
+            "username": "inviter",
+            "image_url": "https://example.com/1.png",
+            "total_coins": 0,
+            "level": 1,
+            "level_name": "Novice",
+            "auto_bot_active": False,
+            "is_active": True,
+            "streak": {},
+            "clan": {}
+        })
+        for telegram_user_id in ("2", "3"):
+            user_collection.insert_one({
+                "telegram_user_id": telegram_user_id,
+                "username": telegram_user_id,
+                "image_url": f"https://example.com/{telegram_user_id}.png",
+                "total_coins": 100,
+                "level": 1,
+                "level_name": "Novice"
+            })
+        invites_ref.insert_one({"inviter_telegram_id": "1", "invitees": ["2", "3"]})
+
+
+class TestInviteesStayCurrent(InviteeTestCase):
+
+    async def test_invitee_list_follows_the_invitees_coins_and_level(self):
+        invites.get_user_invitees("1")
+        credit_coins("2", 5000)
+
+        invitees = invites.get_user_invitees("1")
+
+        self.assertEqual([(invitee.telegram_user_id, invitee.total_coins, invitee.level) for invitee in invitees], [("2", 5100, 2), ("3", 100, 1)])
+
+    async def test_profile_follows_the_invitees_coins_and_level(self):
+        await dependencies.get_user_profile("1")
+        credit_coins("3", 5000)
+
+        profile = await dependencies.get_user_profile("1")
+
+        self.assertEqual([(invitee.username, invitee.total_coins, invitee.level) for invitee in profile.invite], [("2", 100, 1), ("3", 5100, 2)])
+        self.assertEqual(profile.invite_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
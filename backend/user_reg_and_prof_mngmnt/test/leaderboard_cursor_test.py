@@ -0,0 +1,111 @@
+import unittest
+from unittest.mock import patch
+from fastapi import HTTPException
+import leaderboard.dependencies as leaderboards
+from coin_engine import add_daily_coins
+from database_connection import user_collection
+from fakes import clear_databases, patch_async_collections, sync_redis, use_fake_redis
+from superuser.leaderboard.schemas import LeaderboardType
+
+
+# ties are broken by telegram user id, descending
+SCORES = {"a": 100, "b": 100, "c": 100, "d": 50, "e": 200}
+RANKED = ["e", "c", "b", "a", "d"]
+
+
+class LeaderboardCursorTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        clear_databases()
+        patch_async_collections(self, leaderboards)
+
+        patcher = patch.multiple(leaderboards, _leaderboards_stale=False, _stale_marks=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for telegram_user_id, coins in SCORES.items():
+            user_collection.insert_one({"telegram_user_id": telegram_user_id, "total_coins": coins, "username": telegram_user_id})
+            add_daily_coins(telegram_user_id, coins)
+
+    async def walk(self, category: LeaderboardType, page_size: int) -> list[tuple[str, str]]:
+        rows = []
+        cursor = None
+
+        while True:
+            page = await leaderboards.get_leaderboard_page(category, cursor, page_size)
+            rows += [(row.telegram_user_id, row.rank) for row in page.items]
+            cursor = page.next_cursor
+            if not cursor:
+                return rows
+
+    def expected(self) -> list[tuple[str, str]]:
+        return [(telegram_user_id, f"#{rank}") for rank, telegram_user_id in enumerate(RANKED, start=1)]
+
+
+class TestDatabaseCursors(LeaderboardCursorTestCase):
+
+    async def test_pages_cover_every_row_once_across_ties(self):
+        for category in (LeaderboardType.ALL_TIME, LeaderboardType.DAILY):
+            for page_size in (1, 2, 3, 5):
+                with self.subTest(category=category, page_size=page_size):
+                    self.assertEqual(await self.walk(category, page_size), self.expected())
+
+    async def test_rank_lookup_breaks_ties_like_the_pages(self):
+        for rank, telegram_user_id in enumerate(RANKED, start=1):
+            self.assertEqual(
+                await leaderboards.get_rank(telegram_user_id, LeaderboardType.ALL_TIME),
+                {"rank": rank, "score": SCORES[telegram_user_id]}
+            )
+
+
+class TestRedisCursors(LeaderboardCursorTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        use_fake_redis(self)
+        await leaderboards.rebuild_leaderboards()
+
+    async def test_pages_cover_every_row_once_across_ties(self):
+        for category in (LeaderboardType.ALL_TIME, LeaderboardType.DAILY):
+            for page_size in (1, 2, 3, 5):
+                with self.subTest(category=category, page_size=page_size):
+                    self.assertEqual(await self.walk(category, page_size), self.expected())
+
+    async def test_redis_and_database_cursors_are_interchangeable(self):
+        first = await leaderboards.get_leaderboard_page(LeaderboardType.ALL_TIME, None, 2)
+
+        # the next page is served from the database, e.g. while redis is down
+        with patch.object(leaderboards, "get_async_redis_client", lambda: None):
+            second = await leaderboards.get_leaderboard_page(LeaderboardType.ALL_TIME, first.next_cursor, 2)
+
+        self.assertEqual([row.telegram_user_id for row in first.items + second.items], RANKED[:4])
+        self.assertEqual([row.rank for row in second.items], ["#3", "#4"])
+
+    async def test_cursor_resumes_after_a_row_that_moved(self):
+        first = await leaderboards.get_leaderboard_page(LeaderboardType.ALL_TIME, None, 2)
+
+        # the last row of the page climbs before the next page is read
+        sync_redis().zincrby(leaderboards.leaderboard_key(LeaderboardType.ALL_TIME), 1000, "c")
+        second = await leaderboards.get_leaderboard_page(LeaderboardType.ALL_TIME, first.next_cursor, 2)
+
+        self.assertEqual([row.telegram_user_id for row in second.items], ["b", "a"])
+
+
+class TestCursorEncoding(unittest.TestCase):
+
+    def test_round_trip(self):
+        cursor = leaderboards.encode_cursor(100.0, "c", 2)
+
+        self.assertEqual(leaderboards.decode_cursor(cursor), (100, "c", 2))
+        self.assertNotIn("=", cursor)
+
+    def test_malformed_cursor_is_a_bad_request(self):
+        for cursor in ("not-a-cursor", leaderboards.encode_cursor(1, "a", 1)[:-3]):
+            with self.subTest(cursor=cursor), self.assertRaises(HTTPException) as raised:
+                leaderboards.decode_cursor(cursor)
+
+            self.assertEqual(raised.exception.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+import leaderboard.dependencies as leaderboards
+from coin_engine import add_daily_coins, stats_today
+from database_connection import user_collection
+from fakes import clear_databases, patch_async_collections, sync_redis, use_fake_redis
+from superuser.leaderboard.schemas import LeaderboardType
+
+
+class LeaderboardTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        clear_databases()
+        use_fake_redis(self)
+        patch_async_collections(self, leaderboards)
+
+        patcher = patch.multiple(leaderboards, _leaderboards_stale=False, _stale_marks=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for telegram_user_id, total_coins, today_coins in [("a", 300, 30), ("b", 200, 20), ("c", 100, 0)]:
+            user_collection.insert_one({"telegram_user_id": telegram_user_id, "total_coins": total_coins, "username": telegram_user_id})
+            if today_coins:
+                add_daily_coins(telegram_user_id, today_coins)
+
+    async def credit(self, telegram_user_id: str, coins: int):
+        # what a credit does: write the database, then increment the boards
+        user_collection.update_one({"telegram_user_id": telegram_user_id}, {"$inc": {"total_coins": coins}})
+        add_daily_coins(telegram_user_id, coins)
+        await leaderboards.record_coins_batch_async([(telegram_user_id, coins, stats_today())])
+
+    def board(self, category: LeaderboardType) -> list[tuple[str, float]]:
+        return sync_redis().zrevrange(leaderboards.leaderboard_key(category), 0, -1, withscores=True)
+
+
+class TestSortedSetLeaderboards(LeaderboardTestCase):
+
+    async def test_rebuild_builds_every_board_from_the_database(self):
+        self.assertTrue(await leaderboards.rebuild_leaderboards())
+
+        self.assertEqual(self.board(LeaderboardType.ALL_TIME), [("a", 300), ("b", 200), ("c", 100)])
+        for category in leaderboards.PERIOD_LEADERBOARDS:
+            self.assertEqual(self.board(category), [("a", 30), ("b", 20)])
+        self.assertTrue(sync_redis().exists(leaderboards.LEADERBOARD_READY_KEY))
+        self.assertFalse(sync_redis().exists(leaderboards.LEADERBOARD_REBUILD_LOCK_KEY))
+
+    async def test_increments_move_ranks_on_every_board(self):
+        await leaderboards.rebuild_leaderboards()
+
+        await self.credit("c", 500)
+        ranks = await leaderboards.get_user_ranks("c")
+
+        self.assertEqual(ranks[LeaderboardType.ALL_TIME], {"rank": 1, "score": 600})
+        self.assertEqual(ranks[LeaderboardType.DAILY], {"rank": 1, "score": 500})
+        self.assertEqual((await leaderboards.get_rank("a", LeaderboardType.ALL_TIME))["rank"], 2)
+
+    async def test_unranked_user_has_no_period_rank(self):
+        await leaderboards.rebuild_leaderboards()
+
+        self.assertEqual(await leaderboards.get_rank("c", LeaderboardType.WEEKLY), {"rank": None, "score": 0})
+
+    async def test_reads_of_stale_boards_schedule_one_rebuild(self):
+        leaderboards.mark_leaderboards_stale()
+        rebuilds = []
+
+        async def rebuild():
+            rebuilds.append(1)
+            await asyncio.sleep(0.01)
+
+        with patch.object(leaderboards, "rebuild_leaderboards", rebuild):
+            for _ in range(5):
+                self.assertFalse(await leaderboards._redis_leaderboard_ready(leaderboards.get_async_redis_client()))
+            await asyncio.gather(*leaderboards._rebuild_tasks)
+
+            # a later read, once the rebuild finished, may schedule the next one
+            await leaderboards._redis_leaderboard_ready(leaderboards.get_async_redis_client())
+            await asyncio.gather(*leaderboards._rebuild_tasks)
+
+        self.assertEqual(len(rebuilds), 2)
+
+    async def test_rebuild_is_skipped_while_another_worker_holds_the_lock(self):
+        sync_redis().set(leaderboards.LEADERBOARD_REBUILD_LOCK_KEY, 1)
+
+        self.assertFalse(await leaderboards.rebuild_leaderboards())
+        self.assertEqual(self.board(LeaderboardType.ALL_TIME), [])
+
+
+class TestRebuildRaces(LeaderboardTestCase):
+
+    async def test_increment_made_while_the_database_is_read_is_kept(self):
+        database_scores = leaderboards._database_scores
+
+        async def read_then_credit(day, telegram_user_ids=None):
+            scores = await database_scores(day, telegram_user_ids)
+            if telegram_user_ids is None:
+                await self.credit("c", 1000)
+            return scores
+
+        with patch.object(leaderboards, "_database_scores", read_then_credit):
+            await leaderboards.rebuild_leaderboards()
+
+        self.assertEqual(self.board(LeaderboardType.ALL_TIME), [("c", 1100), ("a", 300), ("b", 200)])
+        self.assertEqual(self.board(LeaderboardType.DAILY), [("c", 1000), ("a", 30), ("b", 20)])
+
+    async def test_increment_made_just_before_the_swap_is_kept(self):
+        set_logged_scores = leaderboards._set_logged_scores
+        calls = []
+
+        async def drain_then_credit(*args, **kwargs):
+            scores = await set_logged_scores(*args, **kwargs)
+            calls.append(scores)
+            if len(calls) == 1:
+                # lands on the live board, which the rebuilt one is about to replace
+                await self.credit("b", 1000)
+            return scores
+
+        with patch.object(leaderboards, "_set_logged_scores", drain_then_credit):
+            await leaderboards.rebuild_leaderboards()
+
+        self.assertEqual(self.board(LeaderboardType.ALL_TIME), [("b", 1200), ("a", 300), ("c", 100)])
+        self.assertEqual(self.board(LeaderboardType.DAILY), [("b", 1020), ("a", 30)])
+        self.assertFalse(sync_redis().exists(leaderboards.LEADERBOARD_REBUILD_LOG_KEY))
+
+    async def test_increments_are_not_logged_outside_a_rebuild(self):
+        await self.credit("c", 10)
+
+        self.assertFalse(sync_redis().exists(leaderboards.LEADERBOARD_REBUILD_LOG_KEY))
+
+    async def test_rebuild_clears_the_stale_flag(self):
+        leaderboards.mark_leaderboards_stale()
+
+        await leaderboards.rebuild_leaderboards()
+
+        self.assertFalse(leaderboards._leaderboards_stale)
+
+    async def test_staleness_reported_during_a_rebuild_survives_it(self):
+        database_scores = leaderboards._database_scores
+
+        async def read_then_lose_an_increment(*args, **kwargs):
+            leaderboards.mark_leaderboards_stale()
+            return await database_scores(*args, **kwargs)
+
+        with patch.object(leaderboards, "_database_scores", read_then_lose_an_increment):
+            await leaderboards.rebuild_leaderboards()
+
+        self.assertTrue(leaderboards._leaderboards_stale)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from starlette.requests import Request
+import earn.router
+import superuser.boost.router
+import superuser.challenge.router
+import superuser.clan.router
+import superuser.dashboard.router
+import superuser.reward.router
+from database_connection import fs
+from fakes import clear_databases
+from media.image_cache import image_cache
+
+
+IMAGE = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+
+# the image routes that predate /media, they serve the same files by id
+ROUTES = {
+    "earn reward": earn.router.get_reward_image,
+    "earn challenge": earn.router.get_challenge_image,
+    "reward": superuser.reward.router.get_reward_image,
+    "challenge": superuser.challenge.router.get_challenge_image,
+    "clan": superuser.clan.router.get_clan_profile_image,
+    "extra boost": superuser.boost.router.get_extra_boost_image,
+    "dashboard": superuser.dashboard.router.get_image,
+}
+
+
+def request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+class TestLegacyImageRoutes(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        clear_databases()
+        self.image_id = str(fs.put(IMAGE, filename="image.png", content_type="image/png"))
+        self.addCleanup(image_cache.evict, self.image_id)
+
+    async def test_unchanged_image_is_not_sent_again(self):
+        for name, route in ROUTES.items():
+            with self.subTest(route=name):
+                etag = (await route(self.image_id, request())).headers["etag"]
+
+                response = await route(self.image_id, request(if_none_match=etag))
+
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.body, b"")
+
+    async def test_range_is_served_partially(self):
+        for name, route in ROUTES.items():
+            with self.subTest(route=name):
+                response = await route(self.image_id, request(range="bytes=8-15"))
+
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response.headers["content-range"], f"bytes 8-15/{len(IMAGE)}")
+                self.assertEqual(response.body, IMAGE[8:16])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+from fastapi import Response
+import database_connection
+from database_connection import cached, invalidate_cache_tags, invalidate_cache_tags_async
+from fakes import sync_redis, use_fake_redis
+from user_reg_and_prof_mngmnt.profile_cache import invalidate_profile_async
+
+
+class ResponseCacheTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        use_fake_redis(self)
+
+        patcher = patch.dict(database_connection._cache_l1, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.calls = []
+        self.release = None
+
+        @cached(ttl=60, tags=["clans"])
+        async def top_clans(page_number: int = 1):
+            self.calls.append(("top_clans", page_number))
+            if self.release:
+                await self.release.wait()
+            return {"page": page_number, "build": len(self.calls)}
+
+        @cached(ttl=60, tags=["levels"])
+        async def levels():
+            self.calls.append(("levels",))
+            return [{"level": 1}]
+
+        @cached(ttl=60, vary_on_user=True)
+        async def my_rewards(telegram_user_id: str):
+            self.calls.append(("my_rewards", telegram_user_id))
+            return {"user": telegram_user_id, "build": len(self.calls)}
+
+        @cached(ttl=60, tags=["media"])
+        async def stream():
+            self.calls.append(("stream",))
+            return Response(content=b"raw")
+
+        self.top_clans, self.levels, self.my_rewards, self.stream = top_clans, levels, my_rewards, stream
+
+    def body(self, response: Response):
+        return json.loads(response.body)
+
+
+class TestCachedResponses(ResponseCacheTestCase):
+
+    async def test_second_call_is_a_hit(self):
+        first = await self.top_clans(page_number=1)
+        second = await self.top_clans(page_number=1)
+
+        self.assertEqual((first.headers["X-Cache"], second.headers["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(self.body(second), {"page": 1, "build": 1})
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_arguments_are_part_of_the_key(self):
+        await self.top_clans(page_number=1)
+        second_page = await self.top_clans(page_number=2)
+
+        self.assertEqual(self.body(second_page)["page"], 2)
+        self.assertEqual(len(self.calls), 2)
+
+    async def test_hit_from_redis_without_the_in_process_copy(self):
+        await self.top_clans(page_number=1)
+        database_connection._cache_l1.clear()     # as seen by another worker
+
+        response = await self.top_clans(page_number=1)
+
+        self.assertEqual(response.headers["X-Cache"], "HIT")
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_responses_built_by_the_route_are_not_cached(self):
+        await self.stream()
+        response = await self.stream()
+
+        self.assertEqual(response.body, b"raw")
+        self.assertEqual(len(self.calls), 2)
+
+    async def test_routes_run_uncached_while_redis_is_unavailable(self):
+        with patch.dict(database_connection.redis_state, {"available": False}):
+            first = await self.levels()
+            await self.levels()
+
+        self.assertEqual(first, [{"level": 1}])
+        self.assertEqual(len(self.calls), 2)
+
+
+class TestTagInvalidation(ResponseCacheTestCase):
+
+    async def test_invalidating_a_tag_rebuilds_its_responses_only(self):
+        await self.top_clans(page_number=1)
+        await self.levels()
+
+        await invalidate_cache_tags_async("clans")
+        clans = await self.top_clans(page_number=1)
+        levels = await self.levels()
+
+        self.assertEqual(clans.headers["X-Cache"], "MISS")
+        self.assertEqual(self.body(clans)["build"], 3)
+        self.assertEqual(levels.headers["X-Cache"], "HIT")
+
+    async def test_sync_invalidation(self):
+        await self.top_clans(page_number=1)
+
+        invalidate_cache_tags("clans")
+
+        self.assertEqual((await self.top_clans(page_number=1)).headers["X-Cache"], "MISS")
+
+    async def test_version_bumped_by_another_worker_outdates_the_in_process_copy(self):
+        await self.top_clans(page_number=1)
+
+        # another worker invalidates: the tag version moves, this worker's L1 is left as it is
+        sync_redis().incr(database_connection._cache_tag_key("clans"))
+
+        self.assertEqual((await self.top_clans(page_number=1)).headers["X-Cache"], "MISS")
+        self.assertEqual(len(self.calls), 2)
+
+    async def test_user_responses_are_invalidated_with_the_user(self):
+        await self.my_rewards(telegram_user_id="1")
+        await self.my_rewards(telegram_user_id="2")
+
+        await invalidate_profile_async("1")
+        first = await self.my_rewards(telegram_user_id="1")
+        second = await self.my_rewards(telegram_user_id="2")
+
+        self.assertEqual((first.headers["X-Cache"], second.headers["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(self.body(first), {"user": "1", "build": 3})
+
+
+class TestSingleFlight(ResponseCacheTestCase):
+
+    async def test_concurrent_misses_share_one_build(self):
+        self.release = asyncio.Event()
+
+        requests = [asyncio.create_task(self.top_clans(page_number=1)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        self.release.set()
+        responses = await asyncio.gather(*requests)
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual({json.dumps(self.body(response)) for response in responses}, {'{"page": 1, "build": 1}'})
+
+    async def test_failed_build_is_raised_to_every_waiter(self):
+        self.release = asyncio.Event()
+
+        @cached(ttl=60, tags=["clans"])
+        async def failing():
+            await self.release.wait()
+            raise ValueError("database down")
+
+        requests = [asyncio.create_task(failing()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        self.release.set()
+        results = await asyncio.gather(*requests, return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(database_connection._cache_inflight, {})
+
+    async def test_waits_for_the_worker_holding_the_build_lock(self):
+        key = database_connection._cache_key(self.top_clans.__wrapped__, {"page_number": 1}, False)
+        sync_redis().set(database_connection.CACHE_LOCK_KEY_PREFIX + key, "1")
+
+        async def other_worker_builds():
+            await asyncio.sleep(0.1)
+            sync_redis().set(key, '0|{"page":1,"build":"elsewhere"}')
+
+        builder = asyncio.create_task(other_worker_builds())
+        response = await self.top_clans(page_number=1)
+        await builder
+
+        self.assertEqual(self.body(response), {"page": 1, "build": "elsewhere"})
+        self.assertEqual(self.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
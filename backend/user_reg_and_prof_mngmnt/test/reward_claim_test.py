@@ -0,0 +1,103 @@
+import unittest
+from unittest.mock import patch
+from bson import ObjectId
+from fastapi import HTTPException
+import coin_engine
+import dependencies
+import leaderboard.dependencies
+import reward.counters
+import reward.dependencies as rewards
+from database_connection import rewards_collection, user_collection
+from fakes import clear_databases, patch_async_collections, sync_redis, use_fake_redis
+
+
+class RewardClaimTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        clear_databases()
+        use_fake_redis(self)
+        patch_async_collections(self, rewards, coin_engine, dependencies, leaderboard.dependencies, reward.counters)
+
+        self.reward_id = str(rewards_collection.insert_one({"reward_title": "Launch", "reward": 500}).inserted_id)
+        user_collection.insert_one({"telegram_user_id": "1", "total_coins": 100, "level": 1, "level_name": "Novice"})
+
+    def total_coins(self) -> int:
+        return user_collection.find_one({"telegram_user_id": "1"})["total_coins"]
+
+    def idempotency_key(self, key: str) -> str:
+        return f"{rewards.CLAIM_IDEMPOTENCY_KEY_PREFIX}1:{self.reward_id}:{key}"
+
+    async def assert_claim_fails(self, status_code: int, *args):
+        with self.assertRaises(HTTPException) as raised:
+            await rewards.claim_reward(*args)
+        self.assertEqual(raised.exception.status_code, status_code)
+
+
+class TestClaimReward(RewardClaimTestCase):
+
+    async def test_claim_credits_the_reward_once(self):
+        self.assertTrue(await rewards.claim_reward("1", self.reward_id))
+
+        user = user_collection.find_one({"telegram_user_id": "1"})
+        self.assertEqual(user["total_coins"], 600)
+        self.assertEqual(len(user["claimed_rewards"]), 1)
+        self.assertEqual(sync_redis().hget(reward.counters.PENDING_KEY, f"{self.reward_id}|claim_count"), "1")
+
+    async def test_claimed_reward_cannot_be_claimed_again(self):
+        user_collection.update_one({"telegram_user_id": "1"}, {"$set": {"claimed_rewards": [self.reward_id]}})
+
+        await self.assert_claim_fails(400, "1", self.reward_id)
+        self.assertEqual(self.total_coins(), 100)
+
+    async def test_unknown_reward_is_not_claimed(self):
+        self.assertFalse(await rewards.claim_reward("1", str(ObjectId())))
+        self.assertFalse(await rewards.claim_reward("1", "not-an-id"))
+        self.assertEqual(self.total_coins(), 100)
+
+    async def test_unknown_user_is_not_found(self):
+        await self.assert_claim_fails(404, "404", self.reward_id)
+
+
+class TestIdempotentClaims(RewardClaimTestCase):
+
+    async def test_retry_with_the_same_key_gets_the_first_outcome_without_a_write(self):
+        self.assertTrue(await rewards.claim_reward("1", self.reward_id, "retry-1"))
+
+        with patch.object(rewards, "_claim") as claim:
+            self.assertTrue(await rewards.claim_reward("1", self.reward_id, "retry-1"))
+            self.assertTrue(await rewards.claim_reward("1", self.reward_id, "retry-1"))
+
+        claim.assert_not_called()
+        self.assertEqual(self.total_coins(), 600)
+        self.assertEqual(sync_redis().get(self.idempotency_key("retry-1")), "claimed")
+
+    async def test_retry_of_a_rejected_claim_is_rejected_again(self):
+        await self.assert_claim_fails(404, "404", self.reward_id, "retry-1")
+
+        user_collection.insert_one({"telegram_user_id": "404", "total_coins": 0})
+        await self.assert_claim_fails(404, "404", self.reward_id, "retry-1")
+
+    async def test_claim_in_progress_with_the_same_key_is_a_conflict(self):
+        sync_redis().set(self.idempotency_key("retry-1"), rewards.CLAIM_PENDING)
+
+        await self.assert_claim_fails(409, "1", self.reward_id, "retry-1")
+        self.assertEqual(self.total_coins(), 100)
+
+    async def test_failed_claim_releases_its_key(self):
+        with patch.object(rewards, "_claim", side_effect=RuntimeError("database down")):
+            with self.assertRaises(RuntimeError):
+                await rewards.claim_reward("1", self.reward_id, "retry-1")
+
+        self.assertFalse(sync_redis().exists(self.idempotency_key("retry-1")))
+        self.assertTrue(await rewards.claim_reward("1", self.reward_id, "retry-1"))
+        self.assertEqual(self.total_coins(), 600)
+
+    async def test_claim_goes_through_while_redis_is_unavailable(self):
+        with patch.dict("database_connection.redis_state", {"available": False}):
+            self.assertTrue(await rewards.claim_reward("1", self.reward_id, "retry-1"))
+
+        self.assertEqual(self.total_coins(), 600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+import coin_engine
+import dependencies
+import earn.dependencies as earn
+import leaderboard.dependencies
+from database_connection import user_collection
+from fakes import clear_databases, patch_async_collections, use_fake_redis
+
+
+CHECK_IN = datetime(2026, 1, 1, 9, 0)
+REWARD = 500
+
+
+class TestStreakUpdate(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        clear_databases()
+        use_fake_redis(self)
+        patch_async_collections(self, earn, coin_engine, dependencies, leaderboard.dependencies)
+
+        user_collection.insert_one({"telegram_user_id": "1", "total_coins": 0, "level": 1, "level_name": "Novice"})
+
+    def set_streak(self, current_streak: int, longest_streak: int, last_action_date: datetime):
+        user_collection.update_one({"telegram_user_id": "1"}, {"$set": {"streak": {
+            "current_streak": current_streak,
+            "longest_streak": longest_streak,
+            "last_action_date": last_action_date
+        }}})
+
+    def total_coins(self) -> int:
+        return user_collection.find_one({"telegram_user_id": "1"})["total_coins"]
+
+    async def test_first_check_in_starts_the_streak(self):
+        streak = await earn.update_streak("1", CHECK_IN, REWARD)
+
+        self.assertEqual((streak.current_streak, streak.longest_streak, streak.last_action_date), (1, 1, CHECK_IN))
+        self.assertEqual(self.total_coins(), REWARD)
+
+    async def test_check_in_within_a_day_is_rejected(self):
+        self.set_streak(3, 3, CHECK_IN)
+
+        for delay in (timedelta(0), earn.STREAK_INTERVAL - timedelta(seconds=1)):
+            with self.subTest(delay=delay):
+                self.assertIsNone(await earn.update_streak("1", CHECK_IN + delay, REWARD))
+
+        self.assertEqual(self.total_coins(), 0)
+        self.assertEqual(user_collection.find_one({"telegram_user_id": "1"})["streak"]["current_streak"], 3)
+
+    async def test_check_in_within_the_grace_continues_the_streak(self):
+        for delay in (earn.STREAK_INTERVAL, timedelta(hours=36), earn.STREAK_GRACE):
+            with self.subTest(delay=delay):
+                self.set_streak(3, 5, CHECK_IN)
+
+                streak = await earn.update_streak("1", CHECK_IN + delay, REWARD)
+
+                self.assertEqual((streak.current_streak, streak.longest_streak), (4, 5))
+                self.assertEqual(streak.last_action_date, CHECK_IN + delay)
+
+    async def test_check_in_after_the_grace_restarts_the_streak(self):
+        self.set_streak(7, 7, CHECK_IN)
+
+        streak = await earn.update_streak("1", CHECK_IN + earn.STREAK_GRACE + timedelta(seconds=1), REWARD)
+
+        self.assertEqual((streak.current_streak, streak.longest_streak), (1, 7))
+        self.assertEqual(self.total_coins(), REWARD)
+
+    async def test_longest_streak_follows_the_current_one(self):
+        self.set_streak(5, 5, CHECK_IN)
+
+        streak = await earn.update_streak("1", CHECK_IN + earn.STREAK_INTERVAL, REWARD)
+
+        self.assertEqual((streak.current_streak, streak.longest_streak), (6, 6))
+
+    async def test_daily_check_ins_credit_once_a_day(self):
+        for day in range(3):
+            await earn.update_streak("1", CHECK_IN + day * earn.STREAK_INTERVAL, REWARD)
+            await earn.update_streak("1", CHECK_IN + day * earn.STREAK_INTERVAL + timedelta(hours=1), REWARD)
+
+        self.assertEqual(self.total_coins(), 3 * REWARD)
+        self.assertEqual(user_collection.find_one({"telegram_user_id": "1"})["streak"]["current_streak"], 3)
+
+    async def test_check_in_reward_is_reported_to_the_credit_listeners(self):
+        listener = AsyncMock()
+
+        with patch.object(coin_engine, "_async_credit_listeners", [listener]):
+            await earn.update_streak("1", CHECK_IN, REWARD)
+            await earn.update_streak("1", CHECK_IN + timedelta(hours=1), REWARD)
+
+        listener.assert_awaited_once()
+        telegram_user_id, coins, user = listener.await_args.args
+        self.assertEqual((telegram_user_id, coins, user["total_coins"], user["level"]), ("1", REWARD, REWARD, 1))
+
+    async def test_unknown_user_is_not_checked_in(self):
+        self.assertIsNone(await earn.update_streak("404", CHECK_IN, REWARD))
+
+
+if __name__ == '__main__':
+    unittest.main()
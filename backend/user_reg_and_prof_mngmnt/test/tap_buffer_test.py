@@ -0,0 +1,165 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import coin_engine
+import leaderboard.dependencies
+import tap_buffer
+from config import get_settings
+from database_connection import coin_stats_daily, user_collection
+from fakes import clear_databases, patch_async_collections, sync_redis, use_fake_redis
+
+
+class TapBufferTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        clear_databases()
+        use_fake_redis(self)
+        patch_async_collections(self, tap_buffer, coin_engine, leaderboard.dependencies)
+
+        for patcher in (
+            patch.object(get_settings(), "tap_buffer_enabled", True),
+            patch.dict(tap_buffer._user_state, clear=True),
+            patch.dict(tap_buffer._pending, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.day = str(coin_engine.stats_today())
+        user_collection.insert_one({"telegram_user_id": "1", "total_coins": 100, "level": 1, "level_name": "Novice"})
+
+    def state(self, telegram_user_id: str = "1") -> dict:
+        return sync_redis().hgetall(tap_buffer.USER_STATE_KEY_PREFIX + telegram_user_id)
+
+    def stats(self, telegram_user_id: str = "1") -> int:
+        bucket = coin_stats_daily.find_one(coin_engine.daily_stats_filter(telegram_user_id, self.day))
+        return bucket["coins"] if bucket else 0
+
+
+class TestTapScripts(TapBufferTestCase):
+
+    async def test_taps_are_buffered_on_top_of_the_seeded_state(self):
+        await tap_buffer.buffer_taps("1", 10)
+        result = await tap_buffer.buffer_taps("1", 5)
+
+        self.assertEqual(result, {"total_coins": 115, "level": 1, "level_name": "Novice"})
+        self.assertEqual(self.state()["base"], "100")
+        self.assertEqual(self.state()["buffered"], "15")
+        self.assertEqual(sync_redis().hgetall(tap_buffer.PENDING_KEY), {f"{self.day}|1": "15"})
+
+        # nothing is written until the flush
+        self.assertEqual(user_collection.find_one({"telegram_user_id": "1"})["total_coins"], 100)
+
+    async def test_unknown_user_is_not_buffered(self):
+        self.assertIsNone(await tap_buffer.buffer_taps("404", 10))
+        self.assertFalse(sync_redis().exists(tap_buffer.PENDING_KEY))
+
+    async def test_buffered_taps_promote_the_level(self):
+        user_collection.update_one({"telegram_user_id": "1"}, {"$set": {"total_coins": 4990}})
+
+        result = await tap_buffer.buffer_taps("1", 20)
+
+        self.assertEqual((result["level"], result["level_name"]), (2, "Explorer"))
+        self.assertEqual(self.state()["level"], "2")
+
+    async def test_flush_moves_buffered_coins_into_the_base(self):
+        await tap_buffer.buffer_taps("1", 10)
+        await tap_buffer.buffer_taps("1", 5)
+
+        await tap_buffer.flush_tap_buffer()
+
+        self.assertEqual(user_collection.find_one({"telegram_user_id": "1"})["total_coins"], 115)
+        self.assertEqual(self.stats(), 15)
+        self.assertEqual((self.state()["base"], self.state()["buffered"]), ("115", "0"))
+        self.assertFalse(sync_redis().exists(tap_buffer.PENDING_KEY))
+
+        result = await tap_buffer.buffer_taps("1", 1)
+        self.assertEqual(result["total_coins"], 116)
+
+    async def test_replayed_batch_is_applied_once(self):
+        entries = {f"{self.day}|1": "10"}
+
+        await tap_buffer.apply_tap_batch("batch-1", entries)
+        await tap_buffer.apply_tap_batch("batch-1", entries, replay=True)
+
+        self.assertEqual(user_collection.find_one({"telegram_user_id": "1"})["total_coins"], 110)
+        self.assertEqual(self.stats(), 10)
+
+
+class TestCreditsOutsideTheBuffer(TapBufferTestCase):
+
+    async def test_credit_moves_the_cached_state_along(self):
+        await tap_buffer.buffer_taps("1", 10)
+
+        await coin_engine.credit_coins_async("1", 5000)
+        result = await tap_buffer.buffer_taps("1", 1)
+
+        self.assertEqual(result["total_coins"], 5111)
+        self.assertEqual((result["level"], result["level_name"]), (2, "Explorer"))
+
+    async def test_sync_credit_moves_the_cached_state_along(self):
+        await tap_buffer.buffer_taps("1", 10)
+
+        coin_engine.credit_coins("1", 50)
+        result = await tap_buffer.buffer_taps("1", 1)
+
+        self.assertEqual(result["total_coins"], 161)
+
+    async def test_credit_without_cached_state_does_not_seed_one(self):
+        await coin_engine.credit_coins_async("1", 50)
+
+        self.assertEqual(self.state(), {})
+
+
+class TestJournalReplay(TapBufferTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        self.journal_dir = journal_dir.name
+
+        patcher = patch.object(get_settings(), "tap_buffer_journal_dir", self.journal_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        tap_buffer._open_journal()
+        self.addCleanup(self.close_journal)
+
+    def close_journal(self):
+        tap_buffer._journal.close()
+        tap_buffer._journal = None
+
+    def write_orphaned_journal(self, name: str, coins: int):
+        with open(os.path.join(self.journal_dir, name), "w") as journal:
+            journal.write(f"{self.day}|1|{coins}\n")
+            journal.write(f"{self.day}|1|")     # torn write
+
+    async def test_orphaned_journals_are_replayed_by_the_job(self):
+        self.write_orphaned_journal("taps-dead.log", 7)
+
+        await tap_buffer.replay_orphaned_journals()
+
+        self.assertEqual(user_collection.find_one({"telegram_user_id": "1"})["total_coins"], 107)
+        self.assertEqual(os.listdir(self.journal_dir), [os.path.basename(tap_buffer._journal.name)])
+
+    async def test_journal_of_a_live_worker_is_left_alone(self):
+        tap_buffer._journal.write(f"{self.day}|1|7\n")
+        tap_buffer._journal.flush()
+
+        await tap_buffer.replay_orphaned_journals()
+
+        self.assertEqual(user_collection.find_one({"telegram_user_id": "1"})["total_coins"], 100)
+
+    async def test_replay_is_a_no_op_while_the_buffer_is_disabled(self):
+        self.write_orphaned_journal("taps-dead.log", 7)
+
+        with patch.object(get_settings(), "tap_buffer_enabled", False):
+            await tap_buffer.replay_orphaned_journals()
+
+        self.assertEqual(user_collection.find_one({"telegram_user_id": "1"})["total_coins"], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import jwt
+from config import get_settings
+
+
+# ------------------------------ VERIFIED TOKEN CACHE ------------------------------ #
+# Claims of tokens whose signature has been verified are kept until the token expires,
+# keyed by the token's sha256 digest, so repeated requests with the same token skip the HMAC.
+# Shared by the user and admin auth dependencies.
+
+SECRET_KEY = get_settings().secret_key
+ALGORITHM = get_settings().algorithm
+
+_claims: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _evict(now: float):
+    # drop expired tokens first, then the least recently used ones
+    for digest in [digest for digest, (expires_at, _) in _claims.items() if expires_at <= now]:
+        del _claims[digest]
+
+    while len(_claims) >= get_settings().token_cache_size:
+        _claims.popitem(last=False)
+        _stats["evictions"] += 1
+
+
+def decode_token(token: str) -> dict:
+    """
+    Verify a JWT and return its claims, from the cache when the token was seen before.
+
+    Args:
+        token (str): The encoded JWT.
+
+    Returns:
+        dict: The token's claims.
+
+    Raises:
+        InvalidTokenError: If the token is invalid or expired.
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+
+    with _lock:
+        entry = _claims.get(digest)
+        if entry and entry[0] > now:
+            _claims.move_to_end(digest)
+            _stats["hits"] += 1
+            return dict(entry[1])
+
+        if entry:
+            del _claims[digest]
+        _stats["misses"] += 1
+
+    payload: dict = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+    expires_at = payload.get("exp")
+    if isinstance(expires_at, (int, float)):
+        with _lock:
+            if len(_claims) >= get_settings().token_cache_size:
+                _evict(now)
+            _claims[digest] = (float(expires_at), dict(payload))
+
+    return payload
+
+
+def token_cache_stats() -> dict:
+    """
+    Return the hit, miss and eviction counts of the token cache and its current size.
+    """
+    with _lock:
+        return {**_stats, "size": len(_claims)}
@@ -7,6 +7,8 @@ from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from config import get_settings
 from database_connection import user_collection, invites_ref
 from dependencies import update_coin_stats
+from user_reg_and_prof_mngmnt.profile_cache import invalidate_profile
+from user_reg_and_prof_mngmnt.token_cache import decode_token
 from user_reg_and_prof_mngmnt.schemas import BasicProfile, InviteeData, Invites, Signup, TokenData
 from user_reg_and_prof_mngmnt.models import (
     UserProfile as UserProfileModel
@@ -77,6 +79,8 @@ def authenticate_user(telegram_user_id: str) -> BasicProfile:
         if release_suspend.modified_count == 0:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="User suspension release failed.")
 
+        invalidate_profile(telegram_user_id)
+
     return user
 
 
@@ -132,7 +136,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
             headers={"WWW-Authenticate": "Bearer"}
         )
     try:
-        payload: dict = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload: dict = decode_token(token)
         telegram_user_id: str = payload.get("telegram_user_id")
         admin_role: str = payload.get("role")
         # username: str = payload.get("username")
@@ -166,6 +170,7 @@ def reward_inviter_and_invitee(inviter_id: str, invitee_id: str, reward: int):
 
     user_collection.update_one(inviter, update_operation)
     user_collection.update_one(invitee, update_operation)
+    invalidate_profile(inviter_id, invitee_id)
 
     # update coin stats of inviter and invitee
     update_coin_stats(telegram_user_id=inviter_id, coins_tapped=reward)
@@ -209,6 +214,7 @@ def create_invite_ref(inviter_id: str, ref = Signup):
         {'invitees': ref.telegram_user_id}
     }
     invites_ref.update_one(inviter, update_operation)
+    invalidate_profile(inviter_id)
 
 def add_invitee_to_inviter_list(inviter_id: str, invitee_id: str):
     inviter = {'telegram_user_id': inviter_id}
@@ -227,3 +233,4 @@ def add_invitee_to_inviter_list(inviter_id: str, invitee_id: str):
     }
 
     user_collection.update_one(inviter, update_operation)
+    invalidate_profile(inviter_id)